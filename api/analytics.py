@@ -0,0 +1,152 @@
+"""
+Grade analytics grouped by subject, professor or department.
+
+Each report is one grouped query over Enrollment: counts, mean and standard
+deviation are plain aggregates, and the grade distribution comes from
+conditional counts over ``BUCKET_WIDTH``-wide buckets. Histograms and
+percentiles are derived from those bucket counts, so percentiles are exact
+for grades with one decimal and within ``BUCKET_WIDTH`` otherwise.
+"""
+import math
+
+from django.db.models import Avg, Count, Exists, F, OuterRef, Q
+
+from .models import Enrollment, Professor
+
+# Same rule as Enrollment.is_passed.
+PASSING_GRADE = 3.0
+MAX_GRADE = 5.0
+BUCKET_WIDTH = 0.1
+HISTOGRAM_WIDTH = 0.5
+PERCENTILES = (25, 50, 75, 90)
+
+# One bucket per BUCKET_WIDTH step below MAX_GRADE, plus one for MAX_GRADE itself.
+BUCKET_COUNT = round(MAX_GRADE / BUCKET_WIDTH) + 1
+BUCKETS_PER_BIN = round(HISTOGRAM_WIDTH / BUCKET_WIDTH)
+
+
+def _bucket_bounds(index):
+    return round(index * BUCKET_WIDTH, 1), round((index + 1) * BUCKET_WIDTH, 1)
+
+
+def _bucket_filter(index):
+    low, high = _bucket_bounds(index)
+    if index == BUCKET_COUNT - 1:
+        return Q(grade__gte=low)
+    return Q(grade__gte=low, grade__lt=high)
+
+
+def grade_aggregates():
+    """
+    The aggregate expressions every report annotates its groups with.
+    """
+    aggregates = {
+        'enrollments': Count('id'),
+        'graded': Count('grade'),
+        'passed': Count('id', filter=Q(grade__gte=PASSING_GRADE)),
+        'mean': Avg('grade'),
+        # The population standard deviation is derived from this in summarize().
+        # SQLite's StdDev fallback fails on groups without grades.
+        'mean_square': Avg(F('grade') * F('grade')),
+    }
+    for index in range(BUCKET_COUNT):
+        aggregates[f'bucket_{index}'] = Count('id', filter=_bucket_filter(index))
+    return aggregates
+
+
+def _percentile(buckets, graded, percent):
+    rank = percent / 100 * graded
+    seen = 0
+    for index, count in enumerate(buckets):
+        seen += count
+        if count and seen >= rank:
+            return _bucket_bounds(index)[0]
+    return None
+
+
+def _histogram(buckets):
+    bins = [
+        {
+            'from': _bucket_bounds(start)[0],
+            'to': _bucket_bounds(start + BUCKETS_PER_BIN - 1)[1],
+            'count': sum(buckets[start:start + BUCKETS_PER_BIN]),
+        }
+        for start in range(0, BUCKET_COUNT - 1, BUCKETS_PER_BIN)
+    ]
+    # The last bin is closed and also holds the MAX_GRADE bucket.
+    bins[-1]['count'] += buckets[-1]
+    return bins
+
+
+def summarize(group, row):
+    """
+    The report entry for one grouped ``row``: ``group`` identifies it, then
+    come counts, rates, mean, standard deviation, histogram and percentiles.
+    """
+    buckets = [row[f'bucket_{index}'] for index in range(BUCKET_COUNT)]
+    graded = row['graded']
+    mean = row['mean']
+    return {
+        **group,
+        'enrollments': row['enrollments'],
+        'graded': graded,
+        'passed': row['passed'],
+        'failed': graded - row['passed'],
+        'pass_rate': row['passed'] / graded if graded else None,
+        'mean': mean,
+        'stddev': math.sqrt(max(row['mean_square'] - mean ** 2, 0.0)) if graded else None,
+        'histogram': _histogram(buckets),
+        'percentiles': {
+            f'p{percent}': _percentile(buckets, graded, percent) if graded else None
+            for percent in PERCENTILES
+        },
+    }
+
+
+def subject_report(subject_id=None):
+    enrollments = Enrollment.objects.all()
+    if subject_id is not None:
+        enrollments = enrollments.filter(subject_id=subject_id)
+    rows = (
+        enrollments.values('subject_id', 'subject__name')
+        .annotate(**grade_aggregates())
+        .order_by('subject_id')
+    )
+    return [summarize({'id': row['subject_id'], 'name': row['subject__name']}, row) for row in rows]
+
+
+def professor_report():
+    rows = (
+        Enrollment.objects.filter(subject__professors__isnull=False)
+        .values('subject__professors', 'subject__professors__first_name', 'subject__professors__last_name',
+                'subject__professors__department')
+        .annotate(**grade_aggregates())
+        .order_by('subject__professors')
+    )
+    return [
+        summarize({
+            'id': row['subject__professors'],
+            'name': f"{row['subject__professors__first_name']} {row['subject__professors__last_name']}",
+            'department': row['subject__professors__department'],
+        }, row)
+        for row in rows
+    ]
+
+
+def department_report():
+    # A subject taught by several professors of one department would repeat
+    # its enrollments in the join; only the lowest-id professor per
+    # (subject, department) is kept so each enrollment counts once.
+    Through = Professor.subjects.through
+    colleague_with_lower_id = Through.objects.filter(
+        subject_id=OuterRef('subject_id'),
+        professor__department=OuterRef('subject__professors__department'),
+        professor_id__lt=OuterRef('subject__professors'),
+    )
+    rows = (
+        Enrollment.objects.filter(~Exists(colleague_with_lower_id), subject__professors__isnull=False)
+        .values('subject__professors__department')
+        .annotate(**grade_aggregates())
+        .order_by('subject__professors__department')
+    )
+    return [summarize({'name': row['subject__professors__department']}, row) for row in rows]
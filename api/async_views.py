@@ -0,0 +1,174 @@
+"""
+Async versions of the heaviest read endpoints, for deployments served through
+``drf/asgi.py``. They use Django's async ORM directly instead of DRF views and
+return the same JSON as their synchronous counterparts.
+
+The async ORM still runs every query through ``sync_to_async`` on a single
+thread per request, so queries are awaited one after another; what these
+views gain is that the event loop serves other requests while they wait.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+
+from .models import Enrollment, Professor, Student, Subject
+
+MAX_PAGE_SIZE = 500
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+def async_api_view(view):
+    """
+    Authenticate with the configured DRF authentication classes (in a worker
+    thread, since they may query the user table) and require a user, like the
+    default ``IsAuthenticated`` permission.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = None
+        for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                result = await sync_to_async(authentication_class().authenticate)(request)
+            except exceptions.AuthenticationFailed as exc:
+                return _json({'detail': exc.detail}, status=401)
+            if result is not None:
+                user = result[0]
+                break
+        if user is None or not user.is_authenticated:
+            return _json({'detail': exceptions.NotAuthenticated.default_detail}, status=401)
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _subject_data(subject, prerequisites):
+    return {
+        'id': subject.pk,
+        'name': subject.name,
+        'description': subject.description,
+        'prerequisites': prerequisites.get(subject.pk, []),
+    }
+
+
+def _enrollment_data(enrollment):
+    return {
+        'id': enrollment.pk,
+        'student': enrollment.student_id,
+        'subject': enrollment.subject_id,
+        'enrollment_date': enrollment.enrollment_date.isoformat(),
+        'grade': None if enrollment.grade is None else float(enrollment.grade),
+        'is_passed': enrollment.is_passed(),
+    }
+
+
+async def _prerequisites_by_subject(edges):
+    prerequisites = {}
+    async for subject_id, prerequisite_id in edges:
+        prerequisites.setdefault(subject_id, []).append(prerequisite_id)
+    return prerequisites
+
+
+@async_api_view
+async def student_stats(request, pk):
+    """
+    Async ``GET /student/{id}/stats/``: the student with its grade summary,
+    its enrollments and the prerequisites of those subjects, in three queries.
+    """
+    try:
+        student = await Student.objects.select_related('grade_summary').aget(pk=pk)
+    except Student.DoesNotExist:
+        return _json({'error': 'Student not found.'}, status=404)
+    enrollments = [
+        enrollment async for enrollment in
+        Enrollment.objects.filter(student_id=pk).select_related('subject').order_by('id')
+    ]
+    prerequisites = await _prerequisites_by_subject(
+        Subject.prerequisites.through.objects
+        .filter(from_subject__enrollment__student_id=pk)
+        .values_list('from_subject_id', 'to_subject_id')
+        .order_by('to_subject_id')
+    )
+
+    summary = getattr(student, 'grade_summary', None)
+    if summary is not None:
+        average_grade = summary.average_grade
+    else:
+        # Same fallback as Student.average_grade().
+        grades = [enrollment.grade for enrollment in enrollments if enrollment.grade is not None]
+        average_grade = sum(grades) / len(grades) if grades else None
+    return _json({
+        'id': student.pk,
+        'first_name': student.first_name,
+        'last_name': student.last_name,
+        'email': student.email,
+        'date_of_birth': student.date_of_birth.isoformat(),
+        'enrollment_date': student.enrollment_date.isoformat(),
+        'approved_subjects': [
+            _subject_data(enrollment.subject, prerequisites)
+            for enrollment in enrollments if enrollment.is_passed()
+        ],
+        'average_grade': average_grade,
+        'failed_subjects': [
+            _subject_data(enrollment.subject, prerequisites)
+            for enrollment in enrollments if enrollment.grade is not None and enrollment.grade < 3.0
+        ],
+        'enrollments': [_enrollment_data(enrollment) for enrollment in enrollments],
+    })
+
+
+@async_api_view
+async def professor_student_grades(request, pk):
+    """
+    Async ``GET /professor/{id}/student_grades/`` (``?subject=`` supported).
+    One query for the professor, one for their subjects and one for all
+    matching enrollments.
+    """
+    subjects = Subject.objects.filter(professors=pk)
+    enrollments = Enrollment.objects.filter(subject__professors=pk)
+    subject_id = request.GET.get('subject')
+    if subject_id:
+        if not subject_id.isdigit():
+            return _json({'error': 'Invalid subject ID.'}, status=400)
+        subjects = subjects.filter(pk=subject_id)
+        enrollments = enrollments.filter(subject_id=subject_id)
+
+    if not await Professor.objects.filter(pk=pk).aexists():
+        return _json({'detail': 'No Professor matches the given query.'}, status=404)
+    subjects = [subject async for subject in subjects.values_list('id', 'name')]
+    enrollments = [row async for row in enrollments.values_list('subject_id', 'student_id', 'grade').order_by('id')]
+
+    grades = {subject_id: [] for subject_id, _ in subjects}
+    for subject_id, student_id, grade in enrollments:
+        grades[subject_id].append({'student': student_id, 'grade': None if grade is None else float(grade)})
+    return _json({name: grades[subject_id] for subject_id, name in subjects})
+
+
+@async_api_view
+async def enrollment_list(request):
+    """
+    Async ``GET /enrollment/`` with keyset pagination: pass the ``next`` link
+    (``?after=<last id>``) to continue, and ``?page_size=`` to size pages.
+    """
+    after = request.GET.get('after', '0')
+    page_size = request.GET.get('page_size', str(api_settings.PAGE_SIZE))
+    if not after.isdigit() or not page_size.isdigit() or not 0 < int(page_size) <= MAX_PAGE_SIZE:
+        return _json({'error': 'Invalid pagination parameters.'}, status=400)
+    page_size = int(page_size)
+
+    rows = [
+        enrollment async for enrollment in
+        Enrollment.objects.filter(pk__gt=int(after)).order_by('id')[:page_size + 1]
+    ]
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        query = request.GET.copy()
+        query['after'] = rows[-1].pk
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+    return _json({'next': next_url, 'previous': None, 'results': [_enrollment_data(row) for row in rows]})
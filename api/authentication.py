@@ -0,0 +1,141 @@
+"""
+JWT authentication that skips the per-request ``User`` query.
+
+Validated users are kept in a small per-process LRU cache with a short TTL.
+Saving or deleting a ``User`` drops it from the local cache at once and, via
+a version number in the shared cache, from every other process within
+``JWT_USER_CACHE['CHECK_INTERVAL']`` seconds (see api/signals.py). Changes
+that bypass model signals (``QuerySet.update``) are picked up when the entry
+expires.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+DEFAULTS = {
+    # Seconds a cached user is trusted.
+    'TIMEOUT': 30,
+    # Users kept per process.
+    'MAX_SIZE': 10000,
+    # Seconds between checks of the shared invalidation version.
+    'CHECK_INTERVAL': 1.0,
+    # Build the user from the token's is_staff / professor_id claims without
+    # touching the database or the cache. Deactivating a user then only takes
+    # effect when their access token expires.
+    'TRUST_TOKEN_CLAIMS': False,
+}
+
+_VERSION_KEY = 'api:jwt_users:version'
+
+
+def user_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'JWT_USER_CACHE', {})}
+
+
+class UserCache:
+    """
+    Thread-safe LRU of ``user_id -> (expires_at, user)``.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.version = None
+        self.checked_at = 0.0
+
+    def get(self, user_id, config):
+        now = time.monotonic()
+        if now - self.checked_at >= config['CHECK_INTERVAL']:
+            self.sync(now)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, user, config):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + config['TIMEOUT'], user)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > config['MAX_SIZE']:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def sync(self, now):
+        # Another process changed a user: forget everything rather than
+        # tracking which ids changed.
+        version = cache.get(_VERSION_KEY, 0)
+        with self.lock:
+            if self.version is not None and version != self.version:
+                self.entries.clear()
+            self.version = version
+            self.checked_at = now
+
+
+user_cache = UserCache()
+
+
+def invalidate_cached_user(user_id):
+    user_cache.invalidate(user_id)
+    try:
+        version = cache.incr(_VERSION_KEY)
+    except ValueError:
+        version = 1
+        cache.set(_VERSION_KEY, version, None)
+    with user_cache.lock:
+        # Our own bump: this process already dropped the user.
+        if user_cache.version == version - 1:
+            user_cache.version = version
+
+
+class ClaimsUser(TokenUser):
+    """
+    Stateless user built from the claims added by
+    ``ClaimsTokenObtainPairSerializer``.
+    """
+
+    @property
+    def professor_id(self):
+        return self.token.get('professor_id')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        config = user_cache_settings()
+        if config['TRUST_TOKEN_CLAIMS'] and 'is_staff' in validated_token:
+            return ClaimsUser(validated_token)
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id, config) if user_id is not None else None
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user, config)
+        elif api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        # Each request gets its own instance, so nothing set on request.user
+        # leaks into other requests.
+        return copy.copy(user)
@@ -0,0 +1,88 @@
+"""
+Versioned response cache for the read-heavy catalog endpoints.
+
+Each namespace (``subject``, ``professor``) has a version token stored in the
+shared cache. Cached list and retrieve responses are keyed by that token, so
+bumping it from a model signal invalidates every entry of the namespace at
+once, across processes, without having to enumerate keys.
+"""
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .replicas import using_primary
+
+
+def _version_key(namespace):
+    return f'api:responses:{namespace}:version'
+
+
+def get_version(namespace):
+    """
+    The namespace's current ``(token, last_modified)`` pair.
+    """
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, (uuid.uuid4().hex, int(time.time())), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(*namespaces):
+    now = int(time.time())
+    cache.set_many({_version_key(namespace): (uuid.uuid4().hex, now) for namespace in namespaces}, None)
+
+
+class CachedResponseMixin:
+    """
+    Serves ``list`` and ``retrieve`` from the cache with an ETag (and an
+    informational Last-Modified), answering If-None-Match with 304 before
+    touching the database. Set ``cache_namespace`` on the ViewSet; other actions can call
+    ``cached_response`` with a namespace of their own.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, 'list', lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        kind = f'object:{kwargs.get(self.lookup_url_kwarg or self.lookup_field)}'
+        return self.cached_response(request, kind, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
+
+    def cached_response(self, request, kind, compute, namespace=None):
+        namespace = namespace or self.cache_namespace
+        token, last_modified = get_version(namespace)
+        digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        etag = quote_etag(f'{token}-{digest}')
+
+        # Only the ETag decides. Last-Modified has one-second resolution, so
+        # two bumps within a second would answer If-Modified-Since with a
+        # wrong 304; it is sent for information only.
+        not_modified = get_conditional_response(request._request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        key = f'api:responses:{namespace}:{kind}:{token}:{digest}'
+        data = cache.get(key)
+        if data is None:
+            # Computed on the primary: a lagging replica could store stale
+            # data under a version that was just bumped.
+            with using_primary():
+                response = compute()
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(key, data, settings.API_RESPONSE_CACHE_TIMEOUT)
+
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
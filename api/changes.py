@@ -0,0 +1,142 @@
+"""
+Incremental change feed of enrollments.
+
+Every enrollment write sets the row's ``change_seq`` to None ("changed,
+not numbered yet") and every delete leaves an ``EnrollmentTombstone`` with
+none either. ``Enrollment.save`` and the post_delete signal handle single
+rows; bulk paths (``bulk_create``, ``bulk_update``) must call
+``mark_changed`` on the objects and write ``change_seq`` with them.
+
+Writers take no shared lock. The numbers are handed out by the reader:
+``changes_since`` first numbers the committed rows still waiting, in one
+transaction that holds the ``enrollment`` ``ChangeCounter`` row. Uncommitted
+writes are invisible to it and get numbered by a later read, after every
+number already served, so a client that has seen everything up to N only
+needs what is above N.
+
+So a feed read may write, and always runs on the primary. Readers only
+take the counter lock when something is waiting; polling an idle feed is
+a plain indexed read.
+
+Tombstones older than the retention window are removed by
+``manage.py purge_enrollment_tombstones``. A token from before the purge
+could miss deletes, so it is refused and the client must resync from 0.
+"""
+from django.db import transaction
+
+from .models import ENROLLMENT_FEED, ENROLLMENT_TOMBSTONES_PURGED, ChangeCounter, Enrollment, EnrollmentTombstone
+from .replicas import using_primary
+
+MAX_CHANGES_PAGE_SIZE = 5000
+NUMBERING_BATCH_SIZE = 500
+
+
+class TokenExpired(Exception):
+    pass
+
+
+def mark_changed(enrollments):
+    """
+    Queue ``enrollments`` for the change feed. Include ``change_seq`` in
+    the fields of a ``bulk_update``.
+    """
+    enrollments = list(enrollments)
+    for enrollment in enrollments:
+        enrollment.change_seq = None
+    return enrollments
+
+
+def record_tombstone(enrollment):
+    EnrollmentTombstone.objects.create(
+        enrollment_id=enrollment.pk,
+        student_id=enrollment.student_id,
+        subject_id=enrollment.subject_id,
+    )
+
+
+def purged_through():
+    return ChangeCounter.objects.filter(name=ENROLLMENT_TOMBSTONES_PURGED).values_list('value', flat=True).first() or 0
+
+
+def _number_waiting(limit):
+    """
+    Number up to ``limit`` waiting rows of each kind; returns whether any
+    were left for a later read.
+    """
+    waiting = [model for model in (Enrollment, EnrollmentTombstone) if model.objects.filter(change_seq__isnull=True).exists()]
+    if not waiting:
+        return False
+    ChangeCounter.allocate(ENROLLMENT_FEED, 0)
+    left = False
+    for model in waiting:
+        ids = list(
+            model.objects.filter(change_seq__isnull=True).order_by('pk').values_list('pk', flat=True)[:limit + 1]
+        )
+        left = left or len(ids) > limit
+        ids = ids[:limit]
+        if ids:
+            first = ChangeCounter.allocate(ENROLLMENT_FEED, len(ids))
+            model.objects.bulk_update(
+                [model(pk=pk, change_seq=first + offset) for offset, pk in enumerate(ids)],
+                ['change_seq'],
+                batch_size=NUMBERING_BATCH_SIZE,
+            )
+    return left
+
+
+def changes_since(since, limit):
+    """
+    Up to ``limit`` changes with a sequence number above ``since``, oldest
+    first, as ``(changes, next_since, has_more)``. An enrollment changed
+    several times appears once, with its latest state.
+    """
+    with using_primary(), transaction.atomic():
+        if since and since < purged_through():
+            raise TokenExpired()
+        waiting = _number_waiting(limit)
+        upserts = list(
+            Enrollment.objects.filter(change_seq__gt=since)
+            .order_by('change_seq')
+            .values('change_seq', 'id', 'student_id', 'subject_id', 'enrollment_date', 'grade')[:limit + 1]
+        )
+        deletes = list(
+            EnrollmentTombstone.objects.filter(change_seq__gt=since)
+            .order_by('change_seq')
+            .values('change_seq', 'enrollment_id', 'student_id', 'subject_id')[:limit + 1]
+        )
+    changes = sorted(
+        [
+            {
+                'op': 'upsert', 'seq': row['change_seq'], 'id': row['id'], 'student': row['student_id'],
+                'subject': row['subject_id'], 'enrollment_date': row['enrollment_date'], 'grade': row['grade'],
+            }
+            for row in upserts
+        ] + [
+            {
+                'op': 'delete', 'seq': row['change_seq'], 'id': row['enrollment_id'],
+                'student': row['student_id'], 'subject': row['subject_id'],
+            }
+            for row in deletes
+        ],
+        key=lambda change: change['seq'],
+    )
+    has_more = len(changes) > limit or waiting
+    changes = changes[:limit]
+    return changes, (changes[-1]['seq'] if changes else since), has_more
+
+
+def purge_tombstones(before):
+    """
+    Delete the numbered tombstones recorded before ``before`` (a datetime)
+    and remember the newest purged sequence number. Returns how many were
+    deleted.
+    """
+    old = EnrollmentTombstone.objects.filter(deleted_at__lt=before, change_seq__isnull=False)
+    newest = old.order_by('-change_seq').values_list('change_seq', flat=True).first()
+    if newest is None:
+        return 0
+    deleted, _ = old.filter(change_seq__lte=newest).delete()
+    updated = ChangeCounter.objects.filter(name=ENROLLMENT_TOMBSTONES_PURGED, value__lt=newest).update(value=newest)
+    if not updated:
+        ChangeCounter.objects.get_or_create(name=ENROLLMENT_TOMBSTONES_PURGED, defaults={'value': newest})
+    return deleted
@@ -0,0 +1,84 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When several threads of one process ask for the same key at the same time,
+the first one (the leader) computes the result and the others wait for it
+and share it, data or exception, instead of running the same queries again.
+Nothing is kept once the leader finishes: a request arriving afterwards
+computes afresh, so this never serves a result older than the request that
+is already running. Coalescing is per process; with several workers each
+one computes at most once per key at a time.
+"""
+import threading
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from .replicas import read_alias
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, compute, timeout=None):
+        """
+        Return ``compute()``, shared with any concurrent call for ``key``.
+        A follower that waits longer than ``timeout`` seconds gives up and
+        computes on its own.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            return compute()
+
+        try:
+            call.result = compute()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+flight = SingleFlight()
+
+
+def coalesced_response(request, key, compute):
+    """
+    Run the view code ``compute`` once for concurrent requests with the
+    same ``key`` and full path that read from the same database (a user
+    pinned to the primary never gets a replica's result). Only data and
+    status are shared; every request gets its own ``Response`` to render.
+    ``compute`` must return a ``Response`` whose data doesn't depend on who
+    is asking.
+    """
+    def frozen():
+        response = compute()
+        return response.data, response.status_code
+
+    data, status_code = flight.do(
+        (key, request.get_full_path(), read_alias()), frozen, getattr(settings, 'API_COALESCE_TIMEOUT', None),
+    )
+    return Response(data, status=status_code)
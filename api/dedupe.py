@@ -0,0 +1,60 @@
+"""
+Removal of duplicate enrollments (the same student enrolled twice in the
+same subject), needed before migration 0005 adds the unique constraint.
+
+Works on the models of a migration state (``apps``), not on api.models,
+because it runs against databases still at 0004: the current Enrollment has
+columns those don't, and its delete signals would write tombstones and
+summaries that don't exist yet. Used by ``manage.py dedupe_enrollments``;
+migration 0005 runs a frozen copy.
+"""
+from django.db.models import Count
+
+from .summary import summary_totals
+
+
+def remove_duplicate_enrollments(apps, batch_size=1000, dry_run=False, log=None):
+    """
+    Keep the most recent graded row of every duplicated pair (or the most
+    recent row if none is graded), delete the others and recompute the
+    grade summaries of the students involved. Returns
+    ``(removed, pair_count)``.
+    """
+    Enrollment = apps.get_model('api', 'Enrollment')
+    pairs = list(
+        Enrollment.objects.values_list('student_id', 'subject_id')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+        .values_list('student_id', 'subject_id')
+        .order_by('student_id', 'subject_id')
+    )
+    removed = 0
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        groups = {}
+        enrollments = Enrollment.objects.filter(
+            student_id__in={student_id for student_id, _ in batch},
+            subject_id__in={subject_id for _, subject_id in batch},
+        ).values_list('id', 'student_id', 'subject_id', 'grade')
+        for enrollment_id, student_id, subject_id, grade in enrollments:
+            groups.setdefault((student_id, subject_id), []).append((grade is not None, enrollment_id))
+
+        duplicate_ids = []
+        for pair in batch:
+            rows = sorted(groups[pair])
+            duplicate_ids += [enrollment_id for _, enrollment_id in rows[:-1]]
+            if log:
+                log(f'Student {pair[0]}, subject {pair[1]}: keeping {rows[-1][1]}, removing {len(rows) - 1}')
+
+        removed += len(duplicate_ids)
+        if not dry_run:
+            Enrollment.objects.filter(pk__in=duplicate_ids).delete()
+            _refresh_summaries(apps, {student_id for student_id, _ in batch})
+    return removed, len(pairs)
+
+
+def _refresh_summaries(apps, student_ids):
+    Enrollment = apps.get_model('api', 'Enrollment')
+    StudentGradeSummary = apps.get_model('api', 'StudentGradeSummary')
+    for row in summary_totals(Enrollment.objects.filter(student_id__in=student_ids)):
+        StudentGradeSummary.objects.filter(student_id=row.pop('student_id')).update(**row)
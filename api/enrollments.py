@@ -0,0 +1,46 @@
+"""
+The enrollment write path shared by /enrollment/enroll/ and student
+registration.
+
+Rows go in with ``bulk_create(ignore_conflicts=True)`` against the
+``(student, subject)`` unique constraint, so a request racing another one
+for the same pair, or retried after a timeout, never fails or duplicates a
+row. Callers run it inside their transaction.
+"""
+from django.db import transaction
+
+from .changes import mark_changed
+from .models import Enrollment, Student, Subject
+from .prerequisites import evaluate_prerequisites
+from .signals import grades_changed
+from .summary import refresh_summaries
+
+
+def add_enrollments(student, subjects):
+    """
+    Enroll ``student`` in ``subjects``, skipping pairs that already exist,
+    and bring the grade summary and analytics up to date.
+    """
+    if not subjects:
+        return
+    Enrollment.objects.bulk_create(
+        mark_changed(Enrollment(student=student, subject=subject) for subject in subjects), ignore_conflicts=True,
+    )
+    refresh_summaries([student.pk])
+    grades_changed.send(sender=Enrollment, subject_ids={subject.pk for subject in subjects}, student_ids={student.pk})
+
+
+def enroll_student(student_id, subject_ids):
+    """
+    Check prerequisites and enroll in one transaction. The student row is
+    locked first (SELECT ... FOR UPDATE where supported), so concurrent
+    enrollments of one student are checked and applied one after the other.
+    Returns the ``PrerequisiteReport``; nothing is written unless it is ok.
+    Raises ``Student.DoesNotExist``.
+    """
+    with transaction.atomic():
+        student = Student.objects.select_for_update().get(pk=student_id)
+        report = evaluate_prerequisites(student, Subject.objects.filter(pk__in=subject_ids))
+        if report.ok:
+            add_enrollments(student, report.new_subjects)
+    return report
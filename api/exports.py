@@ -0,0 +1,107 @@
+"""
+Streaming CSV / JSON Lines exports of enrollments.
+
+Rows are read through a chunked ``.iterator()`` cursor and written out in
+blocks of roughly ``EXPORT_BLOCK_SIZE`` bytes, optionally compressed on the
+fly, so memory use doesn't depend on how many enrollments are exported.
+"""
+import csv
+import io
+import zlib
+
+import brotli
+import orjson
+from django.http import StreamingHttpResponse
+from rest_framework.response import Response
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BLOCK_SIZE = 64 * 1024
+EXPORT_COLUMNS = ['enrollment_id', 'student_id', 'student_name', 'subject_id', 'subject_name', 'grade', 'enrollment_date']
+
+OUTPUT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+COMPRESSIONS = ('gzip', 'br')
+
+
+def export_row(enrollment):
+    student = enrollment.student
+    return [
+        enrollment.pk,
+        enrollment.student_id,
+        f'{student.first_name} {student.last_name}',
+        enrollment.subject_id,
+        enrollment.subject.name,
+        enrollment.grade,
+        enrollment.enrollment_date.isoformat(),
+    ]
+
+
+def iter_csv(enrollments):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for enrollment in enrollments:
+        writer.writerow(export_row(enrollment))
+        if buffer.tell() >= EXPORT_BLOCK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def iter_jsonl(enrollments):
+    block = bytearray()
+    for enrollment in enrollments:
+        block += orjson.dumps(dict(zip(EXPORT_COLUMNS, export_row(enrollment))))
+        block += b'\n'
+        if len(block) >= EXPORT_BLOCK_SIZE:
+            yield bytes(block)
+            block.clear()
+    yield bytes(block)
+
+
+def iter_compressed(blocks, compression):
+    if compression == 'gzip':
+        # wbits=31 writes a gzip header and trailer around the deflate stream.
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    else:
+        compressor = brotli.Compressor(quality=5)
+        compress, finish = compressor.process, compressor.finish
+    for block in blocks:
+        data = compress(block)
+        if data:
+            yield data
+    yield finish()
+
+
+def export_response(request, queryset, filename):
+    """
+    Stream ``queryset`` (enrollments) as ``?output=csv`` (default) or
+    ``?output=jsonl``, compressed with ``?compress=gzip|br`` when asked.
+    Compressed output is sent with a matching Content-Encoding header.
+    """
+    output = request.query_params.get('output', 'csv')
+    if output not in OUTPUT_CONTENT_TYPES:
+        return Response({'error': 'output must be csv or jsonl.'}, status=400)
+    compression = request.query_params.get('compress')
+    if compression and compression not in COMPRESSIONS:
+        return Response({'error': 'compress must be gzip or br.'}, status=400)
+
+    enrollments = (
+        queryset.select_related('student', 'subject')
+        .only('id', 'student_id', 'subject_id', 'grade', 'enrollment_date',
+              'student__first_name', 'student__last_name', 'subject__name')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    blocks = iter_csv(enrollments) if output == 'csv' else iter_jsonl(enrollments)
+    if compression:
+        blocks = iter_compressed(blocks, compression)
+
+    response = StreamingHttpResponse(blocks, content_type=OUTPUT_CONTENT_TYPES[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    if compression:
+        response['Content-Encoding'] = compression
+    return response
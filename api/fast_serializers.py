@@ -0,0 +1,220 @@
+"""
+Read-only serializers that build the response dicts straight from
+``.values()`` rows instead of model instances and per-field
+``to_representation`` calls.
+
+Each one produces exactly what its ModelSerializer counterpart in
+api/serializer.py produces: same keys in the same order, same value types,
+same ``?fields=`` pruning. Keep the two in step; api/tests.py compares
+their rendered output byte for byte.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from .models import Enrollment, Subject
+from .serializer import requested_fields
+
+
+def _date(value):
+    return value.isoformat() if value is not None else None
+
+
+class FastSerializer:
+    fields = ()
+    value_fields = ()
+
+    def __init__(self, rows, fields=None):
+        self.rows = list(rows)
+        self.fields = [name for name in self.fields if fields is None or name in fields]
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.value_fields)
+
+    @property
+    def data(self):
+        return self.to_representation(self.rows)
+
+    def to_representation(self, rows):
+        raise NotImplementedError
+
+
+def prerequisite_ids(subject_ids):
+    """
+    Map each subject id to the ids of its direct prerequisites, ascending.
+    """
+    prerequisites = defaultdict(list)
+    edges = (
+        Subject.prerequisites.through.objects
+        .filter(from_subject_id__in=subject_ids)
+        .order_by('from_subject_id', 'to_subject_id')
+        .values_list('from_subject_id', 'to_subject_id')
+    )
+    for subject_id, prerequisite_id in edges:
+        prerequisites[subject_id].append(prerequisite_id)
+    return prerequisites
+
+
+class FastSubjectSerializer(FastSerializer):
+    fields = ('id', 'name', 'description', 'prerequisites')
+    value_fields = ('id', 'name', 'description')
+
+    def to_representation(self, rows):
+        prerequisites = {}
+        if 'prerequisites' in self.fields:
+            prerequisites = prerequisite_ids([row['id'] for row in rows])
+        return [self.subject(row, prerequisites) for row in rows]
+
+    def subject(self, row, prerequisites):
+        data = {}
+        for name in self.fields:
+            data[name] = prerequisites.get(row['id'], []) if name == 'prerequisites' else row[name]
+        return data
+
+
+class FastEnrollmentSerializer(FastSerializer):
+    fields = ('id', 'student', 'subject', 'enrollment_date', 'grade', 'is_passed')
+    value_fields = ('id', 'student_id', 'subject_id', 'enrollment_date', 'grade')
+
+    def to_representation(self, rows):
+        return [self.enrollment(row) for row in rows]
+
+    def enrollment(self, row):
+        grade = row['grade']
+        values = {
+            'id': row['id'],
+            'student': row['student_id'],
+            'subject': row['subject_id'],
+            'enrollment_date': _date(row['enrollment_date']),
+            'grade': grade,
+            'is_passed': grade is not None and grade >= 3.0,
+        }
+        return {name: values[name] for name in self.fields}
+
+
+class FastStudentSerializer(FastSerializer):
+    """
+    Two extra queries at most: the students' enrollments with their subjects,
+    and the prerequisites of those subjects. The average comes from the
+    joined grade summary.
+    """
+    fields = ('id', 'first_name', 'last_name', 'email', 'date_of_birth', 'enrollment_date',
+              'approved_subjects', 'average_grade', 'failed_subjects', 'enrollments')
+    value_fields = ('id', 'first_name', 'last_name', 'email', 'date_of_birth', 'enrollment_date',
+                    'grade_summary__graded_count', 'grade_summary__grade_sum')
+    enrollment_fields = FastEnrollmentSerializer.value_fields + ('subject__name', 'subject__description')
+
+    def to_representation(self, rows):
+        enrollments = defaultdict(list)
+        prerequisites = {}
+        if {'approved_subjects', 'failed_subjects', 'enrollments'} & set(self.fields):
+            queryset = (
+                Enrollment.objects.filter(student_id__in=[row['id'] for row in rows])
+                .order_by('id')
+                .values(*self.enrollment_fields)
+            )
+            for enrollment in queryset:
+                enrollments[enrollment['student_id']].append(enrollment)
+            if {'approved_subjects', 'failed_subjects'} & set(self.fields):
+                prerequisites = prerequisite_ids({
+                    enrollment['subject_id'] for student_enrollments in enrollments.values()
+                    for enrollment in student_enrollments
+                })
+
+        averages = {}
+        if 'average_grade' in self.fields:
+            averages = self.averages(rows)
+
+        enrollment_serializer = FastEnrollmentSerializer([])
+        return [
+            self.student(row, enrollments[row['id']], prerequisites, averages, enrollment_serializer)
+            for row in rows
+        ]
+
+    def averages(self, rows):
+        averages = {}
+        missing = []
+        for row in rows:
+            graded_count = row['grade_summary__graded_count']
+            if graded_count is None:
+                missing.append(row['id'])
+            else:
+                averages[row['id']] = row['grade_summary__grade_sum'] / graded_count if graded_count else None
+        if missing:
+            # No summary row yet; same fallback as Student.average_grade().
+            grades = defaultdict(list)
+            for student_id, grade in Enrollment.objects.filter(student_id__in=missing, grade__isnull=False).values_list('student_id', 'grade'):
+                grades[student_id].append(grade)
+            for student_id in missing:
+                averages[student_id] = sum(grades[student_id]) / len(grades[student_id]) if grades[student_id] else None
+        return averages
+
+    def student(self, row, enrollments, prerequisites, averages, enrollment_serializer):
+        data = {}
+        for name in self.fields:
+            if name == 'approved_subjects':
+                value = [
+                    self.subject(enrollment, prerequisites) for enrollment in enrollments
+                    if enrollment['grade'] is not None and enrollment['grade'] >= 3.0
+                ]
+            elif name == 'failed_subjects':
+                value = [
+                    self.subject(enrollment, prerequisites) for enrollment in enrollments
+                    if enrollment['grade'] is not None and enrollment['grade'] < 3.0
+                ]
+            elif name == 'average_grade':
+                value = averages[row['id']]
+            elif name == 'enrollments':
+                value = [enrollment_serializer.enrollment(enrollment) for enrollment in enrollments]
+            elif name in ('date_of_birth', 'enrollment_date'):
+                value = _date(row[name])
+            else:
+                value = row[name]
+            data[name] = value
+        return data
+
+    @staticmethod
+    def subject(enrollment, prerequisites):
+        return {
+            'id': enrollment['subject_id'],
+            'name': enrollment['subject__name'],
+            'description': enrollment['subject__description'],
+            'prerequisites': prerequisites.get(enrollment['subject_id'], []),
+        }
+
+
+class FastReadMixin:
+    """
+    Serves ``list`` and ``retrieve`` through ``fast_serializer_class`` when
+    ``API_FAST_SERIALIZERS`` is on. Pagination works on the ``.values()``
+    rows directly. Put it after CachedResponseMixin so cached responses are
+    built by the fast path.
+    """
+    fast_serializer_class = None
+
+    def fast_queryset(self):
+        return self.fast_serializer_class.values(self.queryset.model._default_manager.all())
+
+    def use_fast_serializer(self):
+        return getattr(settings, 'API_FAST_SERIALIZERS', False)
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_serializer():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.fast_queryset())
+        page = self.paginate_queryset(queryset)
+        data = self.fast_serializer_class(page if page is not None else queryset, requested_fields(request)).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fast_serializer():
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(self.fast_queryset(), **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(self.fast_serializer_class([row], requested_fields(request)).data[0])
@@ -0,0 +1,79 @@
+"""
+``Idempotency-Key`` support for write endpoints.
+
+The first request with a given key runs and, if it succeeds, its response
+is stored in the cache for ``API_IDEMPOTENCY_TIMEOUT`` seconds. Retries
+with the same key and body get the stored response back (marked with
+``Idempotent-Replayed: true``) without touching the database. Keys are
+scoped per user, method and path. Reusing a key with a different body is
+rejected with 422, and a retry that arrives while the first request is still
+running gets 409. Failed responses are not stored, so the client can fix the
+request and retry with the same key. Use a shared cache (``REDIS_URL``) for
+keys to be honoured across processes.
+"""
+import hashlib
+
+import orjson
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Seconds the "in progress" marker outlives a request that died without
+# clearing it.
+IN_PROGRESS_TIMEOUT = 60
+
+
+def _fingerprint(request):
+    body = orjson.dumps(request.data, default=str, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(body).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response({'error': f'{IDEMPOTENCY_HEADER} was already used with a different request.'}, status=422)
+    if 'status' not in stored:
+        return Response({'error': f'A request with this {IDEMPOTENCY_HEADER} is still in progress.'}, status=409)
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent_response(request, compute):
+    """
+    ``compute()`` unless the request carries an ``Idempotency-Key`` that was
+    already used, in which case the stored outcome is replayed.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return compute()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return Response({'error': f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters.'}, status=400)
+
+    owner = request.user.pk if request.user.is_authenticated else request.META.get('REMOTE_ADDR')
+    digest = hashlib.sha256(f'{owner}:{request.method}:{request.path}:{key}'.encode()).hexdigest()
+    cache_key = f'api:idempotency:{digest}'
+    fingerprint = _fingerprint(request)
+
+    if not cache.add(cache_key, {'fingerprint': fingerprint}, IN_PROGRESS_TIMEOUT):
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+        # Expired in between: take it over.
+        cache.set(cache_key, {'fingerprint': fingerprint}, IN_PROGRESS_TIMEOUT)
+
+    try:
+        response = compute()
+    except BaseException:
+        cache.delete(cache_key)
+        raise
+    if 200 <= response.status_code < 300:
+        cache.set(
+            cache_key,
+            {'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data},
+            settings.API_IDEMPOTENCY_TIMEOUT,
+        )
+    else:
+        cache.delete(cache_key)
+    return response
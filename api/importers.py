@@ -0,0 +1,195 @@
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .changes import mark_changed
+from .models import Student, Enrollment, StudentGradeSummary
+from .parsers import read_csv_rows
+from .prerequisites import get_prerequisite_graph
+from .signals import grades_changed
+
+
+class StudentImportRowSerializer(serializers.Serializer):
+    """
+    Validates one imported row. Email uniqueness is checked in bulk by
+    ``StudentImporter`` rather than with a query per row.
+    """
+    first_name = serializers.CharField(max_length=50)
+    last_name = serializers.CharField(max_length=50)
+    email = serializers.EmailField(max_length=254)
+    date_of_birth = serializers.DateField()
+    subject_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def to_internal_value(self, data):
+        subject_ids = data.get('subject_ids') if hasattr(data, 'get') else None
+        if isinstance(subject_ids, str):
+            data = dict(data)
+            data['subject_ids'] = [value for value in subject_ids.replace(',', ';').split(';') if value.strip()]
+        return super().to_internal_value(data)
+
+
+def iter_jsonl_rows(stream):
+    """
+    Lazily yield each line of a JSON Lines byte stream as a dict, or the
+    ``ValueError`` raised while decoding it.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield exc
+            continue
+        yield row if isinstance(row, dict) else ValueError('Expected a JSON object.')
+
+
+def iter_upload_rows(stream, file_format):
+    if file_format == 'jsonl':
+        return iter_jsonl_rows(stream)
+    return read_csv_rows(stream)
+
+
+class StudentImporter:
+    """
+    Imports students row by row from any iterable of dicts, validating and
+    inserting them in chunks of ``chunk_size`` with ``bulk_create``.
+
+    Emails are checked against the database once per chunk and against the
+    rest of the upload in memory. New students have not passed anything yet,
+    so subjects with prerequisites are rejected like unknown subjects.
+    Invalid rows are skipped and reported by their 1-based row number.
+    """
+    max_reported_errors = 1000
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or settings.STUDENT_IMPORT_CHUNK_SIZE
+        self.row_serializer = StudentImportRowSerializer()
+        self.created = 0
+        self.enrolled = 0
+        self.error_count = 0
+        self.errors = []
+        self._seen_emails = set()
+        graph = get_prerequisite_graph()
+        self._subject_ids = set(graph.names)
+        self._locked_subject_ids = {subject_id for subject_id, required in graph.prerequisites.items() if required}
+
+    def add_error(self, row_number, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def run(self, rows):
+        chunk = []
+        for row_number, row in enumerate(rows, start=1):
+            if isinstance(row, Exception):
+                self.add_error(row_number, {'non_field_errors': [str(row)]})
+                continue
+            try:
+                data = self.row_serializer.run_validation(row)
+            except serializers.ValidationError as exc:
+                self.add_error(row_number, exc.detail)
+                continue
+
+            subject_errors = self.check_subjects(data['subject_ids'])
+            if subject_errors:
+                self.add_error(row_number, {'subject_ids': subject_errors})
+                continue
+            if data['email'] in self._seen_emails:
+                self.add_error(row_number, {'email': ['Email duplicado en el archivo.']})
+                continue
+            self._seen_emails.add(data['email'])
+
+            chunk.append((row_number, data))
+            if len(chunk) >= self.chunk_size:
+                self.flush(chunk)
+                chunk = []
+        if chunk:
+            self.flush(chunk)
+        return self.report()
+
+    def check_subjects(self, subject_ids):
+        errors = []
+        for subject_id in subject_ids:
+            if subject_id not in self._subject_ids:
+                errors.append(f'Materia {subject_id} no encontrada.')
+            elif subject_id in self._locked_subject_ids:
+                errors.append(f'El estudiante no cumple con los requisitos previos para la materia {subject_id}.')
+        return errors
+
+    def flush(self, chunk):
+        rows = self.drop_existing_emails(chunk)
+        if not rows:
+            return
+        try:
+            with transaction.atomic():
+                self.insert([data for _, data in rows])
+            return
+        except IntegrityError as exc:
+            error = exc
+        # Another request may have inserted some of these emails after the
+        # check above; retry only if that was it.
+        remaining = self.drop_existing_emails(rows)
+        if len(remaining) < len(rows):
+            rows = remaining
+            if not rows:
+                return
+            try:
+                with transaction.atomic():
+                    self.insert([data for _, data in rows])
+                return
+            except IntegrityError as exc:
+                error = exc
+        # Something else, e.g. a subject deleted meanwhile: skip the chunk.
+        for row_number, _ in rows:
+            self.add_error(row_number, {'non_field_errors': [f'No se pudo guardar la fila: {error}']})
+
+    def drop_existing_emails(self, chunk):
+        existing = set(
+            Student.objects.filter(email__in=[data['email'] for _, data in chunk]).values_list('email', flat=True)
+        )
+        rows = []
+        for row_number, data in chunk:
+            if data['email'] in existing:
+                self.add_error(row_number, {'email': ['Ya existe un estudiante con este email.']})
+            else:
+                rows.append((row_number, data))
+        return rows
+
+    def insert(self, rows):
+        students = Student.objects.bulk_create([
+            Student(
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+                email=data['email'],
+                date_of_birth=data['date_of_birth'],
+            )
+            for data in rows
+        ])
+        enrollments = Enrollment.objects.bulk_create(mark_changed(
+            Enrollment(student_id=student.pk, subject_id=subject_id)
+            for student, data in zip(students, rows)
+            for subject_id in dict.fromkeys(data['subject_ids'])
+        ), batch_size=self.chunk_size)
+        StudentGradeSummary.objects.bulk_create([
+            StudentGradeSummary(student_id=student.pk, enrollment_count=len(set(data['subject_ids'])))
+            for student, data in zip(students, rows)
+        ])
+        grades_changed.send(
+            sender=Enrollment,
+            subject_ids={enrollment.subject_id for enrollment in enrollments},
+            student_ids={student.pk for student in students},
+        )
+        self.created += len(students)
+        self.enrolled += len(enrollments)
+
+    def report(self):
+        return {
+            'created': self.created,
+            'enrollments': self.enrolled,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
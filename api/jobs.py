@@ -0,0 +1,209 @@
+"""
+Database-backed background jobs.
+
+Bulk endpoints called with ``?async=1`` store a ``Job`` row and answer
+``202 Accepted`` with its ``/jobs/{id}/`` URL instead of doing the work in
+the request. ``manage.py run_worker`` claims queued jobs with a conditional
+UPDATE (so several workers never run the same job), runs them on a thread
+pool and records progress, result or error on the row. Only the configured
+database is needed; there is no broker.
+
+Handlers are registered per ``Job.kind`` with ``@job_handler`` and called
+as ``handler(payload, progress)``, where ``progress(done, total)`` updates
+the row. They return the JSON result or raise ``JobFailed``.
+"""
+import csv
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .importers import StudentImporter, iter_upload_rows
+from .models import Job, Student
+from .search import optimize_search_indexes
+from .serializer import GradeSerializer
+from .summary import refresh_summaries
+from .transcripts import BUILD_BATCH_SIZE, build_transcripts, stale_transcript_ids
+
+logger = logging.getLogger('api.jobs')
+
+DEFAULTS = {
+    # Jobs run at once by one run_worker process.
+    'WORKER_THREADS': 4,
+    # Seconds between polls of the queue when it is empty.
+    'POLL_INTERVAL': 1.0,
+    # Seconds without a heartbeat after which a running job is considered
+    # lost (its worker died) and queued again.
+    'STALE_AFTER': 300,
+    # Runs of a job, lost ones included, before it is marked failed.
+    'MAX_ATTEMPTS': 3,
+    # Storage directory for uploads waiting to be imported.
+    'UPLOAD_DIR': 'jobs/uploads',
+}
+
+HANDLERS = {}
+
+
+def jobs_settings():
+    return {**DEFAULTS, **getattr(settings, 'API_JOBS', {})}
+
+
+class JobFailed(Exception):
+    """
+    Ends a job as failed with ``detail`` (JSON) as its result.
+    """
+
+    def __init__(self, message, detail=None):
+        super().__init__(message)
+        self.detail = detail
+
+
+def job_handler(kind):
+    def register(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def enqueue(kind, payload, user=None):
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind {kind!r}.')
+    created_by_id = user.id if user is not None and user.is_authenticated else None
+    return Job.objects.create(kind=kind, payload=payload, created_by_id=created_by_id)
+
+
+def store_upload(stream, extension):
+    """
+    Save an upload for a job to read later and return its storage name.
+    """
+    name = f"{jobs_settings()['UPLOAD_DIR']}/{uuid.uuid4().hex}.{extension}"
+    return default_storage.save(name, stream if isinstance(stream, File) else File(stream, name=name))
+
+
+def claim_jobs(worker, limit):
+    """
+    Mark up to ``limit`` of the oldest queued jobs as running for ``worker``
+    and return them. Each claim is an UPDATE that only matches a job still
+    queued, so a job lost to another worker in between is skipped.
+    """
+    claimed = []
+    candidates = Job.objects.filter(status=Job.QUEUED).order_by('id').values_list('pk', flat=True)[:limit]
+    for job_id in candidates:
+        now = timezone.now()
+        updated = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1, started_at=now, heartbeat_at=now,
+        )
+        if updated:
+            claimed.append(Job.objects.get(pk=job_id))
+    return claimed
+
+
+def heartbeat(job_ids):
+    if job_ids:
+        Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+
+
+def requeue_stale_jobs():
+    """
+    Queue again the running jobs whose worker stopped sending heartbeats,
+    or fail them once they have used up their attempts.
+    """
+    config = jobs_settings()
+    cutoff = timezone.now() - timedelta(seconds=config['STALE_AFTER'])
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=config['MAX_ATTEMPTS']).update(
+        status=Job.FAILED, error='The worker running this job stopped responding.', finished_at=timezone.now(),
+    )
+    requeued = stale.update(status=Job.QUEUED, worker='')
+    return requeued, failed
+
+
+def run_job(job):
+    """
+    Run a claimed job in the current thread and record how it ended.
+    """
+    def progress(done, total=None):
+        fields = {'progress': done, 'heartbeat_at': timezone.now()}
+        if total is not None:
+            fields['total'] = total
+        Job.objects.filter(pk=job.pk).update(**fields)
+
+    # Only finish the job if it is still ours; a worker that was presumed
+    # dead must not overwrite the outcome of the run that replaced it.
+    ours = Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker)
+    try:
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            raise JobFailed(f'Unknown job kind {job.kind!r}.')
+        result = handler(job.payload, progress)
+    except JobFailed as exc:
+        ours.update(status=Job.FAILED, error=str(exc), result=exc.detail, finished_at=timezone.now())
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed', job.pk, job.kind)
+        ours.update(status=Job.FAILED, error=f'{type(exc).__name__}: {exc}', finished_at=timezone.now())
+    else:
+        ours.update(status=Job.SUCCEEDED, result=result, finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
+
+
+@job_handler('grade_subject')
+def grade_subject(payload, progress):
+    serializer = GradeSerializer(data=payload)
+    if not serializer.is_valid():
+        raise JobFailed('Invalid grades.', serializer.errors)
+    enrollments = serializer.save()
+    progress(len(enrollments), len(enrollments))
+    return {'status': 'Grades updated successfully.', 'updated': len(enrollments)}
+
+
+@job_handler('import_students')
+def import_students(payload, progress):
+    importer = StudentImporter(payload.get('chunk_size'))
+
+    def counted(rows):
+        for number, row in enumerate(rows, start=1):
+            if number % importer.chunk_size == 0:
+                progress(number)
+            yield row
+
+    try:
+        with default_storage.open(payload['path'], 'rb') as stream:
+            try:
+                report = importer.run(counted(iter_upload_rows(stream, payload['format'])))
+            except (csv.Error, UnicodeDecodeError) as exc:
+                report = importer.report()
+                report['error'] = f'Upload parse error - {exc}'
+                raise JobFailed(report['error'], report)
+    finally:
+        default_storage.delete(payload['path'])
+    optimize_search_indexes(connection)
+    progress(importer.created + importer.error_count)
+    return report
+
+
+@job_handler('rebuild_grade_summaries')
+def rebuild_grade_summaries(payload, progress):
+    batch_size = payload.get('batch_size', 1000)
+    student_ids = list(Student.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(student_ids), batch_size):
+        with transaction.atomic():
+            refresh_summaries(student_ids[start:start + batch_size])
+        progress(min(start + batch_size, len(student_ids)), len(student_ids))
+    return {'rebuilt': len(student_ids)}
+
+
+@job_handler('build_transcripts')
+def build_stale_transcripts(payload, progress):
+    batch_size = payload.get('batch_size', BUILD_BATCH_SIZE)
+    student_ids = list(stale_transcript_ids())
+    for start in range(0, len(student_ids), batch_size):
+        build_transcripts(student_ids[start:start + batch_size])
+        progress(min(start + batch_size, len(student_ids)), len(student_ids))
+    return {'built': len(student_ids)}
@@ -0,0 +1,127 @@
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.cache import bump_versions
+from api.models import Enrollment, Professor, Student, Subject
+
+ENDPOINTS = [
+    'student-list', 'subject-list', 'professor-list', 'enrollment-list',
+    'stats', 'students_per_subject', 'student_grades', 'grade_subject', 'enroll',
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main API endpoints in-process against the current database and '
+        'report p50/p95/p99 latency and query counts. Write endpoints run inside a '
+        'transaction that is rolled back. Seed data first with seed_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, help='Repeat to pick several; default all.')
+        parser.add_argument('--grades', type=int, default=200, help='Rows per grade_subject request.')
+        parser.add_argument('--cold', action='store_true', help='Invalidate the response cache before every request.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.options = options
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        self.client = APIClient(SERVER_NAME=host)
+        self.client.force_authenticate(User(username='benchmark', is_staff=True))
+
+        student_ids = list(Student.objects.values_list('pk', flat=True)[:1000])
+        professor_ids = list(
+            Professor.objects.annotate(subject_count=Count('subjects')).filter(subject_count__gt=0)
+            .values_list('pk', flat=True)[:1000]
+        )
+        if not student_ids or not professor_ids:
+            raise CommandError('Nothing to benchmark; run seed_data first.')
+        self.student_ids = student_ids
+        self.professor_ids = professor_ids
+
+        self.stdout.write(f'{"endpoint":<22}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>12}')
+        # Every request comes from the same user, far faster than the throttle rates allow.
+        with override_settings(API_THROTTLING=False):
+            for name in options['endpoint'] or ENDPOINTS:
+                self.run(name, getattr(self, 'request_' + name.replace('-', '_')))
+
+    def run(self, name, make_request):
+        timings = []
+        queries = []
+        for iteration in range(self.options['warmup'] + self.options['iterations']):
+            method, path, data = make_request()
+            if self.options['cold']:
+                bump_versions('subject', 'professor')
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(self.client, method)(path, data, format='json')
+                    elapsed = (time.perf_counter() - started) * 1000
+                transaction.set_rollback(True)
+            if response.status_code >= 400:
+                raise CommandError(f'{name}: {method.upper()} {path} returned {response.status_code}: {response.content[:200]!r}')
+            if iteration >= self.options['warmup']:
+                timings.append(elapsed)
+                queries.append(len(captured))
+
+        query_range = f'{min(queries)}' if min(queries) == max(queries) else f'{min(queries)}-{max(queries)}'
+        self.stdout.write(
+            f'{name:<22}{percentile(timings, .50):>10.2f}{percentile(timings, .95):>10.2f}'
+            f'{percentile(timings, .99):>10.2f}{query_range:>12}'
+        )
+
+    def request_student_list(self):
+        return 'get', '/api/v1/student/', None
+
+    def request_subject_list(self):
+        return 'get', '/api/v1/subject/', None
+
+    def request_professor_list(self):
+        return 'get', '/api/v1/professor/', None
+
+    def request_enrollment_list(self):
+        return 'get', '/api/v1/enrollment/', None
+
+    def request_stats(self):
+        return 'get', f'/api/v1/student/{self.random.choice(self.student_ids)}/stats/', None
+
+    def request_students_per_subject(self):
+        return 'get', f'/api/v1/professor/{self.random.choice(self.professor_ids)}/students_per_subject/', None
+
+    def request_student_grades(self):
+        return 'get', f'/api/v1/professor/{self.random.choice(self.professor_ids)}/student_grades/', None
+
+    def request_grade_subject(self):
+        professor_id = self.random.choice(self.professor_ids)
+        subject_id = Subject.objects.filter(professors=professor_id).values_list('pk', flat=True).first()
+        student_ids = Enrollment.objects.filter(subject_id=subject_id).values_list('student_id', flat=True)
+        grades = [
+            {'student_id': student_id, 'grade': round(self.random.uniform(0.0, 5.0), 1)}
+            for student_id in student_ids[:self.options['grades']]
+        ]
+        return 'post', f'/api/v1/professor/{professor_id}/grade_subject/', {'subject_id': subject_id, 'grades': grades}
+
+    def request_enroll(self):
+        # Subjects without prerequisites, so the request always passes validation.
+        subject_ids = list(Subject.objects.filter(prerequisites=None).values_list('pk', flat=True)[:3])
+        return 'post', '/api/v1/enrollment/enroll/', {
+            'student_id': self.random.choice(self.student_ids),
+            'subject_ids': subject_ids,
+        }
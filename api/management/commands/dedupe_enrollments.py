@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.migrations.loader import MigrationLoader
+
+from api.dedupe import remove_duplicate_enrollments
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove duplicate enrollments of the same student in the same subject, '
+        'keeping the most recent graded row (or the most recent row if none is graded). '
+        'Migration 0005 does this itself; use --dry-run to preview it before migrating.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Models as the database is now, which before 0005 differ from api.models.
+        loader = MigrationLoader(connection)
+        applied = [key for key in loader.applied_migrations if key[0] == 'api']
+        apps = loader.project_state(max(applied)).apps
+
+        with transaction.atomic():
+            removed, pairs = remove_duplicate_enrollments(
+                apps, options['batch_size'], options['dry_run'], self.stdout.write,
+            )
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {removed} duplicate enrollments in {pairs} pairs.'))
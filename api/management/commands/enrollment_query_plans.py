@@ -0,0 +1,54 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from api.models import Enrollment
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the query plan and timings of the hot Enrollment lookups against the '
+        'current database. Run it before and after migrating to compare indexes; '
+        'seed a large dataset first for meaningful numbers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50, help='Executions per query.')
+        parser.add_argument('--students', type=int, default=20, help='Students passed to the grading lookup.')
+
+    def handle(self, *args, **options):
+        busiest = (
+            Enrollment.objects.values('subject_id').annotate(rows=Count('id')).order_by('-rows').first()
+        )
+        sample = Enrollment.objects.order_by('-id').values('student_id').first()
+        if busiest is None or sample is None:
+            raise CommandError('There are no enrollments to benchmark.')
+        subject_id = busiest['subject_id']
+        student_id = sample['student_id']
+        student_ids = list(
+            Enrollment.objects.filter(subject_id=subject_id)
+            .values_list('student_id', flat=True)[:options['students']]
+        )
+
+        queries = {
+            'approved_subjects': Enrollment.objects.filter(student_id=student_id, grade__gte=3.0).values_list('subject_id'),
+            'failed_subjects': Enrollment.objects.filter(student_id=student_id, grade__lt=3.0).values_list('subject_id'),
+            'grade_subject lookup': Enrollment.objects.filter(subject_id=subject_id, student_id__in=student_ids),
+            'subject roster': Enrollment.objects.filter(subject_id=subject_id).values_list('student_id', 'grade'),
+        }
+
+        self.stdout.write(f'{Enrollment.objects.count()} enrollments, student {student_id}, subject {subject_id}\n')
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(
+                f'median {statistics.median(timings):.3f} ms, max {max(timings):.3f} ms '
+                f'over {options["repeat"]} runs\n'
+            )
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.changes import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete enrollment tombstones older than --days. Change feed tokens from '
+        'before the newest purged delete are refused afterwards (410), so keep '
+        'this longer than the slowest mirror takes between syncs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            deleted = purge_tombstones(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones.'))
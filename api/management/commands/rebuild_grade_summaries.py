@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import Student, StudentGradeSummary
+from api.summary import SUMMARY_FIELDS, compute_summaries, refresh_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild StudentGradeSummary rows from Enrollment, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only report summaries that are out of date.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        student_ids = list(Student.objects.order_by('pk').values_list('pk', flat=True))
+        mismatches = 0
+
+        for start in range(0, len(student_ids), batch_size):
+            batch = student_ids[start:start + batch_size]
+            if not options['verify']:
+                with transaction.atomic():
+                    refresh_summaries(batch)
+                continue
+
+            stored = StudentGradeSummary.objects.in_bulk(batch)
+            for student_id, expected in compute_summaries(batch).items():
+                actual = stored.get(student_id)
+                if actual is None or any(self.differs(actual, expected, name) for name in SUMMARY_FIELDS):
+                    mismatches += 1
+                    self.stdout.write(f'Student {student_id}: stored {self.describe(actual)}, expected {self.describe(expected)}')
+
+        if options['verify']:
+            if mismatches:
+                raise CommandError(f'{mismatches} of {len(student_ids)} summaries are out of date.')
+            self.stdout.write(self.style.SUCCESS(f'All {len(student_ids)} summaries are up to date.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(student_ids)} summaries.'))
+
+    @staticmethod
+    def differs(actual, expected, name):
+        if name == 'grade_sum':
+            return abs(actual.grade_sum - expected.grade_sum) > 1e-6
+        return getattr(actual, name) != getattr(expected, name)
+
+    @staticmethod
+    def describe(summary):
+        if summary is None:
+            return 'nothing'
+        return ', '.join(f'{name}={getattr(summary, name)}' for name in SUMMARY_FIELDS)
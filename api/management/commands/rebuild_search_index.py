@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.search import create_search_indexes, drop_search_indexes, optimize_search_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        'Drop and recreate the search indexes (see api/search.py). On SQLite this '
+        'restores the FTS5 triggers after a migration rebuilt the student or '
+        'subject table, and reindexes every row.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drop_search_indexes(connection)
+            create_search_indexes(connection)
+            optimize_search_indexes(connection)
+        self.stdout.write(self.style.SUCCESS(f'Search indexes rebuilt ({connection.vendor}).'))
@@ -0,0 +1,138 @@
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection, connections
+
+from api.jobs import claim_jobs, heartbeat, jobs_settings, logger, requeue_stale_jobs, run_job
+
+
+def run_in_thread(job):
+    try:
+        return run_job(job)
+    except Exception:
+        # Recording the outcome failed (e.g. the database went away); the
+        # job stays running and is queued again once its heartbeat is stale.
+        logger.exception('Job %s (%s) could not be finished', job.pk, job.kind)
+        return job
+    finally:
+        # Pool threads are reused; don't keep one connection per thread open.
+        connections.close_all()
+
+
+class Heartbeat(threading.Thread):
+    """
+    Keeps the heartbeat of a job run in the main thread fresh, as the pool
+    loop does for pooled jobs, so long inline jobs aren't taken for lost.
+    """
+
+    def __init__(self, job_id, interval):
+        super().__init__(name=f'heartbeat-{job_id}', daemon=True)
+        self.job_id = job_id
+        self.interval = interval
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            while not self.finished.wait(self.interval):
+                try:
+                    heartbeat([self.job_id])
+                except DatabaseError:
+                    # E.g. SQLite busy with the job's own writes; try again.
+                    logger.warning('Heartbeat of job %s failed', self.job_id, exc_info=True)
+        finally:
+            connections.close_all()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finished.set()
+        self.join()
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (see api/jobs.py) on a thread pool until '
+        'interrupted. SIGINT/SIGTERM stop claiming new jobs and wait for the '
+        'running ones. Use --once to drain the queue and exit.'
+    )
+
+    def add_arguments(self, parser):
+        config = jobs_settings()
+        parser.add_argument('--threads', type=int, default=config['WORKER_THREADS'],
+                            help='Jobs run at once; 0 runs them one by one in the main thread.')
+        parser.add_argument('--poll-interval', type=float, default=config['POLL_INTERVAL'])
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+
+    def handle(self, *args, **options):
+        self.worker = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if options['threads'] and connection.vendor == 'sqlite':
+            # SQLite takes one writer at a time; concurrent jobs would only
+            # fail with "database is locked".
+            self.stdout.write('SQLite database: running jobs one at a time.')
+            options['threads'] = 0
+        self.stdout.write(f'Worker {self.worker} started with {options["threads"]} threads.')
+
+        if options['threads'] == 0:
+            self.run_inline(options)
+        else:
+            self.run_pool(options)
+        self.stdout.write(f'Worker {self.worker} stopped.')
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def maintain(self):
+        close_old_connections()
+        requeued, failed = requeue_stale_jobs()
+        if requeued or failed:
+            self.stdout.write(f'{requeued} stale jobs queued again, {failed} failed.')
+
+    def report(self, job):
+        self.stdout.write(f'Job {job.pk} ({job.kind}) {job.status}.')
+
+    def run_inline(self, options):
+        while not self.stopping:
+            self.maintain()
+            jobs = claim_jobs(self.worker, 1)
+            if jobs:
+                with Heartbeat(jobs[0].pk, options['poll_interval']):
+                    job = run_job(jobs[0])
+                self.report(job)
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['poll_interval'])
+
+    def run_pool(self, options):
+        running = {}
+        with ThreadPoolExecutor(max_workers=options['threads'], thread_name_prefix='job') as executor:
+            while not self.stopping:
+                self.maintain()
+                heartbeat(list(running.values()))
+                free = options['threads'] - len(running)
+                if free:
+                    for job in claim_jobs(self.worker, free):
+                        running[executor.submit(run_in_thread, job)] = job.pk
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    self.report(future.result())
+
+            for future in running:
+                self.report(future.result())
@@ -0,0 +1,135 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import bump_versions
+from api.changes import mark_changed
+from api.models import Enrollment, Professor, Student, Subject
+from api.prerequisites import invalidate_prerequisite_graph
+from api.search import optimize_search_indexes
+from api.signals import grades_changed
+
+DEPARTMENTS = ['Matemáticas', 'Física', 'Química', 'Biología', 'Sistemas', 'Humanidades', 'Economía', 'Artes']
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic dataset with bulk_create: subjects with a prerequisite '
+        'DAG, professors, students and their enrollments. Grade summaries are rebuilt '
+        'at the end. Use --seed for a reproducible dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--subjects', type=int, default=100)
+        parser.add_argument('--professors', type=int, default=25)
+        parser.add_argument('--enrollments', type=int, default=20000, help='Total enrollments, spread over the students.')
+        parser.add_argument('--max-prerequisites', type=int, default=3, help='Upper bound of direct prerequisites per subject.')
+        parser.add_argument('--subjects-per-professor', type=int, default=4)
+        parser.add_argument('--graded', type=float, default=0.8, help='Fraction of enrollments that have a grade.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['subjects'] < 1 or options['students'] < 1:
+            raise CommandError('--subjects and --students must be at least 1.')
+        if options['enrollments'] > options['students'] * options['subjects']:
+            raise CommandError('--enrollments cannot exceed students x subjects (pairs are unique).')
+
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Keeps emails unique across several runs against the same database.
+        self.tag = f'{int(time.time()):x}{self.random.randrange(16 ** 4):04x}'
+        started = time.perf_counter()
+
+        subject_ids = self.create_subjects(options['subjects'], options['max_prerequisites'])
+        self.create_professors(options['professors'], subject_ids, options['subjects_per_professor'])
+        student_ids = self.create_students(options['students'])
+        self.create_enrollments(student_ids, subject_ids, options['enrollments'], options['graded'])
+
+        call_command('rebuild_grade_summaries', batch_size=self.batch_size, stdout=self.stdout)
+        optimize_search_indexes(connection)
+        invalidate_prerequisite_graph()
+        bump_versions('subject', 'professor')
+        grades_changed.send(sender=Enrollment, subject_ids=subject_ids, student_ids=student_ids)
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.perf_counter() - started:.1f}s.'))
+
+    def bulk_create(self, model, objects):
+        with transaction.atomic():
+            if model is Enrollment:
+                mark_changed(objects)
+            created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return [obj.pk for obj in created]
+
+    def create_subjects(self, count, max_prerequisites):
+        subject_ids = self.bulk_create(Subject, [
+            Subject(name=f'Asignatura {self.tag}-{index}', description=f'Synthetic subject {index}')
+            for index in range(count)
+        ])
+
+        # Prerequisites only point at subjects created earlier (lower ids), so
+        # the graph is acyclic by construction.
+        Through = Subject.prerequisites.through
+        edges = []
+        for position, subject_id in enumerate(subject_ids[1:], start=1):
+            wanted = self.random.randint(0, min(max_prerequisites, position))
+            for prerequisite_id in self.random.sample(subject_ids[:position], wanted):
+                edges.append(Through(from_subject_id=subject_id, to_subject_id=prerequisite_id))
+        self.bulk_create(Through, edges)
+        self.stdout.write(f'{len(subject_ids)} subjects, {len(edges)} prerequisite edges')
+        return subject_ids
+
+    def create_professors(self, count, subject_ids, subjects_per_professor):
+        professor_ids = self.bulk_create(Professor, [
+            Professor(
+                first_name=f'Profesor{index}',
+                last_name=self.tag,
+                email=f'professor{index}.{self.tag}@seed.example.com',
+                department=self.random.choice(DEPARTMENTS),
+            )
+            for index in range(count)
+        ])
+        Through = Professor.subjects.through
+        per_professor = min(subjects_per_professor, len(subject_ids))
+        self.bulk_create(Through, [
+            Through(professor_id=professor_id, subject_id=subject_id)
+            for professor_id in professor_ids
+            for subject_id in self.random.sample(subject_ids, per_professor)
+        ])
+        self.stdout.write(f'{len(professor_ids)} professors')
+
+    def create_students(self, count):
+        first_birthday = date(1995, 1, 1)
+        student_ids = self.bulk_create(Student, [
+            Student(
+                first_name=f'Estudiante{index}',
+                last_name=self.tag,
+                email=f'student{index}.{self.tag}@seed.example.com',
+                date_of_birth=first_birthday + timedelta(days=self.random.randrange(3650)),
+            )
+            for index in range(count)
+        ])
+        self.stdout.write(f'{len(student_ids)} students')
+        return student_ids
+
+    def create_enrollments(self, student_ids, subject_ids, total, graded):
+        # Spread the total over the students as evenly as possible and sample
+        # distinct subjects per student, so (student, subject) stays unique.
+        per_student, remainder = divmod(total, len(student_ids))
+        batch = []
+        created = 0
+        for position, student_id in enumerate(student_ids):
+            wanted = per_student + (1 if position < remainder else 0)
+            for subject_id in self.random.sample(subject_ids, wanted):
+                grade = round(self.random.uniform(0.0, 5.0), 1) if self.random.random() < graded else None
+                batch.append(Enrollment(student_id=student_id, subject_id=subject_id, grade=grade))
+            if len(batch) >= self.batch_size:
+                created += len(self.bulk_create(Enrollment, batch))
+                batch = []
+        if batch:
+            created += len(self.bulk_create(Enrollment, batch))
+        self.stdout.write(f'{created} enrollments')
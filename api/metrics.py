@@ -0,0 +1,273 @@
+"""
+In-process request metrics, exported in the Prometheus text format.
+
+``RequestMetricsMiddleware`` (api/middleware.py) records one observation per
+request into the module-level ``registry``; ``metrics_view`` renders it, only
+once ``API_METRICS['TOKEN']`` is set and only for that bearer token. Each
+worker process keeps its own registry, so scrape every worker (or run one
+worker per container) to see the full picture.
+"""
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger('api.metrics')
+
+DEFAULTS = {
+    # Master switch for the middleware.
+    'ENABLED': True,
+    # Requests slower than this are logged as a JSON line on ``api.metrics``.
+    'SLOW_REQUEST_MS': 500,
+    # Fraction of requests whose SQL is kept to look for repeated statements.
+    'SQL_SAMPLE_RATE': 0.0,
+    # A sampled statement executed this many times in one request is logged
+    # as a likely N+1 pattern.
+    'N_PLUS_ONE_THRESHOLD': 10,
+    # /metrics requires ``Authorization: Bearer <token>`` and answers 404
+    # while no token is set.
+    'TOKEN': None,
+}
+
+# The sample of the request being handled, for ``serializing``.
+_current_sample = ContextVar('api_metrics_sample', default=None)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'API_METRICS', {})}
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with one series per label value. Callers hold
+    the registry lock.
+    """
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label, value):
+        series = self.series.get(label)
+        if series is None:
+            series = self.series[label] = [[0] * len(self.buckets), 0, 0]
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        series[1] += 1
+        series[2] += value
+
+    def render(self, label_name):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label, (counts, count, total) in sorted(self.series.items()):
+            label = _escape(label)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_name}="{label}"}} {total}')
+            lines.append(f'{self.name}_count{{{label_name}="{label}"}} {count}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = Counter()
+            self.n_plus_one = Counter()
+            self.latency = Histogram('api_request_duration_seconds', 'Total request latency.', SECONDS_BUCKETS)
+            self.db_queries = Histogram('api_db_queries', 'Database queries per request.', QUERY_BUCKETS)
+            self.db_time = Histogram('api_db_duration_seconds', 'Time spent in database queries per request.', SECONDS_BUCKETS)
+            self.serialize_time = Histogram(
+                'api_serialize_duration_seconds',
+                'Time spent evaluating serializer .data in the view, queries it runs included.',
+                SECONDS_BUCKETS,
+            )
+            self.render_time = Histogram('api_render_duration_seconds', 'Time spent rendering the response body.', SECONDS_BUCKETS)
+
+    def record(self, sample):
+        route = sample.route
+        with self.lock:
+            self.requests[(route, sample.method, sample.status)] += 1
+            self.latency.observe(route, sample.total)
+            self.db_queries.observe(route, sample.query_count)
+            self.db_time.observe(route, sample.query_time)
+            if sample.serialize_time:
+                self.serialize_time.observe(route, sample.serialize_time)
+            if sample.render_time is not None:
+                self.render_time.observe(route, sample.render_time)
+            if sample.repeated:
+                self.n_plus_one[route] += 1
+
+    def render(self):
+        with self.lock:
+            lines = ['# HELP api_requests_total Requests handled.', '# TYPE api_requests_total counter']
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'api_requests_total{{route="{_escape(route)}",method="{method}",status="{status}"}} {count}')
+            for histogram in (self.latency, self.db_queries, self.db_time, self.serialize_time, self.render_time):
+                lines.extend(histogram.render('route'))
+            lines.append('# HELP api_n_plus_one_total Sampled requests that repeated one SQL statement past the threshold.')
+            lines.append('# TYPE api_n_plus_one_total counter')
+            for route, count in sorted(self.n_plus_one.items()):
+                lines.append(f'api_n_plus_one_total{{route="{_escape(route)}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestSample:
+    """
+    What one request did. Installed as an ``execute_wrapper`` on every
+    database connection for the duration of the view.
+    """
+
+    def __init__(self, method, sample_sql):
+        self.started = time.perf_counter()
+        self.method = method
+        self.route = 'unmatched'
+        self.status = None
+        self.query_count = 0
+        self.query_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.render_started = None
+        self.render_time = None
+        self.total = None
+        self.statements = Counter() if sample_sql else None
+        self.repeated = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - started
+            self.query_count += 1
+            if self.statements is not None:
+                self.statements[sql] += 1
+
+    def track_queries(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        token = _current_sample.set(self)
+        stack.callback(_current_sample.reset, token)
+        return stack
+
+    def finish(self, request, response, threshold):
+        self.total = time.perf_counter() - self.started
+        self.status = response.status_code
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.view_name:
+            self.route = match.view_name
+        if self.statements:
+            self.repeated = [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def as_log(self, path):
+        return {
+            'event': 'slow_request',
+            'route': self.route,
+            'method': self.method,
+            'path': path,
+            'status': self.status,
+            'duration_ms': round(self.total * 1000, 2),
+            'db_queries': self.query_count,
+            'db_ms': round(self.query_time * 1000, 2),
+            'serialize_ms': round(self.serialize_time * 1000, 2),
+            'render_ms': None if self.render_time is None else round(self.render_time * 1000, 2),
+        }
+
+
+@contextmanager
+def serializing():
+    """
+    Add the time spent in the block to the current request's serialization
+    time. Nested blocks (a serializer reading another one's ``.data``) are
+    counted once.
+    """
+    sample = _current_sample.get()
+    if sample is None or sample.serializing:
+        yield
+        return
+    sample.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample.serialize_time += time.perf_counter() - started
+        sample.serializing = False
+
+
+_instrumented = False
+
+
+def instrument_serializers():
+    """
+    Time every ``.data`` evaluation of DRF and fast serializers. Only the
+    outermost serializer's ``.data`` computes anything (nested ones go
+    through ``to_representation``), so this covers all serialization work.
+    """
+    global _instrumented
+    if _instrumented:
+        return
+    from rest_framework.serializers import BaseSerializer
+
+    from .fast_serializers import FastSerializer
+
+    for cls in (BaseSerializer, FastSerializer):
+        def data(self, fget=cls.data.fget):
+            with serializing():
+                return fget(self)
+        cls.data = property(data)
+    _instrumented = True
+
+
+def new_sample(request, config):
+    return RequestSample(request.method, random.random() < config['SQL_SAMPLE_RATE'])
+
+
+def report(request, sample, config):
+    registry.record(sample)
+    if sample.total * 1000 >= config['SLOW_REQUEST_MS']:
+        logger.warning(json.dumps(sample.as_log(request.path)))
+    for sql, count in sample.repeated:
+        logger.warning(json.dumps({
+            'event': 'repeated_sql',
+            'route': sample.route,
+            'path': request.path,
+            'count': count,
+            'sql': sql,
+        }))
+
+
+def metrics_view(request):
+    token = metrics_settings()['TOKEN']
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,97 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+LIVENESS_PATHS = ('/healthz', '/healthz/')
+READINESS_PATHS = ('/readyz', '/readyz/')
+
+
+def _readiness_response():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError as exc:
+        return JsonResponse({'status': 'unavailable', 'error': str(exc)}, status=503)
+    return JsonResponse({'status': 'ok'})
+
+
+@sync_and_async_middleware
+def health_check_middleware(get_response):
+    """
+    Answer ``/healthz`` (process is up) and ``/readyz`` (database reachable)
+    before any other middleware, authentication or URL resolution runs.
+    Keep it first in MIDDLEWARE.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if request.path in LIVENESS_PATHS:
+                return JsonResponse({'status': 'ok'})
+            if request.path in READINESS_PATHS:
+                return await sync_to_async(_readiness_response)()
+            return await get_response(request)
+    else:
+        def middleware(request):
+            if request.path in LIVENESS_PATHS:
+                return JsonResponse({'status': 'ok'})
+            if request.path in READINESS_PATHS:
+                return _readiness_response()
+            return get_response(request)
+    return middleware
+
+
+class RequestMetricsMiddleware:
+    """
+    Record route, query count, query time, serialization time, render time
+    and total latency of every request into ``api.metrics.registry``. Streaming bodies are left
+    alone: their latency is measured up to the first byte and queries run
+    while the body is consumed are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = metrics.metrics_settings()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        metrics.instrument_serializers()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = request._metrics_sample = metrics.new_sample(request, self.config)
+        with sample.track_queries():
+            response = self.get_response(request)
+        self.finish(request, response, sample)
+        return response
+
+    async def __acall__(self, request):
+        sample = request._metrics_sample = metrics.new_sample(request, self.config)
+        with sample.track_queries():
+            response = await self.get_response(request)
+        self.finish(request, response, sample)
+        return response
+
+    def process_template_response(self, request, response):
+        # Runs right before response.render(), which is where DRF renders the
+        # serialized data to JSON.
+        sample = request._metrics_sample
+        sample.render_started = time.perf_counter()
+
+        def rendered(response):
+            sample.render_time = time.perf_counter() - sample.render_started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, sample):
+        sample.finish(request, response, self.config['N_PLUS_ONE_THRESHOLD'])
+        metrics.report(request, sample, self.config)
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+# The aggregation is a frozen copy of api.summary.summary_totals.
+def build_summaries(apps, schema_editor):
+    Student = apps.get_model('api', 'Student')
+    Enrollment = apps.get_model('api', 'Enrollment')
+    StudentGradeSummary = apps.get_model('api', 'StudentGradeSummary')
+
+    summaries = {
+        student_id: StudentGradeSummary(student_id=student_id)
+        for student_id in Student.objects.values_list('pk', flat=True)
+    }
+    rows = (
+        Enrollment.objects.values('student_id')
+        .annotate(
+            enrollment_count=Count('id'),
+            graded_count=Count('grade'),
+            grade_sum=Coalesce(Sum('grade'), 0.0),
+            passed_count=Count('id', filter=Q(grade__gte=3.0)),
+            failed_count=Count('id', filter=Q(grade__lt=3.0)),
+        )
+        .order_by()
+    )
+    for row in rows:
+        summary = summaries[row.pop('student_id')]
+        for name, value in row.items():
+            setattr(summary, name, value)
+    StudentGradeSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_remove_professor_hire_date_professor_subjects_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentGradeSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='grade_summary', serialize=False, to='api.student')),
+                ('enrollment_count', models.PositiveIntegerField(default=0)),
+                ('graded_count', models.PositiveIntegerField(default=0)),
+                ('grade_sum', models.FloatField(default=0.0)),
+                ('passed_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
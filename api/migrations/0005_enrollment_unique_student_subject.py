@@ -0,0 +1,75 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+# A frozen copy of api.dedupe.remove_duplicate_enrollments, which
+# `manage.py dedupe_enrollments --dry-run` uses to preview it.
+def remove_duplicate_enrollments(apps, schema_editor):
+    Enrollment = apps.get_model('api', 'Enrollment')
+    StudentGradeSummary = apps.get_model('api', 'StudentGradeSummary')
+    pairs = list(
+        Enrollment.objects.values_list('student_id', 'subject_id')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+        .values_list('student_id', 'subject_id')
+        .order_by('student_id', 'subject_id')
+    )
+    for start in range(0, len(pairs), 1000):
+        batch = pairs[start:start + 1000]
+        student_ids = {student_id for student_id, _ in batch}
+        groups = {}
+        enrollments = Enrollment.objects.filter(
+            student_id__in=student_ids,
+            subject_id__in={subject_id for _, subject_id in batch},
+        ).values_list('id', 'student_id', 'subject_id', 'grade')
+        for enrollment_id, student_id, subject_id, grade in enrollments:
+            groups.setdefault((student_id, subject_id), []).append((grade is not None, enrollment_id))
+
+        # Keep the most recent graded row, or the most recent row if none is graded.
+        duplicate_ids = []
+        for pair in batch:
+            duplicate_ids += [enrollment_id for _, enrollment_id in sorted(groups[pair])[:-1]]
+        Enrollment.objects.filter(pk__in=duplicate_ids).delete()
+
+        rows = (
+            Enrollment.objects.filter(student_id__in=student_ids)
+            .values('student_id')
+            .annotate(
+                enrollment_count=Count('id'),
+                graded_count=Count('grade'),
+                grade_sum=Coalesce(Sum('grade'), 0.0),
+                passed_count=Count('id', filter=Q(grade__gte=3.0)),
+                failed_count=Count('id', filter=Q(grade__lt=3.0)),
+            )
+            .order_by()
+        )
+        for row in rows:
+            StudentGradeSummary.objects.filter(student_id=row.pop('student_id')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_studentgradesummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_enrollments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('student', 'subject'), name='unique_enrollment_student_subject'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', 'grade', 'subject'], name='enrollment_student_grade_idx'),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.student'),
+        ),
+    ]
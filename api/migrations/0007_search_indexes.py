@@ -0,0 +1,99 @@
+from django.db import migrations
+
+# The DDL of api.search as of this migration, frozen so that later changes
+# there (applied with `manage.py rebuild_search_index`) don't rewrite history.
+POSTGRES_CREATE = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "CREATE INDEX api_student_search_fts ON api_student "
+    "USING gin (to_tsvector('simple', (first_name || ' ' || last_name || ' ' || email)))",
+    "CREATE INDEX api_student_search_trgm ON api_student "
+    "USING gin (lower((first_name || ' ' || last_name || ' ' || email)) gin_trgm_ops)",
+    "CREATE INDEX api_subject_search_fts ON api_subject "
+    "USING gin (to_tsvector('simple', (name || ' ' || description)))",
+    "CREATE INDEX api_subject_search_trgm ON api_subject "
+    "USING gin (lower((name || ' ' || description)) gin_trgm_ops)",
+]
+
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS api_student_search_fts',
+    'DROP INDEX IF EXISTS api_student_search_trgm',
+    'DROP INDEX IF EXISTS api_subject_search_fts',
+    'DROP INDEX IF EXISTS api_subject_search_trgm',
+]
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE api_student_fts USING fts5(first_name, last_name, email, content='api_student', "
+    "content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    'CREATE TRIGGER api_student_fts_insert AFTER INSERT ON api_student BEGIN '
+    'INSERT INTO api_student_fts(rowid, first_name, last_name, email) '
+    'VALUES (new.id, new.first_name, new.last_name, new.email); END',
+    'CREATE TRIGGER api_student_fts_delete AFTER DELETE ON api_student BEGIN '
+    'INSERT INTO api_student_fts(api_student_fts, rowid, first_name, last_name, email) '
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    'CREATE TRIGGER api_student_fts_update AFTER UPDATE ON api_student BEGIN '
+    'INSERT INTO api_student_fts(api_student_fts, rowid, first_name, last_name, email) '
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    'INSERT INTO api_student_fts(rowid, first_name, last_name, email) '
+    'VALUES (new.id, new.first_name, new.last_name, new.email); END',
+    "INSERT INTO api_student_fts(api_student_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE api_subject_fts USING fts5(name, description, content='api_subject', "
+    "content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    'CREATE TRIGGER api_subject_fts_insert AFTER INSERT ON api_subject BEGIN '
+    'INSERT INTO api_subject_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END',
+    'CREATE TRIGGER api_subject_fts_delete AFTER DELETE ON api_subject BEGIN '
+    'INSERT INTO api_subject_fts(api_subject_fts, rowid, name, description) '
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    'CREATE TRIGGER api_subject_fts_update AFTER UPDATE ON api_subject BEGIN '
+    'INSERT INTO api_subject_fts(api_subject_fts, rowid, name, description) '
+    "VALUES ('delete', old.id, old.name, old.description); "
+    'INSERT INTO api_subject_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END',
+    "INSERT INTO api_subject_fts(api_subject_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS api_student_fts_insert',
+    'DROP TRIGGER IF EXISTS api_student_fts_delete',
+    'DROP TRIGGER IF EXISTS api_student_fts_update',
+    'DROP TABLE IF EXISTS api_student_fts',
+    'DROP TRIGGER IF EXISTS api_subject_fts_insert',
+    'DROP TRIGGER IF EXISTS api_subject_fts_delete',
+    'DROP TRIGGER IF EXISTS api_subject_fts_update',
+    'DROP TABLE IF EXISTS api_subject_fts',
+]
+
+
+def _execute(db, statements):
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def forwards(apps, schema_editor):
+    db = schema_editor.connection
+    if db.vendor == 'postgresql':
+        _execute(db, POSTGRES_CREATE)
+    elif db.vendor == 'sqlite':
+        with db.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            has_fts5 = bool(cursor.fetchone()[0])
+        if has_fts5:
+            _execute(db, SQLITE_CREATE)
+
+
+def backwards(apps, schema_editor):
+    db = schema_editor.connection
+    if db.vendor == 'postgresql':
+        _execute(db, POSTGRES_DROP)
+    elif db.vendor == 'sqlite':
+        _execute(db, SQLITE_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:59
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_enrollments(apps, schema_editor):
+    # Existing rows enter the feed in id order; the counter continues after them.
+    ChangeCounter = apps.get_model('api', 'ChangeCounter')
+    Enrollment = apps.get_model('api', 'Enrollment')
+    Enrollment.objects.update(change_seq=F('id'))
+    last = Enrollment.objects.aggregate(last=Max('id'))['last'] or 0
+    ChangeCounter.objects.create(name='enrollment', value=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EnrollmentTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrollment_id', models.BigIntegerField()),
+                ('student_id', models.BigIntegerField()),
+                ('subject_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField(db_index=True, default=None, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=None, null=True),
+        ),
+        migrations.RunPython(number_existing_enrollments, migrations.RunPython.noop),
+    ]
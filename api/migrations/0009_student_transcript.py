@@ -0,0 +1,24 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_enrollment_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentTranscript',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='transcript', serialize=False, to='api.student')),
+                ('source_version', models.PositiveBigIntegerField(default=1)),
+                ('built_version', models.PositiveBigIntegerField(default=0)),
+                ('document', models.BinaryField(null=True)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+# The aggregation is a frozen copy of api.summary.summary_totals.
+def create_missing_summaries(apps, schema_editor):
+    Student = apps.get_model('api', 'Student')
+    Enrollment = apps.get_model('api', 'Enrollment')
+    StudentGradeSummary = apps.get_model('api', 'StudentGradeSummary')
+
+    summaries = {
+        student_id: StudentGradeSummary(student_id=student_id)
+        for student_id in Student.objects.filter(grade_summary__isnull=True).values_list('pk', flat=True)
+    }
+    if not summaries:
+        return
+    rows = (
+        Enrollment.objects.filter(student_id__in=summaries)
+        .values('student_id')
+        .annotate(
+            enrollment_count=Count('id'),
+            graded_count=Count('grade'),
+            grade_sum=Coalesce(Sum('grade'), 0.0),
+            passed_count=Count('id', filter=Q(grade__gte=3.0)),
+            failed_count=Count('id', filter=Q(grade__lt=3.0)),
+        )
+        .order_by()
+    )
+    for row in rows:
+        summary = summaries[row.pop('student_id')]
+        for name, value in row.items():
+            setattr(summary, name, value)
+    StudentGradeSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_student_transcript'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_summaries, migrations.RunPython.noop),
+    ]
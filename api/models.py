@@ -1,4 +1,9 @@
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.transaction import TransactionManagementError
+
+# ChangeCounter names.
+ENROLLMENT_FEED = 'enrollment'
+ENROLLMENT_TOMBSTONES_PURGED = 'enrollment:purged'
 
 # Create your models here.
 class Subject(models.Model):
@@ -9,6 +14,28 @@ class Subject(models.Model):
     def __str__(self):
         return self.name
 
+class StudentQuerySet(models.QuerySet):
+    def with_stats(self, enrollments=True, average=True):
+        """
+        Join the grade summary and prefetch enrollments (with their subjects and
+        prerequisites) so the stats methods below don't hit the database again.
+        Either part can be skipped when the caller doesn't need it.
+        """
+        queryset = self
+        if average:
+            queryset = queryset.select_related('grade_summary')
+        if enrollments:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'enrollment_set',
+                queryset=(
+                    Enrollment.objects
+                    .select_related('subject')
+                    .prefetch_related('subject__prerequisites')
+                    .order_by('id')
+                ),
+            ))
+        return queryset
+
 class Student(models.Model):
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
@@ -16,21 +43,40 @@ class Student(models.Model):
     date_of_birth = models.DateField()
     enrollment_date = models.DateField(auto_now_add=True)
 
+    objects = StudentQuerySet.as_manager()
+
+    def _prefetched_enrollments(self):
+        return getattr(self, '_prefetched_objects_cache', {}).get('enrollment_set')
+
     def approved_subjects(self):
-        enrollments = Enrollment.objects.filter(student=self, grade__gte=3.0)
+        enrollments = self._prefetched_enrollments()
+        if enrollments is not None:
+            return [enrollment.subject for enrollment in enrollments if enrollment.is_passed()]
+        enrollments = Enrollment.objects.filter(student=self, grade__gte=3.0).select_related('subject')
         return [enrollment.subject for enrollment in enrollments]
 
     def average_grade(self):
-        enrollments = Enrollment.objects.filter(student=self)
-        if not enrollments:
-            return None
+        # Only use the summary when it was already joined; reading the
+        # accessor otherwise costs a query per student.
+        summary = self._state.fields_cache.get('grade_summary')
+        if summary is not None:
+            return summary.average_grade
+        enrollments = self._prefetched_enrollments()
+        if enrollments is None:
+            return Enrollment.objects.filter(student=self).aggregate(average=models.Avg('grade'))['average']
         grades = [enrollment.grade for enrollment in enrollments if enrollment.grade is not None]
         if not grades:
             return None
         return sum(grades) / len(grades)
     
     def failed_subjects(self):
-        enrollments = Enrollment.objects.filter(student=self, grade__lt=3.0)
+        enrollments = self._prefetched_enrollments()
+        if enrollments is not None:
+            return [
+                enrollment.subject for enrollment in enrollments
+                if enrollment.grade is not None and enrollment.grade < 3.0
+            ]
+        enrollments = Enrollment.objects.filter(student=self, grade__lt=3.0).select_related('subject')
         return [enrollment.subject for enrollment in enrollments]
 
     def __str__(self):
@@ -46,14 +92,195 @@ class Professor(models.Model):
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+class ChangeCounter(models.Model):
+    """
+    A named, monotonically increasing counter handing out change sequence
+    numbers. Only the change feed reader allocates them (see api/changes.py);
+    writers never touch it.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def allocate(cls, name, count=1, using=None):
+        """
+        Reserve ``count`` consecutive numbers and return the first one. Must
+        run inside the transaction that uses them: the counter row stays
+        locked until it commits, so numbers become visible in order and a
+        reader that saw number N will never later find a smaller one. With
+        ``count=0`` it only takes the lock.
+        """
+        db = connections[using or router.db_for_write(cls)]
+        if not db.in_atomic_block:
+            raise TransactionManagementError('ChangeCounter.allocate() must run inside a transaction.')
+        with db.cursor() as cursor:
+            if db.vendor in ('postgresql', 'sqlite'):
+                cursor.execute(
+                    f'UPDATE {cls._meta.db_table} SET value = value + %s WHERE name = %s RETURNING value',
+                    [count, name],
+                )
+                row = cursor.fetchone()
+            else:
+                row = None
+                if cls.objects.using(db.alias).filter(name=name).update(value=models.F('value') + count):
+                    row = cls.objects.using(db.alias).values_list('value').get(name=name)
+        if row is None:
+            cls.objects.using(db.alias).get_or_create(name=name)
+            return cls.allocate(name, count, using)
+        return row[0] - count + 1
+
+
 class Enrollment(models.Model):
-    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    # Indexed by the leading column of unique_enrollment_student_subject.
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, db_index=False)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
     enrollment_date = models.DateField(auto_now_add=True)
     grade = models.FloatField(null=True, blank=True)
+    # Position in the change feed. Every write resets it to None, and the
+    # feed reader numbers the row once the write has committed (see
+    # api/changes.py).
+    change_seq = models.BigIntegerField(null=True, default=None, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'subject'], name='unique_enrollment_student_subject'),
+        ]
+        indexes = [
+            # Covers the approved/failed grade-threshold lookups per student.
+            models.Index(fields=['student', 'grade', 'subject'], name='enrollment_student_grade_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'student_id' in instance.__dict__ and 'grade' in instance.__dict__:
+            # Remembered so grade summaries can be updated by difference on save.
+            instance._loaded_state = (instance.student_id, instance.grade)
+        if 'subject_id' in instance.__dict__:
+            # Remembered so a moved enrollment invalidates both subjects' analytics.
+            instance._loaded_subject_id = instance.subject_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The post_save summary update must commit or roll back with the row.
+        with transaction.atomic(using=kwargs.get('using')):
+            self.change_seq = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'change_seq'}
+            super().save(*args, **kwargs)
 
     def is_passed(self):
         return self.grade is not None and self.grade >= 3.0
 
     def __str__(self):
-        return f"{self.student} - {self.subject}"
\ No newline at end of file
+        return f"{self.student} - {self.subject}"
+
+class EnrollmentTombstone(models.Model):
+    """
+    Records a deleted enrollment for the change feed; see api/changes.py.
+    """
+    enrollment_id = models.BigIntegerField()
+    student_id = models.BigIntegerField()
+    subject_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField(null=True, default=None, db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Enrollment {self.enrollment_id} deleted at {self.deleted_at}"
+
+class StudentGradeSummary(models.Model):
+    """
+    Running enrollment and grade totals for one student, created with the
+    student and kept up to date on every Enrollment write by api/summary.py. Rebuild or verify it with
+    ``manage.py rebuild_grade_summaries``.
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='grade_summary')
+    enrollment_count = models.PositiveIntegerField(default=0)
+    graded_count = models.PositiveIntegerField(default=0)
+    grade_sum = models.FloatField(default=0.0)
+    passed_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+
+    @property
+    def average_grade(self):
+        if not self.graded_count:
+            return None
+        return self.grade_sum / self.graded_count
+
+    def __str__(self):
+        return f"{self.student_id}: {self.average_grade}"
+
+
+class StudentTranscript(models.Model):
+    """
+    A student's stored transcript: the rendered ``StudentSerializer`` JSON
+    served by ``/student/{id}/stats/`` and ``/student/{id}/transcript/``.
+    Every write that changes what it shows bumps ``source_version`` in the
+    same transaction; the document is current while ``built_version`` equals
+    it (see api/transcripts.py).
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='transcript')
+    source_version = models.PositiveBigIntegerField(default=1)
+    built_version = models.PositiveBigIntegerField(default=0)
+    document = models.BinaryField(null=True)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def invalidate(cls, student_ids):
+        if student_ids:
+            cls.objects.filter(student_id__in=student_ids).update(source_version=models.F('source_version') + 1)
+
+    @classmethod
+    def invalidate_subjects(cls, subject_ids=None):
+        """
+        Invalidate the transcripts of every student enrolled in
+        ``subject_ids`` (all transcripts when None).
+        """
+        transcripts = cls.objects.all()
+        if subject_ids is not None:
+            transcripts = transcripts.filter(student__enrollment__subject_id__in=subject_ids)
+        transcripts.update(source_version=models.F('source_version') + 1)
+
+    def __str__(self):
+        return f"{self.student_id}: v{self.built_version}/{self.source_version}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, queued in the database and run by
+    ``manage.py run_worker`` (see api/jobs.py).
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest queued jobs and look for stale running ones.
+            models.Index(fields=['status', 'id'], name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the primary key, so every page is an indexed range
+    scan no matter how deep the client pages. Clients follow the opaque
+    ``next``/``previous`` links; ``?page_size=`` picks a smaller or larger page.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Numbered pages for ranked search results, which have no stable key to
+    keep a cursor on.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,54 @@
+import codecs
+import csv
+
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from .renderers import ORJSONRenderer
+
+
+def read_csv_rows(stream, encoding='utf-8-sig'):
+    """
+    Lazily yield each row of a CSV byte stream as a dict keyed by the header.
+    """
+    reader = csv.DictReader(codecs.iterdecode(stream, encoding))
+    for row in reader:
+        yield {key.strip(): (value.strip() if isinstance(value, str) else value)
+               for key, value in row.items() if key is not None}
+
+
+class CSVParser(BaseParser):
+    """
+    Parses a ``text/csv`` request body into a list of row dicts.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if encoding.lower().replace('-', '') == 'utf8':
+            encoding = 'utf-8-sig'
+        try:
+            return list(read_csv_rows(stream, encoding))
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ParseError(f'CSV parse error - {exc}')
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser that decodes UTF-8 bodies with orjson. Other charsets are
+    handed to JSONParser. Like ``STRICT_JSON``, NaN and Infinity are rejected.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read() if stream is not None else b'')
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
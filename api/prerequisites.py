@@ -0,0 +1,220 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Subject, Enrollment
+
+
+class PrerequisiteReport:
+    """
+    Outcome of checking a student against the prerequisites of some subjects.
+
+    ``missing`` maps a subject id to the ``(id, name)`` pairs of the
+    prerequisites the student has not passed yet.
+    """
+
+    def __init__(self, subjects, missing, enrolled_ids):
+        self.subjects = subjects
+        self.missing = missing
+        self.enrolled_ids = enrolled_ids
+
+    @property
+    def ok(self):
+        return not self.missing
+
+    @property
+    def new_subjects(self):
+        return [subject for subject in self.subjects if subject.pk not in self.enrolled_ids]
+
+    def errors(self):
+        return [
+            'El estudiante no cumple con los requisitos previos para {} ({}).'.format(
+                subject.name, ', '.join(name for _, name in self.missing[subject.pk])
+            )
+            for subject in self.subjects if subject.pk in self.missing
+        ]
+
+
+def evaluate_prerequisites(student, subjects):
+    """
+    Check every subject in ``subjects`` against its direct prerequisites in two
+    queries: one for the prerequisite edges and one for the student's
+    enrollments. A prerequisite counts as met once it is passed (grade >= 3.0,
+    see ``Enrollment.is_passed``). Subjects the student is already enrolled in
+    are not checked again. ``student`` may be unsaved, e.g. during registration.
+    """
+    subjects = list(subjects)
+    prerequisites = defaultdict(list)
+    edges = Subject.prerequisites.through.objects.filter(
+        from_subject_id__in=[subject.pk for subject in subjects]
+    ).values_list('from_subject_id', 'to_subject_id', 'to_subject__name')
+    for subject_id, prerequisite_id, prerequisite_name in edges:
+        prerequisites[subject_id].append((prerequisite_id, prerequisite_name))
+
+    enrolled_ids = set()
+    passed_ids = set()
+    if student is not None and student.pk is not None:
+        enrollments = Enrollment.objects.filter(student=student).values_list('subject_id', 'grade')
+        for subject_id, grade in enrollments:
+            enrolled_ids.add(subject_id)
+            if grade is not None and grade >= 3.0:
+                passed_ids.add(subject_id)
+
+    missing = {}
+    for subject in subjects:
+        if subject.pk in enrolled_ids:
+            continue
+        unmet = [prerequisite for prerequisite in prerequisites[subject.pk] if prerequisite[0] not in passed_ids]
+        if unmet:
+            missing[subject.pk] = sorted(unmet)
+
+    return PrerequisiteReport(subjects, missing, enrolled_ids)
+
+
+class PrerequisiteGraph:
+    """
+    In-memory index of the ``Subject.prerequisites`` graph: direct edges in
+    both directions, a topological order (prerequisites first) and the
+    transitive closure of every subject. Subjects that sit on a cycle are
+    listed in ``cyclic`` and left out of ``order``.
+    """
+
+    def __init__(self, names, edges, version=None):
+        self.version = version
+        self.names = dict(names)
+        self.prerequisites = {subject_id: set() for subject_id in self.names}
+        self.required_for = {subject_id: set() for subject_id in self.names}
+        for subject_id, prerequisite_id in edges:
+            if subject_id not in self.names or prerequisite_id not in self.names:
+                continue
+            self.prerequisites[subject_id].add(prerequisite_id)
+            self.required_for[prerequisite_id].add(subject_id)
+
+        self.order = self._topological_order()
+        self.position = {subject_id: index for index, subject_id in enumerate(self.order)}
+        self.cyclic = frozenset(self.names) - frozenset(self.order)
+        self.ancestors = self._closure(self.order, self.prerequisites)
+        self.descendants = self._closure(reversed(self.order), self.required_for)
+
+    @classmethod
+    def load(cls, version=None):
+        names = Subject.objects.values_list('id', 'name')
+        edges = Subject.prerequisites.through.objects.values_list('from_subject_id', 'to_subject_id')
+        return cls(names, edges, version)
+
+    def __contains__(self, subject_id):
+        return subject_id in self.names
+
+    def _topological_order(self):
+        pending = {subject_id: len(prerequisites) for subject_id, prerequisites in self.prerequisites.items()}
+        ready = sorted(subject_id for subject_id, count in pending.items() if count == 0)
+        order = []
+        while ready:
+            subject_id = ready.pop()
+            order.append(subject_id)
+            for dependent_id in self.required_for[subject_id]:
+                pending[dependent_id] -= 1
+                if pending[dependent_id] == 0:
+                    ready.append(dependent_id)
+        return order
+
+    def _closure(self, order, edges):
+        closure = {}
+        # Cyclic subjects first: a subject outside the cycle can still be
+        # required for one on it.
+        for subject_id in self.cyclic:
+            reachable = set()
+            stack = list(edges[subject_id])
+            while stack:
+                neighbour_id = stack.pop()
+                if neighbour_id not in reachable:
+                    reachable.add(neighbour_id)
+                    stack.extend(edges[neighbour_id])
+            closure[subject_id] = frozenset(reachable)
+        for subject_id in order:
+            reachable = set()
+            for neighbour_id in edges[subject_id]:
+                reachable.add(neighbour_id)
+                reachable |= closure[neighbour_id]
+            closure[subject_id] = frozenset(reachable)
+        return closure
+
+    def sort(self, subject_ids):
+        return sorted(subject_ids, key=lambda subject_id: (self.position.get(subject_id, len(self.position)), subject_id))
+
+    def would_create_cycle(self, subject_id, prerequisite_ids):
+        """
+        True if making ``subject_id`` require any of ``prerequisite_ids``
+        would close a cycle.
+        """
+        return any(
+            prerequisite_id == subject_id or subject_id in self.ancestors.get(prerequisite_id, ())
+            for prerequisite_id in prerequisite_ids
+        )
+
+    def tree(self, subject_id):
+        """
+        The whole prerequisite chain of a subject as an adjacency list, in
+        topological order with the subject itself last.
+        """
+        subject_ids = self.sort(self.ancestors[subject_id] | {subject_id})
+        return {
+            'id': subject_id,
+            'name': self.names[subject_id],
+            'all_prerequisites': [prerequisite_id for prerequisite_id in subject_ids if prerequisite_id != subject_id],
+            'subjects': [
+                {
+                    'id': node_id,
+                    'name': self.names[node_id],
+                    'prerequisites': sorted(self.prerequisites[node_id]),
+                }
+                for node_id in subject_ids
+            ],
+        }
+
+    def unlocks(self, subject_id):
+        return [
+            {'id': dependent_id, 'name': self.names[dependent_id]}
+            for dependent_id in self.sort(self.descendants[subject_id])
+        ]
+
+
+_GRAPH_VERSION_KEY = 'api:prerequisite_graph:version'
+_graph = None
+_graph_checked_at = 0.0
+_graph_lock = threading.Lock()
+
+
+def get_prerequisite_graph():
+    """
+    Return the process-wide ``PrerequisiteGraph``, rebuilding it when it was
+    invalidated here or, via a version number in the shared cache, by another
+    process. The shared version is checked at most every
+    ``PREREQUISITE_GRAPH_CHECK_INTERVAL`` seconds.
+    """
+    global _graph, _graph_checked_at
+    graph = _graph
+    now = time.monotonic()
+    interval = getattr(settings, 'PREREQUISITE_GRAPH_CHECK_INTERVAL', 1.0)
+    if graph is not None and now - _graph_checked_at < interval:
+        return graph
+
+    version = cache.get(_GRAPH_VERSION_KEY, 0)
+    with _graph_lock:
+        if _graph is None or _graph.version != version:
+            _graph = PrerequisiteGraph.load(version)
+        _graph_checked_at = now
+        return _graph
+
+
+def invalidate_prerequisite_graph():
+    global _graph
+    with _graph_lock:
+        _graph = None
+    try:
+        cache.incr(_GRAPH_VERSION_KEY)
+    except ValueError:
+        cache.set(_GRAPH_VERSION_KEY, 1, None)
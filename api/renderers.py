@@ -0,0 +1,34 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+# Same escapes JSONRenderer applies, on the encoded bytes.
+LINE_SEPARATOR = ('\u2028'.encode(), b'\\u2028')
+PARAGRAPH_SEPARATOR = ('\u2029'.encode(), b'\\u2029')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer that encodes with orjson. Compact, non-ASCII output
+    is byte-for-byte what JSONRenderer produces with the default settings:
+    datetimes, decimals, UUIDs and lazy strings still go through DRF's
+    encoder. Indented output (``; indent=``, the browsable API) and anything
+    orjson cannot encode, such as integers wider than 64 bits, fall back to
+    JSONRenderer.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(*LINE_SEPARATOR).replace(*PARAGRAPH_SEPARATOR)
+        return ret
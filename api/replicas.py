@@ -0,0 +1,135 @@
+"""
+Read replica routing.
+
+When ``DATABASE_REPLICA_URL`` is set, ``settings.DATABASES`` gets a
+``replica`` alias and ``ReplicaRouter`` sends the reads of safe (GET, HEAD,
+OPTIONS) API requests there. Everything else stays on ``default``:
+
+* writes, and reads inside a transaction (``transaction.atomic`` or a
+  ``select_for_update``), which must see their own changes;
+* reads outside a ``ReplicaReadMixin`` view (workers, management commands,
+  the admin);
+* every read of a user who wrote something in the last ``STICKY_SECONDS``,
+  so they see their own changes despite replication lag. The pin is kept in
+  the cache; set ``REDIS_URL`` so that all processes see it.
+
+Responses stored in the shared response cache are always computed on the
+primary (see ``using_primary``): the cache version is bumped when a write
+commits, and a lagging replica would otherwise store the old data under the
+new version until the entry expires.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+DEFAULTS = {
+    # Database alias of the replica, None when there is none.
+    'ALIAS': None,
+    # Seconds a user's reads stay on the primary after they wrote something.
+    'STICKY_SECONDS': 5,
+}
+
+# True while the current request may read from the replica.
+_on_replica = ContextVar('api_on_replica', default=False)
+
+
+def replica_settings():
+    return {**DEFAULTS, **getattr(settings, 'API_READ_REPLICA', {})}
+
+
+def read_alias():
+    """
+    The database the current reads go to.
+    """
+    alias = replica_settings()['ALIAS']
+    if alias is None or not _on_replica.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+@contextmanager
+def using_primary():
+    token = _on_replica.set(False)
+    try:
+        yield
+    finally:
+        _on_replica.reset(token)
+
+
+def _pin_key(user):
+    return f'api:replica:pinned:{user.pk}'
+
+
+def pin_to_primary(user):
+    if user.is_authenticated and replica_settings()['ALIAS'] is not None:
+        cache.set(_pin_key(user), True, replica_settings()['STICKY_SECONDS'])
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(_pin_key(user)) is not None
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from wherever the instance was loaded.
+            return instance._state.db
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary.
+        if db == replica_settings()['ALIAS']:
+            return False
+        return None
+
+
+def _chunks_on_replica(iterable):
+    # Streamed responses run their queries after the view has returned, one
+    # chunk at a time, possibly on another thread under ASGI.
+    iterator = iter(iterable)
+    while True:
+        token = _on_replica.set(True)
+        try:
+            chunk = next(iterator, None)
+        finally:
+            _on_replica.reset(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+class ReplicaReadMixin:
+    """
+    Lets the reads of safe requests go to the replica once the user is
+    authenticated, and pins users to the primary after a successful write.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method in SAFE_METHODS and replica_settings()['ALIAS'] is not None
+                and not is_pinned(request.user)):
+            self._replica_token = _on_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _on_replica.reset(token)
+            self._replica_token = None
+            if response.streaming and not response.is_async:
+                response.streaming_content = _chunks_on_replica(response.streaming_content)
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user)
+        return response
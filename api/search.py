@@ -0,0 +1,277 @@
+"""
+Ranked prefix search over students and subjects.
+
+Every whitespace/punctuation separated term of the query must match the
+start of a word, so ``ada lov`` finds "Ada Lovelace" and ``ada@exam`` finds
+ada@example.com. How matches are found and ranked depends on the database:
+
+* PostgreSQL: a ``to_tsvector('simple', ...)`` GIN index answers prefix
+  queries and a ``gin_trgm_ops`` index adds fuzzy matches (typos, text inside
+  words); the score is ``ts_rank`` plus the trigram word similarity.
+* SQLite: external-content FTS5 tables kept in sync by triggers, ranked
+  with bm25. Django rebuilds a SQLite table, dropping its triggers, for
+  some schema changes of Student or Subject; run
+  ``manage.py rebuild_search_index`` after such a migration.
+* Anything else: ``icontains`` filters, in id order.
+
+Migration 0007 creates the indexes from a frozen copy of these statements;
+after changing them, run ``manage.py rebuild_search_index``.
+At most ``MAX_SEARCH_RESULTS`` matches per model are counted and ranked, so
+a very broad query (``a``) costs the same as a narrow one; its results are
+the best of the first matches found rather than of every match.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import Student, Subject
+
+MAX_SEARCH_RESULTS = 1000
+MAX_QUERY_TERMS = 8
+
+
+class SearchTarget:
+
+    def __init__(self, kind, model, columns, weights):
+        self.kind = kind
+        self.model = model
+        self.table = model._meta.db_table
+        self.fts_table = f'{self.table}_fts'
+        self.columns = columns
+        # Relative bm25 weight of each column on SQLite.
+        self.weights = weights
+        # The expression the PostgreSQL indexes are built on; queries must use
+        # exactly the same one.
+        self.document = '(' + " || ' ' || ".join(columns) + ')'
+
+
+TARGETS = {
+    'student': SearchTarget('student', Student, ['first_name', 'last_name', 'email'], [2.0, 2.0, 1.0]),
+    'subject': SearchTarget('subject', Subject, ['name', 'description'], [3.0, 1.0]),
+}
+
+
+def _postgres_statements(target):
+    return [
+        f"CREATE INDEX {target.table}_search_fts ON {target.table} "
+        f"USING gin (to_tsvector('simple', {target.document}))",
+        f'CREATE INDEX {target.table}_search_trgm ON {target.table} '
+        f'USING gin (lower({target.document}) gin_trgm_ops)',
+    ]
+
+
+def _sqlite_statements(target):
+    fts, table = target.fts_table, target.table
+    columns = ', '.join(target.columns)
+    new = ', '.join(f'new.{column}' for column in target.columns)
+    old = ', '.join(f'old.{column}' for column in target.columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        # Triggers, unlike model signals, also see bulk_create, update() and raw SQL.
+        f'CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END',
+        f'CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); END",
+        f'CREATE TRIGGER {fts}_update AFTER UPDATE ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+        f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END',
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def _sqlite_has_fts5(db):
+    with db.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_indexes(db):
+    if db.vendor == 'postgresql':
+        statements = ['CREATE EXTENSION IF NOT EXISTS pg_trgm']
+        for target in TARGETS.values():
+            statements += _postgres_statements(target)
+    elif db.vendor == 'sqlite' and _sqlite_has_fts5(db):
+        statements = [statement for target in TARGETS.values() for statement in _sqlite_statements(target)]
+    else:
+        return
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_search_indexes(db):
+    statements = []
+    for target in TARGETS.values():
+        if db.vendor == 'postgresql':
+            statements += [f'DROP INDEX IF EXISTS {target.table}_search_fts',
+                           f'DROP INDEX IF EXISTS {target.table}_search_trgm']
+        elif db.vendor == 'sqlite':
+            statements += [f'DROP TRIGGER IF EXISTS {target.fts_table}_{event}' for event in ('insert', 'delete', 'update')]
+            statements.append(f'DROP TABLE IF EXISTS {target.fts_table}')
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def optimize_search_indexes(db):
+    """
+    Merge the SQLite FTS5 index into one segment. Large bulk loads leave many
+    small segments behind, which makes prefix queries several times slower.
+    """
+    if db.vendor != 'sqlite' or not _sqlite_fts_ready(db):
+        return
+    with db.cursor() as cursor:
+        for target in TARGETS.values():
+            cursor.execute(f"INSERT INTO {target.fts_table}({target.fts_table}) VALUES ('optimize')")
+
+
+def _sqlite_fts_ready(db):
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s)" % ', '.join(['%s'] * 6),
+            [f'{target.fts_table}_{event}' for target in TARGETS.values() for event in ('insert', 'delete', 'update')],
+        )
+        return cursor.fetchone()[0] == 6
+
+
+def search_terms(text):
+    """
+    The lower-cased word terms of a query, without any search syntax.
+    """
+    return re.findall(r'\w+', text.lower())[:MAX_QUERY_TERMS]
+
+
+def _backend(db):
+    if db.vendor == 'postgresql':
+        return 'postgresql'
+    # Checked on every search, it's one query against sqlite_master, so a
+    # dropped trigger is noticed instead of silently serving stale results.
+    if db.vendor == 'sqlite' and _sqlite_fts_ready(db):
+        return 'sqlite'
+    return 'fallback'
+
+
+class SQLiteSearch:
+
+    @staticmethod
+    def _match(terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def count(self, db, target, terms):
+        fts = target.fts_table
+        with db.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM (SELECT 1 FROM {fts} WHERE {fts} MATCH %s LIMIT %s)',
+                           [self._match(terms), MAX_SEARCH_RESULTS])
+            return cursor.fetchone()[0]
+
+    def rank(self, db, target, terms, limit):
+        fts = target.fts_table
+        weights = ', '.join(str(weight) for weight in target.weights)
+        with db.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, rank FROM ('
+                f'SELECT rowid, bm25({fts}, {weights}) AS rank FROM {fts} WHERE {fts} MATCH %s LIMIT %s'
+                f') ORDER BY rank, rowid LIMIT %s',
+                [self._match(terms), MAX_SEARCH_RESULTS, limit],
+            )
+            # bm25 is lower for better matches.
+            return [(-rank, pk) for pk, rank in cursor.fetchall()]
+
+
+class PostgresSearch:
+
+    @staticmethod
+    def _where(target, terms):
+        sql = (f"to_tsvector('simple', {target.document}) @@ to_tsquery('simple', %s) "
+               f'OR %s <%% lower({target.document})')
+        return sql, [' & '.join(f'{term}:*' for term in terms), ' '.join(terms)]
+
+    def count(self, db, target, terms):
+        where, params = self._where(target, terms)
+        with db.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM (SELECT 1 FROM {target.table} WHERE {where} LIMIT %s) AS matches',
+                           [*params, MAX_SEARCH_RESULTS])
+            return cursor.fetchone()[0]
+
+    def rank(self, db, target, terms, limit):
+        where, params = self._where(target, terms)
+        with db.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, score FROM ("
+                f"SELECT id, ts_rank(to_tsvector('simple', {target.document}), to_tsquery('simple', %s)) "
+                f'+ word_similarity(%s, lower({target.document})) AS score '
+                f'FROM {target.table} WHERE {where} LIMIT %s'
+                f') AS matches ORDER BY score DESC, id LIMIT %s',
+                [*params, *params, MAX_SEARCH_RESULTS, limit],
+            )
+            return [(score, pk) for pk, score in cursor.fetchall()]
+
+
+class FallbackSearch:
+
+    @staticmethod
+    def _matches(db, target, terms):
+        matches = target.model.objects.using(db.alias)
+        for term in terms:
+            any_column = Q()
+            for column in target.columns:
+                any_column |= Q(**{f'{column}__icontains': term})
+            matches = matches.filter(any_column)
+        return matches
+
+    def count(self, db, target, terms):
+        return self._matches(db, target, terms)[:MAX_SEARCH_RESULTS].count()
+
+    def rank(self, db, target, terms, limit):
+        return [(0.0, pk) for pk in self._matches(db, target, terms).order_by('pk').values_list('pk', flat=True)[:limit]]
+
+
+BACKENDS = {'postgresql': PostgresSearch(), 'sqlite': SQLiteSearch(), 'fallback': FallbackSearch()}
+
+
+class SearchResults:
+    """
+    Lazy, sliceable search results, so a Django ``Paginator`` (and DRF's
+    PageNumberPagination) can page through them. A slice ranks the top
+    ``stop`` matches of each model, merges them by score and loads only the
+    rows on the page.
+    """
+
+    def __init__(self, terms, kinds=None):
+        self.terms = terms
+        self.targets = [TARGETS[kind] for kind in (kinds or TARGETS)]
+        # Reads from the replica in replica-routed requests; see api/replicas.py.
+        self.db = connections[router.db_for_read(self.targets[0].model)]
+        self.backend = BACKENDS[_backend(self.db)]
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = sum(self.backend.count(self.db, target, self.terms) for target in self.targets)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, min(index.stop or MAX_SEARCH_RESULTS, MAX_SEARCH_RESULTS)
+        ranked = []
+        for target in self.targets:
+            ranked += [(-score, target.kind, pk) for score, pk in self.backend.rank(self.db, target, self.terms, stop)]
+        page = sorted(ranked)[start:stop]
+
+        loaded = {}
+        for target in self.targets:
+            ids = [pk for _, kind, pk in page if kind == target.kind]
+            if ids:
+                fields = ['id', *target.columns]
+                loaded[target.kind] = {row['id']: row for row in target.model.objects.using(self.db.alias).filter(pk__in=ids).values(*fields)}
+        return [
+            {'type': kind, 'score': round(-negative_score, 6), **loaded[kind][pk]}
+            for negative_score, kind, pk in page
+            if pk in loaded[kind]
+        ]
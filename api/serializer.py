@@ -1,9 +1,64 @@
 from rest_framework import serializers
-from .models import Subject, Student, Professor ,Enrollment
+from .models import Subject, Student, StudentQuerySet, Professor ,Enrollment, Job
 from django.contrib.auth.models import User
+from django.db import models, transaction
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .changes import mark_changed
+from .enrollments import add_enrollments
+from .prerequisites import evaluate_prerequisites, get_prerequisite_graph
+from .signals import grades_changed
+from .summary import refresh_summaries
 
-class SubjectSerializer(serializers.ModelSerializer):
-    prerequisites = serializers.PrimaryKeyRelatedField(queryset=Subject.objects.all(), many=True, required=False, allow_null=True)
+GRADE_BATCH_SIZE = 500
+
+
+def requested_fields(request):
+    """
+    The set of field names asked for with ``?fields=a,b`` on a GET request,
+    or None when the client wants every field.
+    """
+    if request is None or request.method != 'GET':
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Trims the top-level serializer down to the fields requested with
+    ``?fields=``. Fields that are left out, including SerializerMethodFields,
+    are never evaluated. Nested serializers always keep all their fields.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+
+        requested = requested_fields(self.context.get('request'))
+        if requested is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in requested}
+
+class SortedManyRelatedField(serializers.ManyRelatedField):
+    """
+    Renders related primary keys in ascending order, so the output doesn't
+    depend on the order a (prefetched) relation happened to come back in.
+    """
+
+    def to_representation(self, iterable):
+        return sorted(super().to_representation(iterable))
+
+class SubjectSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    prerequisites = SortedManyRelatedField(
+        child_relation=serializers.PrimaryKeyRelatedField(queryset=Subject.objects.all(), allow_null=True),
+        required=False,
+    )
     class Meta:
         model = Subject
         fields = ['id', 'name', 'description', 'prerequisites']
@@ -13,6 +68,13 @@ class SubjectSerializer(serializers.ModelSerializer):
             'email': {'help_text': 'Email address of the student'},
         }
 
+    def validate_prerequisites(self, value):
+        if self.instance is not None and value:
+            graph = get_prerequisite_graph()
+            if graph.would_create_cycle(self.instance.pk, [subject.pk for subject in value]):
+                raise serializers.ValidationError('Los prerrequisitos forman un ciclo.')
+        return value
+
 class StudentRegistrationSerializer(serializers.ModelSerializer):
     subject_ids = serializers.ListField(
         child=serializers.IntegerField(), write_only=True
@@ -22,36 +84,50 @@ class StudentRegistrationSerializer(serializers.ModelSerializer):
         model = Student
         fields = ['id', 'first_name','last_name', 'email','date_of_birth','enrollment_date', 'subject_ids']
 
-    def create(self, validated_data):
-        subject_ids = validated_data.pop('subject_ids', [])
-        student = Student.objects.create(**validated_data)
+    def validate(self, data):
+        subject_ids = data.get('subject_ids')
+        if subject_ids:
+            report = evaluate_prerequisites(self.instance, Subject.objects.filter(pk__in=subject_ids))
+            if not report.ok:
+                raise serializers.ValidationError({'subject_ids': report.errors()})
+            data['subjects'] = report.new_subjects
+        return data
 
-        subjects = Subject.objects.filter(pk__in=subject_ids)
-        for subject in subjects:
-            prerequisites = subject.prerequisites.all()
-            for prereq in prerequisites:
-                if not Enrollment.objects.filter(student=student, subject=prereq, grade__gte=3.0).exists():
-                    raise serializers.ValidationError(f'El estudiante no cumple con los requisitos previos para {subject.name}.')
-            Enrollment.objects.create(student=student, subject=subject)
+    def create(self, validated_data):
+        validated_data.pop('subject_ids', None)
+        subjects = validated_data.pop('subjects', [])
+        with transaction.atomic():
+            student = Student.objects.create(**validated_data)
+            add_enrollments(student, subjects)
+        return student
 
     def update(self, instance, validated_data):
-        subject_ids = validated_data.pop('subject_ids', [])
-        instance = super().update(instance, validated_data)
-        
-        subjects = Subject.objects.filter(pk__in=subject_ids)
-        for subject in subjects:
-            if not Enrollment.objects.filter(student=instance, subject=subject).exists():
-                prerequisites = subject.prerequisites.all()
-                for prereq in prerequisites:
-                    if not Enrollment.objects.filter(student=instance, subject=prereq, grade__gte=3.0).exists():
-                        raise serializers.ValidationError(f'El estudiante no cumple con los requisitos previos para {subject.name}.')
-                Enrollment.objects.create(student=instance, subject=subject)
-        
+        validated_data.pop('subject_ids', None)
+        subjects = validated_data.pop('subjects', [])
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            add_enrollments(instance, subjects)
         return instance
-
-        return student
     
-class StudentSerializer(serializers.ModelSerializer):
+class StudentListSerializer(serializers.ListSerializer):
+    """
+    Serializes a plain student queryset through ``with_stats()``, so the
+    stats fields don't query once per student. Querysets that already join
+    or prefetch something are taken as they are.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        if (
+            isinstance(data, StudentQuerySet) and data._result_cache is None
+            and not data.query.select_related and not data._prefetch_related_lookups
+        ):
+            data = data.with_stats()
+        return super().to_representation(data)
+
+
+class StudentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     approved_subjects = serializers.SerializerMethodField()
     average_grade = serializers.SerializerMethodField()
     failed_subjects = serializers.SerializerMethodField()
@@ -61,9 +137,10 @@ class StudentSerializer(serializers.ModelSerializer):
         model = Student
         fields = ['id', 'first_name', 'last_name', 'email', 'date_of_birth', 'enrollment_date',
                 'approved_subjects', 'average_grade', 'failed_subjects', 'enrollments']
+        list_serializer_class = StudentListSerializer
 
     def get_enrollments(self, obj):
-        enrollments = Enrollment.objects.filter(student=obj)
+        enrollments = obj.enrollment_set.all()
         return EnrollmentSerializer(enrollments, many=True).data
     
     
@@ -93,12 +170,25 @@ class StudentGradeSerializer(serializers.Serializer):
     student = serializers.PrimaryKeyRelatedField(queryset=Student.objects.all())
     grade = serializers.FloatField()
 
-class GradeSerializer(serializers.ModelSerializer):
+class GradeEntrySerializer(serializers.Serializer):
+    student_id = serializers.IntegerField()
+    grade = serializers.FloatField()
+
+    def validate_grade(self, value):
+        # Also rejects NaN, which compares False with everything.
+        if not 0.0 <= value <= 5.0:
+            raise serializers.ValidationError('Grade must be between 0.0 and 5.0.')
+        return value
+
+class GradeSerializer(serializers.Serializer):
+    """
+    Validates a whole batch of grades for one subject with a single enrollment
+    query and applies it with ``bulk_update`` in one transaction.
+    Errors are reported per row, keyed by row index like ``ListField`` does.
+    """
     subject_id = serializers.IntegerField()
-    grades = serializers.ListField(
-        child=serializers.DictField(child=serializers.FloatField())
-    )
-    
+    grades = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
     def validate(self, data):
         subject_id = data.get('subject_id')
         grades = data.get('grades')
@@ -106,14 +196,61 @@ class GradeSerializer(serializers.ModelSerializer):
         if not Subject.objects.filter(pk=subject_id).exists():
             raise serializers.ValidationError({"subject_id": "Materia no encontrada."})
 
-        for grade in grades:
-            student_id = grade.get('student_id')
-            if not Enrollment.objects.filter(subject_id=subject_id, student_id=student_id).exists():
-                raise serializers.ValidationError({"grades": f"Inscripción no encontrada para el estudiante con ID {student_id}."})
+        rows = []
+        errors = {}
+        for index, grade in enumerate(grades):
+            entry = GradeEntrySerializer(data=grade)
+            if entry.is_valid():
+                rows.append((index, entry.validated_data))
+            else:
+                errors[index] = entry.errors
+
+        enrollments = {
+            enrollment.student_id: enrollment
+            for enrollment in Enrollment.objects.filter(
+                subject_id=subject_id,
+                student_id__in=[entry['student_id'] for _, entry in rows],
+            )
+        }
+
+        updates = []
+        seen = set()
+        for index, entry in rows:
+            student_id = entry['student_id']
+            if student_id in seen:
+                message = f"Calificación duplicada para el estudiante con ID {student_id}."
+            elif student_id not in enrollments:
+                message = f"Inscripción no encontrada para el estudiante con ID {student_id}."
+            else:
+                seen.add(student_id)
+                updates.append((enrollments[student_id], entry['grade']))
+                continue
+            errors[index] = {'student_id': [message]}
+
+        if errors:
+            raise serializers.ValidationError({"grades": dict(sorted(errors.items()))})
 
+        data['updates'] = updates
         return data
 
-class ProfessorSerializer(serializers.ModelSerializer):
+    def create(self, validated_data):
+        enrollments = []
+        for enrollment, grade in validated_data['updates']:
+            enrollment.grade = grade
+            enrollments.append(enrollment)
+
+        with transaction.atomic():
+            mark_changed(enrollments)
+            Enrollment.objects.bulk_update(enrollments, ['grade', 'change_seq'], batch_size=GRADE_BATCH_SIZE)
+            refresh_summaries({enrollment.student_id for enrollment in enrollments})
+            grades_changed.send(
+                sender=Enrollment,
+                subject_ids={enrollment.subject_id for enrollment in enrollments},
+                student_ids={enrollment.student_id for enrollment in enrollments},
+            )
+        return enrollments
+
+class ProfessorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     subjects = SubjectSerializer(many=True, read_only=True)
 
     class Meta:
@@ -127,12 +264,23 @@ class ProfessorSerializerForWrite(serializers.ModelSerializer):
         model = Professor
         fields = ['id', 'first_name', 'last_name', 'email', 'department', 'subjects']
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = ['id', 'student', 'subject', 'enrollment_date', 'grade', 'is_passed']
         read_only_fields = ['is_passed']
 
+    def validate_grade(self, value):
+        return GradeEntrySerializer().validate_grade(value) if value is not None else value
+
+class JobSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='Job-detail')
+
+    class Meta:
+        model = Job
+        fields = ['id', 'url', 'kind', 'status', 'progress', 'total', 'result', 'error', 'attempts',
+                  'created_at', 'started_at', 'finished_at']
+
 class UserRegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -147,4 +295,20 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         )
         user.set_password(validated_data['password'])
         user.save()
-        return user
\ No newline at end of file
+        return user
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Adds ``is_staff`` and ``professor_id`` (the Professor with the user's
+    email, if any) to the tokens, for ``JWT_USER_CACHE['TRUST_TOKEN_CLAIMS']``.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['is_staff'] = user.is_staff
+        token['professor_id'] = (
+            Professor.objects.filter(email=user.email).values_list('pk', flat=True).first()
+            if user.email else None
+        )
+        return token
@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .authentication import invalidate_cached_user
+from .cache import bump_versions
+from .changes import record_tombstone
+from .models import Enrollment, Professor, Student, StudentGradeSummary, StudentTranscript, Subject
+from .prerequisites import PrerequisiteGraph, invalidate_prerequisite_graph
+from .summary import apply_enrollment_change, refresh_summaries
+
+# Sent with ``subject_ids`` and ``student_ids`` whenever enrollments or
+# grades of those subjects and students change, inside the writing
+# transaction. Model signals cover single-row writes; bulk paths
+# (bulk_create, bulk_update) must send it themselves.
+grades_changed = Signal()
+
+
+@receiver(m2m_changed, sender=Subject.prerequisites.through)
+def prerequisites_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_add' and pk_set:
+        # Load a fresh graph so edges added earlier in this transaction count.
+        graph = PrerequisiteGraph.load()
+        if reverse:
+            cyclic = any(graph.would_create_cycle(subject_id, [instance.pk]) for subject_id in pk_set)
+        else:
+            cyclic = graph.would_create_cycle(instance.pk, pk_set)
+        if cyclic:
+            raise ValidationError(f'Los prerrequisitos de {instance} forman un ciclo.')
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        # Transcripts list the prerequisites of the enrolled subjects. A
+        # reverse clear doesn't say which subjects lost one.
+        StudentTranscript.invalidate_subjects(pk_set if reverse else [instance.pk])
+        transaction.on_commit(invalidate_prerequisite_graph)
+        transaction.on_commit(lambda: bump_versions('subject', 'professor'))
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def subject_changed(sender, instance, **kwargs):
+    StudentTranscript.invalidate_subjects([instance.pk])
+    transaction.on_commit(invalidate_prerequisite_graph)
+    # Professors embed their subjects, so both catalogs go stale, and the
+    # analytics reports show subject names.
+    namespaces = ['subject', 'professor', 'analytics', f'analytics:subject:{instance.pk}']
+    transaction.on_commit(lambda: bump_versions(*namespaces))
+
+
+@receiver(post_save, sender=Professor)
+@receiver(post_delete, sender=Professor)
+def professor_changed(sender, **kwargs):
+    # The professor and department reports group by professor.
+    transaction.on_commit(lambda: bump_versions('professor', 'analytics'))
+
+
+@receiver(m2m_changed, sender=Professor.subjects.through)
+def professor_subjects_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(lambda: bump_versions('professor', 'analytics'))
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_state', None)
+    if created:
+        apply_enrollment_change(instance.student_id, new_grade=instance.grade)
+    elif loaded is None or loaded[0] != instance.student_id:
+        refresh_summaries({instance.student_id, *(loaded[:1] if loaded else ())})
+    else:
+        apply_enrollment_change(instance.student_id, old_grade=loaded[1], new_grade=instance.grade)
+    instance._loaded_state = (instance.student_id, instance.grade)
+    subject_ids = {instance.subject_id, getattr(instance, '_loaded_subject_id', instance.subject_id)}
+    instance._loaded_subject_id = instance.subject_id
+    student_ids = {instance.student_id, *(loaded[:1] if loaded else ())}
+    grades_changed.send(sender=Enrollment, subject_ids=subject_ids, student_ids=student_ids)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, origin=None, **kwargs):
+    record_tombstone(instance)
+    # The summary and transcript go away with the student, nothing to adjust.
+    if isinstance(origin, Student) or (isinstance(origin, QuerySet) and origin.model is Student):
+        grades_changed.send(sender=Enrollment, subject_ids={instance.subject_id}, student_ids=set())
+        return
+    grades_changed.send(sender=Enrollment, subject_ids={instance.subject_id}, student_ids={instance.student_id})
+    apply_enrollment_change(instance.student_id, old_grade=instance.grade)
+
+
+@receiver(post_save, sender=Student)
+def student_changed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        # Every student has a summary, so with_stats() never falls back to
+        # querying the enrollments of a student who has none.
+        StudentGradeSummary.objects.bulk_create([StudentGradeSummary(student_id=instance.pk)], ignore_conflicts=True)
+    else:
+        StudentTranscript.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    invalidate_cached_user(user_id)
+    # Again after commit, in case a request cached the old row meanwhile.
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
+
+
+@receiver(grades_changed)
+def transcripts_changed(sender, student_ids, **kwargs):
+    StudentTranscript.invalidate(student_ids)
+
+
+@receiver(grades_changed)
+def grade_analytics_changed(sender, subject_ids, **kwargs):
+    namespaces = ['analytics', *(f'analytics:subject:{subject_id}' for subject_id in subject_ids)]
+    transaction.on_commit(lambda: bump_versions(*namespaces))
@@ -0,0 +1,93 @@
+"""
+Maintenance of ``StudentGradeSummary`` rows.
+
+Single enrollment writes adjust a student's totals by difference through the
+signal handlers in api/signals.py. Bulk paths, which bypass model signals,
+call ``refresh_summaries`` with the affected students inside their own
+transaction.
+"""
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Enrollment, Student, StudentGradeSummary
+
+SUMMARY_FIELDS = ['enrollment_count', 'graded_count', 'grade_sum', 'passed_count', 'failed_count']
+
+# Marks "no enrollment" as opposed to an enrollment without a grade.
+ABSENT = object()
+
+
+def _contribution(grade):
+    if grade is ABSENT:
+        return (0, 0, 0.0, 0, 0)
+    if grade is None:
+        return (1, 0, 0.0, 0, 0)
+    passed = grade >= 3.0
+    return (1, 1, grade, int(passed), int(not passed))
+
+
+def apply_enrollment_change(student_id, old_grade=ABSENT, new_grade=ABSENT):
+    """
+    Move one enrollment's contribution from ``old_grade`` to ``new_grade``.
+    Leave either out for an enrollment that was created or deleted.
+    """
+    delta = {
+        name: new - old
+        for name, new, old in zip(SUMMARY_FIELDS, _contribution(new_grade), _contribution(old_grade))
+        if new != old
+    }
+    if not delta:
+        return
+    updated = StudentGradeSummary.objects.filter(student_id=student_id).update(
+        **{name: F(name) + value for name, value in delta.items()}
+    )
+    if not updated:
+        refresh_summaries([student_id])
+
+
+def summary_totals(enrollments):
+    """
+    Per-student totals of an enrollment queryset as ``values()`` rows with
+    ``student_id`` and the ``SUMMARY_FIELDS``. Works on migration-state
+    models too, see api/dedupe.py.
+    """
+    return (
+        enrollments.values('student_id')
+        .annotate(
+            enrollment_count=Count('id'),
+            graded_count=Count('grade'),
+            grade_sum=Coalesce(Sum('grade'), 0.0),
+            passed_count=Count('id', filter=Q(grade__gte=3.0)),
+            failed_count=Count('id', filter=Q(grade__lt=3.0)),
+        )
+        .order_by()
+    )
+
+
+def compute_summaries(student_ids):
+    """
+    Unsaved summaries for ``student_ids`` computed from their enrollments in
+    one grouped query. Students without enrollments get an all-zero summary.
+    """
+    summaries = {student_id: StudentGradeSummary(student_id=student_id) for student_id in student_ids}
+    for row in summary_totals(Enrollment.objects.filter(student_id__in=summaries)):
+        summary = summaries[row.pop('student_id')]
+        for name, value in row.items():
+            setattr(summary, name, value)
+    return summaries
+
+
+def refresh_summaries(student_ids):
+    """
+    Recompute and upsert the summaries of ``student_ids`` (deleted students
+    are skipped).
+    """
+    student_ids = list(Student.objects.filter(pk__in=set(student_ids)).values_list('pk', flat=True))
+    if not student_ids:
+        return
+    StudentGradeSummary.objects.bulk_create(
+        compute_summaries(student_ids).values(),
+        update_conflicts=True,
+        unique_fields=['student'],
+        update_fields=SUMMARY_FIELDS,
+    )
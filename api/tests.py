@@ -1,3 +1,1439 @@
-from django.test import TestCase
+import csv
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+import threading
+from unittest import mock
+import time
+import tempfile
+import gzip
+import os
+import subprocess
+import sys
+from io import BytesIO, StringIO
 
-# Create your tests here.
+import brotli
+import orjson
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, connections
+from django.core.management import CommandError, call_command
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import user_cache
+from .changes import purge_tombstones
+from .coalesce import SingleFlight
+from .jobs import claim_jobs, requeue_stale_jobs, run_job
+from .metrics import RequestSample, registry, serializing
+from .importers import StudentImporter
+from .fast_serializers import FastEnrollmentSerializer, FastStudentSerializer, FastSubjectSerializer
+from .models import Enrollment, Job, Professor, Student, StudentGradeSummary, Subject
+from .pagination import IdCursorPagination
+from .parsers import ORJSONParser
+from .prerequisites import PrerequisiteGraph, invalidate_prerequisite_graph
+from .renderers import ORJSONRenderer
+from .replicas import ReplicaRouter, _on_replica, is_pinned, using_primary
+from .serializer import EnrollmentSerializer, StudentSerializer, SubjectSerializer
+from .summary import SUMMARY_FIELDS, compute_summaries, refresh_summaries
+from .transcripts import build_transcripts, stale_transcript_ids
+
+
+class QueryCountTests(TestCase):
+    """
+    The number of queries an endpoint runs must not grow with the number of
+    rows it returns. Every test runs against a dataset big enough that an
+    N+1 would add dozens of queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subjects = Subject.objects.bulk_create([Subject(name=f'Subject {index}') for index in range(6)])
+        for subject in cls.subjects[3:]:
+            subject.prerequisites.add(cls.subjects[0], cls.subjects[1])
+
+        cls.professor = Professor.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', department='Matemáticas'
+        )
+        cls.professor.subjects.add(*cls.subjects[:3])
+
+        cls.students = Student.objects.bulk_create([
+            Student(first_name=f'Student{index}', last_name='Test', email=f'student{index}@example.com', date_of_birth='2000-01-01')
+            for index in range(20)
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, subject=subject, grade=(index % 6) * 1.0 if index % 4 else None)
+            for index, student in enumerate(cls.students)
+            for subject in cls.subjects[:3]
+        ])
+        refresh_summaries([student.pk for student in cls.students])
+
+    def setUp(self):
+        cache.clear()
+        invalidate_prerequisite_graph()
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def assertQueries(self, count, method, path, data=None, status=200):
+        with self.assertNumQueries(count):
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertEqual(response.status_code, status, response.content)
+        return response
+
+    def test_student_list(self):
+        response = self.assertQueries(3, 'get', '/api/v1/student/')
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_subject_list(self):
+        self.assertQueries(2, 'get', '/api/v1/subject/')
+
+    def test_professor_list(self):
+        self.assertQueries(3, 'get', '/api/v1/professor/')
+
+    def test_enrollment_list(self):
+        self.assertQueries(1, 'get', '/api/v1/enrollment/')
+
+    def test_stats(self):
+        # Builds and stores the transcript, then serves it.
+        self.assertQueries(10, 'get', f'/api/v1/student/{self.students[0].pk}/stats/')
+        self.assertQueries(1, 'get', f'/api/v1/student/{self.students[0].pk}/stats/')
+
+    def test_students_per_subject(self):
+        response = self.assertQueries(3, 'get', f'/api/v1/professor/{self.professor.pk}/students_per_subject/')
+        self.assertEqual(len(response.data['Subject 0']), 20)
+
+    def test_student_grades(self):
+        response = self.assertQueries(3, 'get', f'/api/v1/professor/{self.professor.pk}/student_grades/')
+        self.assertEqual(len(response.data['Subject 1']), 20)
+
+    def test_grade_subject(self):
+        grades = [{'student_id': student.pk, 'grade': 4.5} for student in self.students]
+        self.assertQueries(9, 'post', f'/api/v1/professor/{self.professor.pk}/grade_subject/', {
+            'subject_id': self.subjects[0].pk, 'grades': grades,
+        })
+        self.assertEqual(Enrollment.objects.filter(subject=self.subjects[0], grade=4.5).count(), 20)
+
+    def test_enroll(self):
+        self.assertQueries(11, 'post', '/api/v1/enrollment/enroll/', {
+            'student_id': self.students[5].pk,
+            'subject_ids': [subject.pk for subject in self.subjects[3:]],
+        }, status=201)
+
+
+class FastSerializerTests(TestCase):
+    """
+    The fast serializers must render exactly the bytes the ModelSerializers
+    render, for full and sparse fieldsets.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        basics, algebra, calculus = Subject.objects.bulk_create([
+            Subject(name='Básicas', description='Línea\u2028y párrafo\u2029'),
+            Subject(name='Álgebra', description=''),
+            Subject(name='Cálculo', description='"comillas"'),
+        ])
+        calculus.prerequisites.add(algebra, basics)
+        algebra.prerequisites.add(basics)
+        cls.students = Student.objects.bulk_create([
+            Student(first_name='Ñandú', last_name='Pérez', email='nandu@example.com', date_of_birth='2001-02-03'),
+            Student(first_name='Zoë', last_name='Ng', email='zoe@example.com', date_of_birth='1999-12-31'),
+            Student(first_name='Sin', last_name='Notas', email='sin@example.com', date_of_birth='2000-01-01'),
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=cls.students[0], subject=basics, grade=4.7),
+            Enrollment(student=cls.students[0], subject=algebra, grade=2.9),
+            Enrollment(student=cls.students[0], subject=calculus, grade=None),
+            Enrollment(student=cls.students[1], subject=basics, grade=1.0 / 3),
+        ])
+        # students[2] has no summary row, so the average falls back to the enrollments.
+        refresh_summaries([cls.students[0].pk, cls.students[1].pk])
+
+    def assertSameJSON(self, fast, slow):
+        self.assertEqual(ORJSONRenderer().render(fast), JSONRenderer().render(slow))
+
+    def test_subjects(self):
+        slow = SubjectSerializer(Subject.objects.prefetch_related('prerequisites').order_by('id'), many=True).data
+        fast = FastSubjectSerializer(FastSubjectSerializer.values(Subject.objects.order_by('id'))).data
+        self.assertSameJSON(fast, slow)
+
+    def test_enrollments(self):
+        slow = EnrollmentSerializer(Enrollment.objects.order_by('id'), many=True).data
+        fast = FastEnrollmentSerializer(FastEnrollmentSerializer.values(Enrollment.objects.order_by('id'))).data
+        self.assertSameJSON(fast, slow)
+
+    def test_students(self):
+        slow = StudentSerializer(Student.objects.with_stats().order_by('id'), many=True).data
+        fast = FastStudentSerializer(FastStudentSerializer.values(Student.objects.order_by('id'))).data
+        self.assertSameJSON(fast, slow)
+
+    def test_endpoints_match_with_and_without_fast_path(self):
+        client = APIClient()
+        client.force_authenticate(User(username='tester'))
+        paths = [
+            '/api/v1/subject/', '/api/v1/enrollment/', '/api/v1/student/',
+            '/api/v1/student/?fields=id,average_grade,failed_subjects',
+            f'/api/v1/student/{self.students[0].pk}/', f'/api/v1/student/{self.students[0].pk}/stats/',
+            '/api/v1/enrollment/?fields=grade,is_passed',
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                cache.clear()
+                with self.settings(API_FAST_SERIALIZERS=False):
+                    slow = client.get(path)
+                cache.clear()
+                fast = client.get(path)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+
+
+class ORJSONTests(TestCase):
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'ñ \u2028 \u2029 "quoted"',
+            'when': datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=timezone.utc),
+            'day': date(2024, 5, 6),
+            'amount': Decimal('1.10'),
+            'ratio': 1.0 / 3,
+            1: [None, True, 0.5],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_renderer_falls_back_for_unsupported_values(self):
+        data = {'big': 2 ** 70}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_renderer_keeps_indentation(self):
+        data = {'a': [1, 2]}
+        media_type = 'application/json; indent=4'
+        self.assertEqual(ORJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+
+    def test_parser(self):
+        parsed = ORJSONParser().parse(BytesIO('{"name": "Ñandú", "grades": [4.5]}'.encode()))
+        self.assertEqual(parsed, {'name': 'Ñandú', 'grades': [4.5]})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"grade": NaN}'))
+
+
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user('ada', 'ada@example.com', 'secret-123')
+        self.client = APIClient()
+        token = self.client.post('/api/v1/token/', {'username': 'ada', 'password': 'secret-123'}, format='json').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_user_is_looked_up_once(self):
+        with self.assertNumQueries(2):
+            self.client.get('/api/v1/enrollment/')
+        with self.assertNumQueries(1):
+            self.client.get('/api/v1/enrollment/')
+
+    def test_deactivated_user_is_rejected_at_once(self):
+        self.assertEqual(self.client.get('/api/v1/enrollment/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/v1/enrollment/').status_code, 401)
+
+    def test_trusted_claims_skip_the_user_lookup(self):
+        with self.settings(JWT_USER_CACHE={'TRUST_TOKEN_CLAIMS': True}):
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/v1/enrollment/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.wsgi_request.user.is_staff)
+        self.assertIsNone(response.wsgi_request.user.professor_id)
+
+
+class ThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = Student.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', date_of_birth='2000-01-01'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('ada'))
+
+    def rates(self, **rates):
+        return self.settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+        })
+
+    def test_endpoint_rate_is_per_endpoint(self):
+        path = f'/api/v1/student/{self.student.pk}/stats/'
+        with self.rates(student_stats='2/min'):
+            self.assertEqual(self.client.get(path).status_code, 200)
+            self.assertEqual(self.client.get(path).status_code, 200)
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response)
+            self.assertEqual(self.client.get(f'/api/v1/student/{self.student.pk}/').status_code, 200)
+
+    def test_throttling_can_be_disabled(self):
+        path = f'/api/v1/student/{self.student.pk}/stats/'
+        with self.rates(student_stats='1/min'), self.settings(API_THROTTLING=False):
+            for _ in range(3):
+                self.assertEqual(self.client.get(path).status_code, 200)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_calls_share_one_computation(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'value': 42}
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', compute))) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        # Let the followers reach the wait before the leader finishes.
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 42}] * 5)
+        self.assertEqual(flight.calls, {})
+
+    def test_errors_are_raised_and_not_kept(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 'again'), 'again')
+
+
+class EnrollmentWriteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = Student.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', date_of_birth='2000-01-01'
+        )
+        self.subjects = Subject.objects.bulk_create([Subject(name=f'Subject {index}') for index in range(3)])
+        self.subject_ids = [subject.pk for subject in self.subjects]
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('ada'))
+
+    def enroll(self, subject_ids, **headers):
+        return self.client.post(
+            '/api/v1/enrollment/enroll/', {'student_id': self.student.pk, 'subject_ids': subject_ids},
+            format='json', headers=headers,
+        )
+
+    def test_repeated_enrollment_is_a_no_op(self):
+        self.assertEqual(self.enroll(self.subject_ids[:2]).status_code, 201)
+        self.assertEqual(self.enroll(self.subject_ids).status_code, 201)
+        self.assertEqual(Enrollment.objects.filter(student=self.student).count(), 3)
+        self.assertEqual(self.student.grade_summary.enrollment_count, 3)
+
+    def test_idempotency_key_replays_the_response(self):
+        first = self.enroll(self.subject_ids, **{'Idempotency-Key': 'abc'})
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(0):
+            retry = self.enroll(self.subject_ids, **{'Idempotency-Key': 'abc'})
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+        self.assertEqual(self.enroll(self.subject_ids[:1], **{'Idempotency-Key': 'abc'}).status_code, 422)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('grace'))
+        response = other.post(
+            '/api/v1/enrollment/enroll/', {'student_id': self.student.pk, 'subject_ids': self.subject_ids},
+            format='json', headers={'Idempotency-Key': 'abc'},
+        )
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_failed_requests_are_not_stored(self):
+        self.assertEqual(self.enroll(['x'], **{'Idempotency-Key': 'abc'}).status_code, 400)
+        self.assertEqual(self.enroll(self.subject_ids, **{'Idempotency-Key': 'abc'}).status_code, 201)
+
+
+class JobTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media.name))
+        self.subject = Subject.objects.create(name='Álgebra')
+        self.professor = Professor.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', department='Matemáticas'
+        )
+        self.professor.subjects.add(self.subject)
+        self.student = Student.objects.create(
+            first_name='Grace', last_name='Hopper', email='grace@example.com', date_of_birth='2000-01-01'
+        )
+        Enrollment.objects.create(student=self.student, subject=self.subject)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('ada'))
+
+    def run_queued(self):
+        return [run_job(job) for job in claim_jobs('test', 10)]
+
+    def test_async_grading(self):
+        response = self.client.post(
+            f'/api/v1/professor/{self.professor.pk}/grade_subject/?async=1',
+            {'subject_id': self.subject.pk, 'grades': [{'student_id': self.student.pk, 'grade': 4.0}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response.data['status'], Job.QUEUED)
+        self.assertIsNone(Enrollment.objects.get().grade)
+
+        [job] = self.run_queued()
+        self.assertEqual(job.status, Job.SUCCEEDED, job.error)
+        self.assertEqual(Enrollment.objects.get().grade, 4.0)
+        polled = self.client.get(response['Location'])
+        self.assertEqual(polled.data['result'], {'status': 'Grades updated successfully.', 'updated': 1})
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('grace'))
+        self.assertEqual(other.get(response['Location']).status_code, 404)
+
+    def test_invalid_grades_are_rejected_before_queueing(self):
+        response = self.client.post(
+            f'/api/v1/professor/{self.professor.pk}/grade_subject/?async=1',
+            {'subject_id': self.subject.pk, 'grades': [{'student_id': 0, 'grade': 4.0}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_async_import(self):
+        upload = SimpleUploadedFile(
+            'students.csv', b'first_name,last_name,email,date_of_birth\nAlan,Turing,alan@example.com,2000-06-23\n'
+        )
+        response = self.client.post('/api/v1/student/bulk_import/?async=1', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 202, response.content)
+        path = Job.objects.get().payload['path']
+        self.assertTrue(default_storage.exists(path))
+
+        [job] = self.run_queued()
+        self.assertEqual(job.status, Job.SUCCEEDED, job.error)
+        self.assertEqual(job.result['created'], 1)
+        self.assertTrue(Student.objects.filter(email='alan@example.com').exists())
+        self.assertFalse(default_storage.exists(path))
+
+    def test_inline_worker_keeps_the_heartbeat_while_a_job_runs(self):
+        job = Job.objects.create(kind='rebuild_grade_summaries')
+        beat = threading.Event()
+
+        def long_job(claimed):
+            self.assertTrue(beat.wait(5))
+            return claimed
+
+        with mock.patch('api.management.commands.run_worker.signal.signal'), \
+                mock.patch('api.management.commands.run_worker.heartbeat', side_effect=lambda ids: beat.set()) as heartbeat, \
+                mock.patch('api.management.commands.run_worker.run_job', side_effect=long_job):
+            call_command('run_worker', '--threads', '0', '--once', '--poll-interval', '0.01', stdout=StringIO())
+        heartbeat.assert_called_with([job.pk])
+
+    def test_jobs_are_claimed_once_and_requeued_when_stale(self):
+        job = Job.objects.create(kind='rebuild_grade_summaries')
+        self.assertEqual(len(claim_jobs('first', 10)), 1)
+        self.assertEqual(claim_jobs('second', 10), [])
+
+        Job.objects.filter(pk=job.pk).update(heartbeat_at='2000-01-01T00:00:00Z')
+        self.assertEqual(requeue_stale_jobs(), (1, 0))
+        [claimed] = claim_jobs('second', 10)
+        self.assertEqual(claimed.attempts, 2)
+        self.assertEqual(run_job(claimed).status, Job.SUCCEEDED)
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ada = Student.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada.lovelace@example.com', date_of_birth='2000-01-01'
+        )
+        cls.jose = Student.objects.create(
+            first_name='José', last_name='Martínez', email='jmartinez@example.com', date_of_birth='2000-01-01'
+        )
+        Student.objects.bulk_create([
+            Student(first_name=f'Student{index}', last_name='Adams', email=f's{index}@example.com', date_of_birth='2000-01-01')
+            for index in range(30)
+        ])
+        cls.subject = Subject.objects.create(name='Análisis', description='Ada y otros lenguajes')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def search(self, query, **params):
+        response = self.client.get('/api/v1/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_prefix_terms_and_accents(self):
+        [result] = self.search('ada lov')['results']
+        self.assertEqual((result['type'], result['id']), ('student', self.ada.pk))
+        self.assertEqual(self.search('jose martin')['results'][0]['id'], self.jose.pk)
+        self.assertEqual(self.search('ada@exam')['results'][0]['id'], self.ada.pk)
+        self.assertEqual(self.search('analisis', type='subject')['results'][0]['id'], self.subject.pk)
+
+    def test_ranking_and_pages(self):
+        data = self.search('ada', page_size=10)
+        # Ada matches in first name and email; Adams only in last name.
+        self.assertEqual(data['results'][0]['id'], self.ada.pk)
+        self.assertEqual(data['count'], 32)
+        self.assertIsNotNone(data['next'])
+        last = self.search('ada', page_size=10, page=4)
+        self.assertEqual(len(last['results']), 2)
+        every = [(item['type'], item['id']) for page in (1, 2, 3, 4)
+                 for item in self.search('ada', page_size=10, page=page)['results']]
+        self.assertEqual(len(set(every)), 32)
+
+    def test_index_follows_writes(self):
+        Student.objects.filter(pk=self.jose.pk).update(first_name='Pepe')
+        self.assertEqual(self.search('pepe')['count'], 1)
+        self.assertEqual(self.search('jose')['count'], 0)
+        self.ada.delete()
+        self.assertEqual(self.search('lovelace')['count'], 0)
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/v1/search/', {'q': ' !? '}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/search/', {'q': 'ada', 'type': 'teacher'}).status_code, 400)
+
+
+class ChangeFeedTests(TestCase):
+
+    def setUp(self):
+        self.student = Student.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', date_of_birth='2000-01-01'
+        )
+        self.subjects = Subject.objects.bulk_create([Subject(name=f'Subject {index}') for index in range(3)])
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def changes(self, since, status=200, **params):
+        response = self.client.get('/api/v1/enrollment/changes/', {'since': since, **params})
+        self.assertEqual(response.status_code, status, response.content)
+        return response.data
+
+    def test_only_changes_after_the_token_are_returned(self):
+        self.client.post('/api/v1/enrollment/enroll/', {
+            'student_id': self.student.pk, 'subject_ids': [subject.pk for subject in self.subjects],
+        }, format='json')
+        first = self.changes(0, page_size=2)
+        self.assertEqual([change['op'] for change in first['changes']], ['upsert', 'upsert'])
+        self.assertTrue(first['has_more'])
+        rest = self.changes(first['next'], page_size=2)
+        self.assertEqual(len(rest['changes']), 1)
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(self.changes(rest['next'])['changes'], [])
+
+        graded, deleted = Enrollment.objects.filter(student=self.student).order_by('pk')[:2]
+        graded.grade = 4.5
+        graded.save()
+        deleted_id = deleted.pk
+        deleted.delete()
+        data = self.changes(rest['next'])
+        self.assertEqual(
+            [(change['op'], change['id']) for change in data['changes']],
+            [('upsert', graded.pk), ('delete', deleted_id)],
+        )
+        self.assertEqual(data['changes'][0]['grade'], 4.5)
+
+    def test_writes_are_numbered_by_the_reader_after_everything_served(self):
+        first = Enrollment.objects.create(student=self.student, subject=self.subjects[0])
+        self.assertIsNone(first.change_seq)
+        served = self.changes(0)
+        self.assertEqual([change['id'] for change in served['changes']], [first.pk])
+
+        second = Enrollment.objects.create(student=self.student, subject=self.subjects[1])
+        first.grade = 4.0
+        first.save(update_fields=['grade'])
+        first.refresh_from_db()
+        self.assertIsNone(first.change_seq)
+        data = self.changes(served['next'])
+        self.assertEqual([change['id'] for change in data['changes']], [first.pk, second.pk])
+        self.assertTrue(all(change['seq'] > int(served['next']) for change in data['changes']))
+
+    def test_idle_feed_reads_take_no_lock(self):
+        Enrollment.objects.create(student=self.student, subject=self.subjects[0])
+        served = self.changes(0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.changes(served['next'])['changes'], [])
+        self.assertFalse([query['sql'] for query in queries if 'UPDATE' in query['sql']])
+
+    def test_tokens_from_before_a_purge_expire(self):
+        enrollment = Enrollment.objects.create(student=self.student, subject=self.subjects[0])
+        old = self.changes(0)['next']
+        enrollment.delete()
+        # Never served, so never purged.
+        self.assertEqual(purge_tombstones(datetime.now(timezone.utc) + timedelta(seconds=1)), 0)
+        self.assertEqual(len(self.changes(old)['changes']), 1)
+        self.assertEqual(purge_tombstones(datetime.now(timezone.utc) + timedelta(seconds=1)), 1)
+        self.changes(old, status=410)
+        self.assertEqual(self.changes(0)['changes'], [])
+        self.changes('abc', status=400)
+
+
+@override_settings(API_READ_REPLICA={'ALIAS': 'replica'})
+class ReplicaRoutingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ada')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_only_replica_routed_reads_outside_transactions_use_the_replica(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Student), 'default')
+        token = _on_replica.set(True)
+        try:
+            # Test cases run inside a transaction.
+            self.assertEqual(router.db_for_read(Student), 'default')
+            with mock.patch.object(connections['default'], 'in_atomic_block', False):
+                self.assertEqual(router.db_for_read(Student), 'replica')
+                with using_primary():
+                    self.assertEqual(router.db_for_read(Student), 'default')
+                self.assertEqual(router.db_for_write(Student), 'default')
+        finally:
+            _on_replica.reset(token)
+
+    def test_writers_are_pinned_to_the_primary(self):
+        self.assertEqual(self.client.get('/api/v1/student/').status_code, 200)
+        self.assertFalse(is_pinned(self.user))
+        subject = Subject.objects.create(name='Subject')
+        response = self.client.post('/api/v1/student/', {
+            'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com', 'date_of_birth': '2000-01-01',
+            'subject_ids': [subject.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(is_pinned(self.user))
+
+
+class TranscriptTests(TestCase):
+
+    def setUp(self):
+        self.student = Student.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', date_of_birth='2000-01-01'
+        )
+        self.subject = Subject.objects.create(name='Analysis')
+        self.enrollment = Enrollment.objects.create(student=self.student, subject=self.subject, grade=4.0)
+        self.path = f'/api/v1/student/{self.student.pk}/transcript/'
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def test_matches_the_serializer_and_supports_etags(self):
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 200)
+        expected = StudentSerializer(Student.objects.with_stats().get(pk=self.student.pk)).data
+        self.assertEqual(response.content, ORJSONRenderer().render(expected))
+        self.assertEqual(self.client.get(self.path, headers={'If-None-Match': response['ETag']}).status_code, 304)
+        self.assertEqual(self.client.get(f'/api/v1/student/{self.student.pk}/stats/').content, response.content)
+        self.assertEqual(self.client.get('/api/v1/student/0/transcript/').status_code, 404)
+
+    def test_writes_invalidate_the_transcript(self):
+        etag = self.client.get(self.path)['ETag']
+        self.enrollment.grade = 2.0
+        self.enrollment.save()
+        response = self.client.get(self.path, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([subject['id'] for subject in response.json()['failed_subjects']], [self.subject.pk])
+
+        etag = response['ETag']
+        self.subject.name = 'Calculus'
+        self.subject.save()
+        response = self.client.get(self.path, headers={'If-None-Match': etag})
+        self.assertEqual(response.json()['failed_subjects'][0]['name'], 'Calculus')
+
+    def test_background_build(self):
+        self.assertEqual(list(stale_transcript_ids()), [self.student.pk])
+        build_transcripts(stale_transcript_ids())
+        self.assertEqual(list(stale_transcript_ids()), [])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.path).status_code, 200)
+
+
+class DuplicateEnrollmentMigrationTests(TransactionTestCase):
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([target])
+        return executor.loader.project_state(target).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('api')[0])
+
+    def test_duplicates_are_removed_before_the_constraint(self):
+        apps = self.migrate(('api', '0004_studentgradesummary'))
+        Student = apps.get_model('api', 'Student')
+        Subject = apps.get_model('api', 'Subject')
+        Enrollment = apps.get_model('api', 'Enrollment')
+        StudentGradeSummary = apps.get_model('api', 'StudentGradeSummary')
+        student = Student.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com', date_of_birth='2000-01-01')
+        subject = Subject.objects.create(name='Analysis')
+        graded = Enrollment.objects.create(student=student, subject=subject, grade=4.0)
+        Enrollment.objects.create(student=student, subject=subject)
+        StudentGradeSummary.objects.create(student=student, enrollment_count=2, graded_count=1, grade_sum=4.0, passed_count=1)
+
+        output = StringIO()
+        call_command('dedupe_enrollments', dry_run=True, stdout=output)
+        self.assertIn('Would remove 1 duplicate enrollments in 1 pairs.', output.getvalue())
+
+        self.migrate(('api', '0005_enrollment_unique_student_subject'))
+        self.assertEqual(list(Enrollment.objects.values_list('pk', flat=True)), [graded.pk])
+        self.assertEqual(StudentGradeSummary.objects.get(student=student).enrollment_count, 1)
+
+
+class EnrollmentQueryPlansTests(TestCase):
+
+    def test_plans_and_timings_are_printed(self):
+        with self.assertRaisesMessage(CommandError, 'There are no enrollments to benchmark.'):
+            call_command('enrollment_query_plans', stdout=StringIO())
+
+        subjects = Subject.objects.bulk_create([Subject(name=f'Subject {index}') for index in range(2)])
+        students = Student.objects.bulk_create([
+            Student(first_name='Student', last_name=str(index), email=f's{index}@example.com', date_of_birth='2000-01-01')
+            for index in range(3)
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, subject=subject, grade=2.0 + index)
+            for index, student in enumerate(students) for subject in subjects
+        ])
+        out = StringIO()
+        call_command('enrollment_query_plans', repeat=2, students=2, stdout=out)
+        output = out.getvalue()
+        self.assertIn(f'6 enrollments, student {students[-1].pk}', output)
+        for name in ('approved_subjects', 'failed_subjects', 'grade_subject lookup', 'subject roster'):
+            self.assertIn(name, output)
+        self.assertEqual(output.count('over 2 runs'), 4)
+
+
+class AnalyticsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.subject = Subject.objects.create(name='Analysis')
+        self.professor = Professor.objects.create(
+            first_name='Grace', last_name='Hopper', email='grace@example.com', department='Math',
+        )
+        self.professor.subjects.add(self.subject)
+        for index, grade in enumerate([1.0, 3.0, 3.0, 5.0, None]):
+            student = Student.objects.create(
+                first_name='Student', last_name=str(index), email=f's{index}@example.com', date_of_birth='2000-01-01',
+            )
+            Enrollment.objects.create(student=student, subject=self.subject, grade=grade)
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def test_counts_buckets_and_percentiles(self):
+        [report] = self.client.get('/api/v1/analytics/subjects/', {'subject': self.subject.pk}).data
+        self.assertEqual(
+            (report['enrollments'], report['graded'], report['passed'], report['failed']), (5, 4, 3, 1),
+        )
+        counts = [histogram_bin['count'] for histogram_bin in report['histogram']]
+        self.assertEqual(counts, [0, 0, 1, 0, 0, 0, 2, 0, 0, 1])
+        self.assertEqual(report['histogram'][-1], {'from': 4.5, 'to': 5.0, 'count': 1})
+        self.assertEqual(report['percentiles'], {'p25': 1.0, 'p50': 3.0, 'p75': 3.0, 'p90': 5.0})
+
+    def test_catalog_writes_invalidate_the_reports(self):
+        self.assertEqual(self.client.get('/api/v1/analytics/subjects/').data[0]['name'], 'Analysis')
+        self.assertEqual(self.client.get('/api/v1/analytics/departments/').data[0]['name'], 'Math')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subject.name = 'Calculus'
+            self.subject.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.professor.department = 'Physics'
+            self.professor.save()
+        self.assertEqual(self.client.get('/api/v1/analytics/subjects/').data[0]['name'], 'Calculus')
+        self.assertEqual(
+            self.client.get('/api/v1/analytics/subjects/', {'subject': self.subject.pk}).data[0]['name'], 'Calculus',
+        )
+        self.assertEqual(self.client.get('/api/v1/analytics/departments/').data[0]['name'], 'Physics')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.professor.subjects.clear()
+        self.assertEqual(self.client.get('/api/v1/analytics/professors/').data, [])
+
+
+class AsyncViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subjects = Subject.objects.bulk_create([Subject(name=f'Subject {index}') for index in range(3)])
+        cls.subjects[2].prerequisites.add(cls.subjects[0])
+        cls.professor = Professor.objects.create(
+            first_name='Grace', last_name='Hopper', email='grace@example.com', department='Math',
+        )
+        cls.professor.subjects.add(*cls.subjects)
+        cls.student = Student.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', date_of_birth='2000-01-01'
+        )
+        for subject, grade in zip(cls.subjects, [4.5, 2.0, None]):
+            Enrollment.objects.create(student=cls.student, subject=subject, grade=grade)
+        cls.user = User.objects.create_user('tester')
+
+    def setUp(self):
+        cache.clear()
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def assertSameAsSync(self, sync_path, async_path):
+        sync = await sync_to_async(self.client.get)(sync_path, headers=self.headers)
+        response = await self.async_client.get(async_path, headers=self.headers)
+        self.assertEqual((response.status_code, response.json()), (sync.status_code, sync.json()))
+
+    async def test_student_stats(self):
+        await self.assertSameAsSync(f'/api/v1/student/{self.student.pk}/stats/', f'/api/v1/async/student/{self.student.pk}/stats/')
+        await self.assertSameAsSync('/api/v1/student/0/stats/', '/api/v1/async/student/0/stats/')
+
+    async def test_student_stats_without_a_grade_summary(self):
+        await StudentGradeSummary.objects.filter(student=self.student).adelete()
+        await self.assertSameAsSync(f'/api/v1/student/{self.student.pk}/stats/', f'/api/v1/async/student/{self.student.pk}/stats/')
+
+    async def test_professor_student_grades(self):
+        path = f'/professor/{self.professor.pk}/student_grades/'
+        await self.assertSameAsSync(f'/api/v1{path}', f'/api/v1/async{path}')
+        await self.assertSameAsSync(f'/api/v1{path}?subject={self.subjects[1].pk}', f'/api/v1/async{path}?subject={self.subjects[1].pk}')
+
+    async def test_enrollment_list(self):
+        sync = await sync_to_async(self.client.get)('/api/v1/enrollment/', headers=self.headers)
+        response = await self.async_client.get('/api/v1/async/enrollment/', headers=self.headers)
+        self.assertEqual(response.json()['results'], sync.json()['results'])
+        response = await self.async_client.get('/api/v1/async/enrollment/', {'page_size': 2}, headers=self.headers)
+        rest = await self.async_client.get(response.json()['next'], headers=self.headers)
+        self.assertEqual(response.json()['results'] + rest.json()['results'], sync.json()['results'])
+        self.assertEqual((await self.async_client.get('/api/v1/async/enrollment/')).status_code, 401)
+
+
+class GradeValidationTests(TestCase):
+
+    def setUp(self):
+        student = Student.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', date_of_birth='2000-01-01'
+        )
+        self.subject = Subject.objects.create(name='Analysis')
+        self.professor = Professor.objects.create(
+            first_name='Grace', last_name='Hopper', email='grace@example.com', department='Math',
+        )
+        self.enrollment = Enrollment.objects.create(student=student, subject=self.subject)
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def test_out_of_range_and_nan_grades_are_rejected(self):
+        for grade in ['nan', 'NaN', 'inf', -0.5, 5.5]:
+            response = self.client.post(f'/api/v1/professor/{self.professor.pk}/grade_subject/', {
+                'subject_id': self.subject.pk, 'grades': [{'student_id': self.enrollment.student_id, 'grade': grade}],
+            }, format='json')
+            self.assertEqual(response.status_code, 400, grade)
+            response = self.client.put(f'/api/v1/enrollment/{self.enrollment.pk}/update_grade/', {'grade': grade}, format='json')
+            self.assertEqual(response.status_code, 400, grade)
+            response = self.client.patch(f'/api/v1/enrollment/{self.enrollment.pk}/', {'grade': grade}, format='json')
+            self.assertEqual(response.status_code, 400, grade)
+        self.enrollment.refresh_from_db()
+        self.assertIsNone(self.enrollment.grade)
+
+
+@override_settings(API_FAST_SERIALIZERS=False)
+class GradeSummaryTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def test_students_without_enrollments_need_no_extra_queries(self):
+        for index in range(5):
+            Student.objects.create(
+                first_name='Student', last_name=str(index), email=f's{index}@example.com', date_of_birth='2000-01-01'
+            )
+        # Students and their enrollments, not one enrollment query per student.
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/student/')
+        self.assertEqual([student['average_grade'] for student in response.data['results']], [None] * 5)
+
+    def test_plain_queryset_serialization_needs_no_per_student_queries(self):
+        subject = Subject.objects.create(name='Cálculo')
+        for index in range(5):
+            student = Student.objects.create(
+                first_name='Student', last_name=str(index), email=f's{index}@example.com', date_of_birth='2000-01-01'
+            )
+            Enrollment.objects.create(student=student, subject=subject, grade=index)
+        # Students with their summaries, enrollments with their subjects, prerequisites.
+        with self.assertNumQueries(3):
+            data = StudentSerializer(Student.objects.order_by('pk'), many=True).data
+        self.assertEqual([student['average_grade'] for student in data], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+        student = Student.objects.get(email='s4@example.com')
+        with self.assertNumQueries(1):
+            self.assertEqual(student.average_grade(), 4.0)
+
+    def assertSummariesMatch(self):
+        stored = StudentGradeSummary.objects.in_bulk()
+        expected = compute_summaries(Student.objects.values_list('pk', flat=True))
+        self.assertEqual(set(stored), set(expected))
+        for student_id, summary in expected.items():
+            self.assertEqual(
+                [getattr(stored[student_id], name) for name in SUMMARY_FIELDS],
+                [getattr(summary, name) for name in SUMMARY_FIELDS],
+            )
+
+    def test_every_write_path_keeps_the_summaries_exact(self):
+        subjects = Subject.objects.bulk_create([Subject(name=f'Subject {index}') for index in range(3)])
+        professor = Professor.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', department='Matemáticas'
+        )
+        professor.subjects.add(subjects[0])
+        students = [
+            Student.objects.create(
+                first_name='Student', last_name=str(index), email=f's{index}@example.com', date_of_birth='2000-01-01'
+            )
+            for index in range(3)
+        ]
+        for student in students:
+            response = self.client.post('/api/v1/enrollment/enroll/', {
+                'student_id': student.pk, 'subject_ids': [subject.pk for subject in subjects],
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+        self.assertSummariesMatch()
+
+        response = self.client.post(f'/api/v1/professor/{professor.pk}/grade_subject/', {
+            'subject_id': subjects[0].pk,
+            'grades': [{'student_id': student.pk, 'grade': grade} for student, grade in zip(students, (4.5, 2.0, 3.0))],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertSummariesMatch()
+
+        enrollment = Enrollment.objects.get(student=students[1], subject=subjects[0])
+        self.assertEqual(self.client.put(
+            f'/api/v1/enrollment/{enrollment.pk}/update_grade/', {'grade': 3.5}, format='json',
+        ).status_code, 200)
+        self.assertSummariesMatch()
+        self.assertEqual(self.client.patch(
+            f'/api/v1/enrollment/{enrollment.pk}/', {'grade': 1.0}, format='json',
+        ).status_code, 200)
+        self.assertSummariesMatch()
+
+        self.assertEqual(self.client.delete(f'/api/v1/enrollment/{enrollment.pk}/').status_code, 204)
+        Enrollment.objects.filter(student=students[2], subject=subjects[1]).delete()
+        self.assertSummariesMatch()
+
+    def test_rebuild_and_verify_command(self):
+        subject = Subject.objects.create(name='Analysis')
+        students = [
+            Student.objects.create(
+                first_name='Student', last_name=str(index), email=f's{index}@example.com', date_of_birth='2000-01-01'
+            )
+            for index in range(3)
+        ]
+        for student, grade in zip(students, (4.0, 2.5, None)):
+            Enrollment.objects.create(student=student, subject=subject, grade=grade)
+        call_command('rebuild_grade_summaries', '--verify', stdout=StringIO())
+
+        StudentGradeSummary.objects.filter(student=students[0]).update(passed_count=0, grade_sum=1.0)
+        StudentGradeSummary.objects.filter(student=students[1]).delete()
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '2 of 3 summaries are out of date.'):
+            call_command('rebuild_grade_summaries', '--verify', '--batch-size', '2', stdout=out)
+        self.assertIn(f'Student {students[0].pk}: stored enrollment_count=1, graded_count=1, grade_sum=1.0', out.getvalue())
+        self.assertIn(f'Student {students[1].pk}: stored nothing', out.getvalue())
+
+        out = StringIO()
+        call_command('rebuild_grade_summaries', '--batch-size', '2', stdout=out)
+        self.assertIn('Rebuilt 3 summaries.', out.getvalue())
+        self.assertSummariesMatch()
+        call_command('rebuild_grade_summaries', '--verify', stdout=StringIO())
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.subject = Subject.objects.create(name='Analysis')
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def rename(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subject.name = name
+            self.subject.save()
+
+    def test_etag_answers_conditional_requests(self):
+        response = self.client.get('/api/v1/subject/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/v1/subject/', headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+        self.rename('Calculus')
+        response = self.client.get('/api/v1/subject/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['name'], 'Calculus')
+
+    def test_if_modified_since_never_answers_304(self):
+        with mock.patch('api.cache.time.time', return_value=1700000000.5):
+            response = self.client.get('/api/v1/subject/')
+            # Changed within the same second as the cached response.
+            self.rename('Calculus')
+            for headers in (
+                {'If-Modified-Since': response['Last-Modified']},
+                {'If-Modified-Since': response['Last-Modified'], 'If-None-Match': response['ETag']},
+            ):
+                fresh = self.client.get('/api/v1/subject/', headers=headers)
+                self.assertEqual(fresh.status_code, 200)
+                self.assertEqual(fresh.data['results'][0]['name'], 'Calculus')
+                self.assertEqual(fresh['Last-Modified'], response['Last-Modified'])
+
+
+@mock.patch('api.exports.EXPORT_BLOCK_SIZE', 256)
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subjects = Subject.objects.bulk_create([Subject(name=f'Subject {index}') for index in range(2)])
+        students = Student.objects.bulk_create([
+            Student(first_name='Student', last_name=str(index), email=f's{index}@example.com', date_of_birth='2000-01-01')
+            for index in range(30)
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, subject=subject, grade=4.0 if subject == cls.subjects[0] else None)
+            for student in students for subject in cls.subjects
+        ])
+        cls.professor = Professor.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', department='Matemáticas'
+        )
+        cls.professor.subjects.add(cls.subjects[0])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def export(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        encoding = response.get('Content-Encoding')
+        self.assertEqual(encoding, params.get('compress'))
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'br':
+            body = brotli.decompress(body)
+        return response, body.decode()
+
+    def test_csv(self):
+        for compress in ({}, {'compress': 'gzip'}, {'compress': 'br'}):
+            response, body = self.export('/api/v1/enrollment/export/', **compress)
+            self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+            self.assertIn('filename="enrollments.csv"', response['Content-Disposition'])
+            rows = list(csv.reader(StringIO(body)))
+            self.assertEqual(rows[0], [
+                'enrollment_id', 'student_id', 'student_name', 'subject_id', 'subject_name', 'grade', 'enrollment_date',
+            ])
+            self.assertEqual(len(rows), 61)
+            self.assertEqual(rows[1][2:6], ['Student 0', str(self.subjects[0].pk), 'Subject 0', '4.0'])
+
+    def test_jsonl(self):
+        for compress in ({}, {'compress': 'gzip'}, {'compress': 'br'}):
+            response, body = self.export(
+                f'/api/v1/professor/{self.professor.pk}/gradebook_export/', output='jsonl', **compress,
+            )
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            rows = [orjson.loads(line) for line in body.splitlines()]
+            self.assertEqual(len(rows), 30)
+            self.assertEqual({row['subject_id'] for row in rows}, {self.subjects[0].pk})
+            self.assertEqual(rows[0]['student_name'], 'Student 0')
+
+    def test_invalid_parameters(self):
+        for params in ({'output': 'xml'}, {'compress': 'zip'}, {'subject': 'abc'}):
+            self.assertEqual(self.client.get('/api/v1/enrollment/export/', params).status_code, 400, params)
+
+
+class PrerequisiteTests(TestCase):
+
+    def setUp(self):
+        self.basics, self.algebra, self.calculus = Subject.objects.bulk_create(
+            [Subject(name=name) for name in ('Basics', 'Algebra', 'Calculus')]
+        )
+        self.algebra.prerequisites.add(self.basics)
+        self.calculus.prerequisites.add(self.algebra)
+        invalidate_prerequisite_graph()
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def set_prerequisites(self, subject, prerequisites):
+        return self.client.patch(
+            f'/api/v1/subject/{subject.pk}/', {'prerequisites': [prerequisite.pk for prerequisite in prerequisites]},
+            format='json',
+        )
+
+    def test_cycles_are_rejected(self):
+        for subject, prerequisites in (
+            (self.basics, [self.algebra]),  # direct
+            (self.basics, [self.calculus]),  # through algebra
+            (self.algebra, [self.algebra]),  # itself
+        ):
+            response = self.set_prerequisites(subject, prerequisites)
+            self.assertEqual(response.status_code, 400, response.content)
+            self.assertIn('prerequisites', response.data)
+        self.assertEqual(list(self.basics.prerequisites.all()), [])
+
+        response = self.set_prerequisites(self.calculus, [self.algebra, self.basics])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['prerequisites'], sorted([self.algebra.pk, self.basics.pk]))
+
+    def test_graph_leaves_cycles_out_of_the_order(self):
+        graph = PrerequisiteGraph([(1, 'A'), (2, 'B'), (3, 'C'), (4, 'D')], [(2, 1), (3, 2), (2, 3), (4, 4)])
+        self.assertEqual(graph.order, [1])
+        self.assertEqual(graph.cyclic, {2, 3, 4})
+        self.assertEqual(graph.ancestors[3], {1, 2, 3})
+        self.assertEqual(graph.descendants[1], {2, 3})
+        self.assertTrue(graph.would_create_cycle(1, [3]))
+        self.assertFalse(graph.would_create_cycle(3, [1]))
+
+    def test_every_unmet_prerequisite_is_reported_at_once(self):
+        statistics = Subject.objects.create(name='Statistics')
+        statistics.prerequisites.add(self.basics, self.algebra)
+        invalidate_prerequisite_graph()
+        response = self.client.post('/api/v1/student/', {
+            'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com', 'date_of_birth': '2000-01-01',
+            'subject_ids': [self.algebra.pk, statistics.pk, self.basics.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(response.data['subject_ids'], [
+            'El estudiante no cumple con los requisitos previos para Algebra (Basics).',
+            'El estudiante no cumple con los requisitos previos para Statistics (Basics, Algebra).',
+        ])
+
+    def test_registration_requires_passed_prerequisites(self):
+        student = {'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com', 'date_of_birth': '2000-01-01'}
+        response = self.client.post('/api/v1/student/', {**student, 'subject_ids': [self.algebra.pk]}, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn('Basics', response.data['subject_ids'][0])
+        self.assertFalse(Student.objects.exists())
+
+        response = self.client.post('/api/v1/student/', {**student, 'subject_ids': [self.basics.pk]}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        enroll = {'student_id': response.data['id'], 'subject_ids': [self.algebra.pk]}
+        self.assertEqual(self.client.post('/api/v1/enrollment/enroll/', enroll, format='json').status_code, 400)
+        Enrollment.objects.filter(subject=self.basics).update(grade=3.0)
+        self.assertEqual(self.client.post('/api/v1/enrollment/enroll/', enroll, format='json').status_code, 201)
+
+
+@override_settings(API_METRICS={'TOKEN': 'secret', 'SQL_SAMPLE_RATE': 1.0, 'N_PLUS_ONE_THRESHOLD': 2})
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def metrics(self, token='secret'):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return self.client.get('/metrics', headers=headers)
+
+    def test_metrics_require_the_token(self):
+        self.assertEqual(self.metrics(token=None).status_code, 401)
+        self.assertEqual(self.metrics(token='wrong').status_code, 401)
+        self.assertEqual(self.metrics().status_code, 200)
+        with override_settings(API_METRICS={}):
+            self.assertEqual(self.metrics().status_code, 404)
+
+    def test_requests_are_recorded(self):
+        Subject.objects.bulk_create([Subject(name=f'Subject {index}') for index in range(3)])
+        self.assertEqual(self.client.get('/api/v1/subject/').status_code, 200)
+        self.client.get('/api/v1/subject/0/')
+        body = self.metrics().content.decode()
+        self.assertIn('api_requests_total{route="Subject-list",method="GET",status="200"} 1', body)
+        self.assertIn('api_requests_total{route="Subject-detail",method="GET",status="404"} 1', body)
+        self.assertIn('api_request_duration_seconds_count{route="Subject-list"} 1', body)
+        self.assertIn('api_serialize_duration_seconds_count{route="Subject-list"} 1', body)
+        with self.settings(API_FAST_SERIALIZERS=False):
+            self.client.get('/api/v1/student/')
+        self.assertIn('api_serialize_duration_seconds_count{route="Student-list"} 1', self.metrics().content.decode())
+
+    def test_nested_serialization_is_counted_once(self):
+        sample = RequestSample('GET', sample_sql=False)
+        with sample.track_queries():
+            with mock.patch('api.metrics.time.perf_counter', side_effect=[1.0, 3.0]):
+                with serializing():
+                    with serializing():
+                        pass
+        self.assertEqual(sample.serialize_time, 2.0)
+        with serializing():
+            pass
+        self.assertEqual(sample.serialize_time, 2.0)
+
+    def test_slow_requests_and_repeated_sql_are_logged(self):
+        with override_settings(API_METRICS={'SLOW_REQUEST_MS': 0}):
+            client = APIClient()
+            client.force_authenticate(User(username='tester'))
+            with self.assertLogs('api.metrics', 'WARNING') as logs:
+                client.get('/api/v1/subject/')
+        self.assertEqual(orjson.loads(logs.output[0].split(':', 2)[2])['route'], 'Subject-list')
+
+        sample = RequestSample('GET', sample_sql=True)
+        for sql in ('SELECT 1', 'SELECT 2', 'SELECT 2'):
+            sample(lambda *args: None, sql, (), False, {})
+        request = mock.Mock(resolver_match=None)
+        sample.finish(request, mock.Mock(status_code=200), threshold=2)
+        self.assertEqual((sample.query_count, sample.repeated), (3, [('SELECT 2', 2)]))
+
+
+class HealthCheckTests(TestCase):
+
+    def test_liveness_and_readiness_skip_auth(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/healthz')
+        self.assertEqual((response.status_code, response.json()), (200, {'status': 'ok'}))
+        with self.assertNumQueries(1):
+            response = self.client.get('/readyz/')
+        self.assertEqual((response.status_code, response.json()), (200, {'status': 'ok'}))
+
+    def test_readiness_fails_without_the_database(self):
+        with mock.patch.object(connection, 'cursor', side_effect=DatabaseError('down')):
+            response = self.client.get('/readyz')
+        self.assertEqual((response.status_code, response.json()['status']), (503, 'unavailable'))
+
+    def test_production_settings_require_a_secret_key(self):
+        def load(**environ):
+            env = {key: value for key, value in os.environ.items() if key != 'SECRET_KEY'}
+            return subprocess.run(
+                [sys.executable, '-c', 'import drf.settings_production as s; print(s.SECRET_KEY)'],
+                cwd=settings.BASE_DIR, env={**env, **environ}, capture_output=True, text=True,
+            )
+        result = load()
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ImproperlyConfigured', result.stderr)
+        self.assertEqual(load(SECRET_KEY='from-env').stdout.strip(), 'from-env')
+
+
+class BulkImportTests(TestCase):
+
+    def setUp(self):
+        self.basics, self.algebra = Subject.objects.bulk_create([Subject(name='Basics'), Subject(name='Algebra')])
+        self.algebra.prerequisites.add(self.basics)
+        invalidate_prerequisite_graph()
+        Student.objects.create(first_name='Grace', last_name='Hopper', email='grace@example.com', date_of_birth='2000-01-01')
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def post(self, body, content_type='text/csv', query=''):
+        return self.client.post(f'/api/v1/student/bulk_import/{query}', body, content_type=content_type)
+
+    def test_csv(self):
+        body = (
+            'first_name,last_name,email,date_of_birth,subject_ids\n'
+            f'Alan,Turing,alan@example.com,2000-06-23,{self.basics.pk}\n'
+            'Alan,Turing,alan@example.com,2000-06-23,\n'
+            'Grace,Hopper,grace@example.com,2000-01-01,\n'
+            'Ada,Lovelace,ada@example.com,2000-01-01,0\n'
+            f'Ada,Lovelace,ada@example.com,2000-01-01,{self.algebra.pk}\n'
+            'Edsger,Dijkstra,not-an-email,1930-05-11,\n'
+            f'Ada,Lovelace,ada@example.com,2000-01-01,{self.basics.pk};{self.basics.pk}\n'
+        )
+        response = self.post(body, query='?chunk_size=2')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data['created'], response.data['enrollments'], response.data['error_count']), (2, 2, 5))
+        errors = {error['row']: error['errors'] for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5, 6])
+        self.assertEqual(list(errors[2]), ['email'])
+        self.assertEqual(errors[3]['email'], ['Ya existe un estudiante con este email.'])
+        self.assertIn('no encontrada', errors[4]['subject_ids'][0])
+        self.assertIn('requisitos previos', errors[5]['subject_ids'][0])
+        self.assertEqual(list(errors[6]), ['email'])
+        ada = Student.objects.get(email='ada@example.com')
+        self.assertEqual(list(ada.enrollment_set.values_list('subject_id', flat=True)), [self.basics.pk])
+        self.assertEqual(ada.grade_summary.enrollment_count, 1)
+
+    def test_jsonl(self):
+        body = (
+            '{"first_name": "Alan", "last_name": "Turing", "email": "alan@example.com", "date_of_birth": "2000-06-23",'
+            f' "subject_ids": [{self.basics.pk}]}}\n'
+            '\n'
+            'not json\n'
+            '[1, 2]\n'
+            '{"first_name": "Ada", "last_name": "Lovelace", "email": "grace@example.com", "date_of_birth": "2000-01-01"}\n'
+        )
+        response = self.post(body, content_type='application/jsonl')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data['created'], response.data['enrollments'], response.data['error_count']), (1, 1, 3))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4])
+
+    def test_invalid_chunk_size_and_unparseable_csv(self):
+        body = 'first_name,last_name,email,date_of_birth\nAlan,Turing,alan@example.com,2000-06-23\n'
+        for chunk_size in ('0', 'abc', '10001'):
+            self.assertEqual(self.post(body, query=f'?chunk_size={chunk_size}').status_code, 400, chunk_size)
+        response = self.post(body + '"' + 'x' * 140000 + '"\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parse error', response.data['error'])
+        self.assertFalse(Student.objects.filter(email='alan@example.com').exists())
+
+    def test_failed_chunks_are_reported_as_row_errors(self):
+        body = 'first_name,last_name,email,date_of_birth\nAlan,Turing,alan@example.com,2000-06-23\n'
+        with mock.patch.object(StudentImporter, 'insert', side_effect=IntegrityError('FOREIGN KEY constraint failed')):
+            response = self.post(body)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data['created'], response.data['error_count']), (0, 1))
+        self.assertIn('FOREIGN KEY', response.data['errors'][0]['errors']['non_field_errors'][0])
+
+    def test_emails_taken_meanwhile_are_retried_without_them(self):
+        importer = StudentImporter()
+        rows = [
+            (1, {'first_name': 'Alan', 'last_name': 'Turing', 'email': 'alan@example.com',
+                 'date_of_birth': date(2000, 6, 23), 'subject_ids': []}),
+            (2, {'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com',
+                 'date_of_birth': date(2000, 1, 1), 'subject_ids': []}),
+        ]
+        drop_existing_emails = importer.drop_existing_emails
+
+        def racing_check(chunk):
+            rows = drop_existing_emails(chunk)
+            # Another request takes one of the emails right after the check.
+            if not Student.objects.filter(email='ada@example.com').exists():
+                Student.objects.create(
+                    first_name='Ada', last_name='Lovelace', email='ada@example.com', date_of_birth='2000-01-01'
+                )
+            return rows
+
+        with mock.patch.object(importer, 'drop_existing_emails', side_effect=racing_check):
+            importer.flush(rows)
+        self.assertEqual(importer.created, 1)
+        self.assertEqual(importer.errors, [{'row': 2, 'errors': {'email': ['Ya existe un estudiante con este email.']}}])
+
+
+@override_settings(API_FAST_SERIALIZERS=False)
+class PaginationAndFieldsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = Student.objects.bulk_create([
+            Student(first_name='Student', last_name=str(index), email=f's{index}@example.com', date_of_birth='2000-01-01')
+            for index in range(7)
+        ])
+        refresh_summaries([student.pk for student in cls.students])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_cursor_pages_follow_the_primary_key(self):
+        ids = [student.pk for student in self.students]
+        first = self.get('/api/v1/student/?page_size=3')
+        self.assertIsNone(first['previous'])
+        self.assertEqual([student['id'] for student in first['results']], ids[:3])
+
+        # Deleting an already served row doesn't shift the next page.
+        Student.objects.filter(pk=ids[0]).delete()
+        second = self.get(first['next'])
+        self.assertEqual([student['id'] for student in second['results']], ids[3:6])
+        self.assertEqual([student['id'] for student in self.get(second['previous'])['results']], ids[1:3])
+        last = self.get(second['next'])
+        self.assertEqual([student['id'] for student in last['results']], ids[6:])
+        self.assertIsNone(last['next'])
+
+    def test_page_size_is_capped(self):
+        Subject.objects.bulk_create([Subject(name=f'Subject {index}') for index in range(IdCursorPagination.max_page_size + 1)])
+        data = self.get('/api/v1/subject/?page_size=100000')
+        self.assertEqual(len(data['results']), IdCursorPagination.max_page_size)
+        self.assertIsNotNone(data['next'])
+        self.assertEqual(len(self.get('/api/v1/subject/')['results']), settings.REST_FRAMEWORK['PAGE_SIZE'])
+
+    def test_sparse_fieldsets(self):
+        with mock.patch.object(StudentSerializer, 'get_approved_subjects') as approved_subjects:
+            data = self.get('/api/v1/student/?fields=id,average_grade,unknown')
+        approved_subjects.assert_not_called()
+        self.assertEqual([set(student) for student in data['results']], [{'id', 'average_grade'}] * 7)
+
+        self.assertEqual(self.get('/api/v1/student/?fields=unknown')['results'], [{}] * 7)
+        student = self.get(f'/api/v1/student/{self.students[0].pk}/?fields=email, enrollments')
+        self.assertEqual(student, {'email': 's0@example.com', 'enrollments': []})
+        # Only GETs are trimmed.
+        response = self.client.patch(
+            f'/api/v1/student/{self.students[0].pk}/?fields=id', {'first_name': 'Ada'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['first_name'], 'Ada')
+
+
+class ProfessorReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subjects = Subject.objects.bulk_create([Subject(name=f'Subject "{index}"') for index in range(4)])
+        students = Student.objects.bulk_create([
+            Student(first_name='Ñandú', last_name=str(index), email=f's{index}@example.com', date_of_birth='2000-01-01')
+            for index in range(4)
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, subject=subject, grade=index % 5 or None)
+            for index, (student, subject) in enumerate(
+                (student, subject) for student in students for subject in (cls.subjects[0], cls.subjects[2], cls.subjects[3])
+            )
+        ])
+        cls.professor = Professor.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', department='Matemáticas'
+        )
+        # subjects[1] has no enrollments; subjects[3] isn't the professor's.
+        cls.professor.subjects.add(*cls.subjects[:3])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='tester'))
+
+    def report(self, action, **params):
+        return self.client.get(f'/api/v1/professor/{self.professor.pk}/{action}/', params)
+
+    def test_streamed_reports_match(self):
+        for action in ('students_per_subject', 'student_grades'):
+            with self.subTest(action=action):
+                response = self.report(action)
+                self.assertEqual(response.status_code, 200)
+                streamed = self.report(action, stream='true')
+                self.assertTrue(streamed.streaming)
+                self.assertEqual(streamed['Content-Type'], 'application/json')
+                self.assertEqual(orjson.loads(b''.join(streamed.streaming_content)), response.json())
+                self.assertEqual(set(response.json()), {subject.name for subject in self.subjects[:3]})
+                self.assertEqual(response.json()[self.subjects[1].name], [])
+                self.assertEqual(len(response.json()[self.subjects[0].name]), 4)
+
+    def test_subject_filter(self):
+        for action in ('students_per_subject', 'student_grades'):
+            for stream in ('false', 'true'):
+                with self.subTest(action=action, stream=stream):
+                    response = self.report(action, subject=self.subjects[2].pk, stream=stream)
+                    body = b''.join(response.streaming_content) if response.streaming else response.content
+                    data = orjson.loads(body)
+                    self.assertEqual(list(data), [self.subjects[2].name])
+                    self.assertEqual(len(data[self.subjects[2].name]), 4)
+
+                    response = self.report(action, subject=self.subjects[3].pk, stream=stream)
+                    body = b''.join(response.streaming_content) if response.streaming else response.content
+                    self.assertEqual(orjson.loads(body), {})
+                    self.assertEqual(self.report(action, subject='abc', stream=stream).status_code, 400)
@@ -0,0 +1,34 @@
+"""
+Throttles configured in ``REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES']``.
+
+``UserThrottle`` limits every authenticated user (or anonymous IP) overall
+and ``EndpointThrottle`` limits each user per endpoint, for the views and
+actions that set ``throttle_scope``. Rates are read from
+``DEFAULT_THROTTLE_RATES`` on every request rather than once at import, and
+``API_THROTTLING = False`` turns both off (benchmark_api does so).
+Request history lives in the default cache, so set ``REDIS_URL`` for the
+limits to hold across processes.
+"""
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle, UserRateThrottle
+
+
+class SettingsRatesMixin:
+
+    @property
+    def THROTTLE_RATES(self):
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def allow_request(self, request, view):
+        if not getattr(settings, 'API_THROTTLING', True):
+            return True
+        return super().allow_request(request, view)
+
+
+class UserThrottle(SettingsRatesMixin, UserRateThrottle):
+    pass
+
+
+class EndpointThrottle(SettingsRatesMixin, ScopedRateThrottle):
+    pass
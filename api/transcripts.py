@@ -0,0 +1,89 @@
+"""
+Precomputed student transcripts.
+
+A transcript is the full ``StudentSerializer`` document of a student
+(enrollments, approved and failed subjects, average), stored rendered in
+``StudentTranscript`` so that ``/student/{id}/stats/`` and
+``/student/{id}/transcript/`` serve it with one query and an ETag.
+
+Writes don't rebuild anything; they bump the student's ``source_version``
+in their own transaction (``StudentTranscript.invalidate``):
+
+* enrollment and grade changes through the ``grades_changed`` signal, which
+  carries the affected ``student_ids``;
+* student edits, and subject or prerequisite edits (for every student
+  enrolled in the subject), through model signals.
+
+A stale or missing transcript is rebuilt on the next read, or ahead of time
+by the ``build_transcripts`` job. Builds run on the primary and read the
+version before the data, so a stored document is never older than the
+version it is stored under; if the student changed meanwhile it is served
+but not stored.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .coalesce import flight
+from .fast_serializers import FastStudentSerializer
+from .models import Student, StudentTranscript
+from .renderers import ORJSONRenderer
+
+BUILD_BATCH_SIZE = 500
+
+
+def stale_transcript_ids():
+    return (
+        Student.objects.filter(Q(transcript__isnull=True) | Q(transcript__built_version__lt=F('transcript__source_version')))
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+
+
+def build_transcripts(student_ids):
+    """
+    Build and store the transcripts of ``student_ids``. Returns
+    ``{student_id: (document, version)}`` for the students that exist.
+    """
+    built = {}
+    # In a transaction, so on the primary, and one commit per batch.
+    with transaction.atomic():
+        student_ids = list(Student.objects.filter(pk__in=set(student_ids)).values_list('pk', flat=True))
+        if not student_ids:
+            return built
+        StudentTranscript.objects.bulk_create(
+            [StudentTranscript(student_id=student_id) for student_id in student_ids], ignore_conflicts=True,
+        )
+        versions = dict(
+            StudentTranscript.objects.filter(student_id__in=student_ids).values_list('student_id', 'source_version')
+        )
+        rows = FastStudentSerializer.values(Student.objects.filter(pk__in=student_ids).order_by('pk'))
+        renderer = ORJSONRenderer()
+        now = timezone.now()
+        for data in FastStudentSerializer(rows).data:
+            document, version = renderer.render(data), versions[data['id']]
+            StudentTranscript.objects.filter(student_id=data['id'], source_version=version).update(
+                document=document, built_version=version, built_at=now,
+            )
+            built[data['id']] = (document, version)
+    return built
+
+
+def get_transcript(student_id):
+    """
+    The student's current ``(document, version)``, built now if it is
+    missing or stale, or None if there is no such student.
+    """
+    row = (
+        StudentTranscript.objects.filter(student_id=student_id)
+        .values_list('document', 'built_version', 'source_version')
+        .first()
+    )
+    if row is not None and row[0] is not None and row[1] == row[2]:
+        return bytes(row[0]), row[1]
+    return flight.do(
+        ('transcript', student_id),
+        lambda: build_transcripts([student_id]).get(student_id),
+        getattr(settings, 'API_COALESCE_TIMEOUT', None),
+    )
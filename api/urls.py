@@ -9,6 +9,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from .views import UserRegisterView
+from . import async_views
 
 
 router = routers.DefaultRouter()
@@ -16,6 +17,9 @@ router.register(r'subject', views.SubjectViewSet, basename='Subject')
 router.register(r'student', views.StudentViewSet, basename='Student')
 router.register(r'professor', views.ProfessorViewSet, basename='Professor')
 router.register(r'enrollment', views.EnrollmentViewSet, basename='Enrollment')
+router.register(r'analytics', views.AnalyticsViewSet, basename='Analytics')
+router.register(r'jobs', views.JobViewSet, basename='Job')
+router.register(r'search', views.SearchViewSet, basename='Search')
 # router.register(r'register', views.UserRegisterView, basename='User')
 
 schema_view = get_schema_view(
@@ -36,6 +40,9 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('', include(router.urls)),
     path('register/', UserRegisterView.as_view(), name='user-register'),
+    path('async/student/<int:pk>/stats/', async_views.student_stats, name='async-student-stats'),
+    path('async/professor/<int:pk>/student_grades/', async_views.professor_student_grades, name='async-professor-student-grades'),
+    path('async/enrollment/', async_views.enrollment_list, name='async-enrollment-list'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
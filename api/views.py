@@ -4,31 +4,201 @@ from .serializer import (
     SubjectSerializer, StudentSerializer, 
     ProfessorSerializer, EnrollmentSerializer, 
     ProfessorSerializerForWrite, StudenPerProfesorSerializer, 
-    StudentGradeSerializer, GradeSerializer, StudentRegistrationSerializer, UserRegisterSerializer)
-from .models import Subject, Student, Professor ,Enrollment
+    StudentGradeSerializer, GradeSerializer, StudentRegistrationSerializer, UserRegisterSerializer, JobSerializer,
+    requested_fields)
+from .models import Subject, Student, Professor ,Enrollment, Job
 from django.contrib.auth.models import User
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.reverse import reverse
+from .authentication import CachedJWTAuthentication
 from rest_framework import generics
+from rest_framework.utils import encoders
+from rest_framework.parsers import MultiPartParser, FormParser
+from .parsers import CSVParser, ORJSONParser, read_csv_rows
+from .analytics import department_report, professor_report, subject_report
+from .cache import CachedResponseMixin
+from .changes import MAX_CHANGES_PAGE_SIZE, TokenExpired, changes_since
+from .coalesce import coalesced_response
+from .enrollments import enroll_student
+from .exports import export_response
+from .fast_serializers import FastEnrollmentSerializer, FastReadMixin, FastStudentSerializer, FastSubjectSerializer
+from .idempotency import idempotent_response
+from .importers import StudentImporter, iter_upload_rows
+from .jobs import enqueue, store_upload
+from .pagination import SearchPagination
+from .prerequisites import get_prerequisite_graph
+from .replicas import ReplicaReadMixin
+from .transcripts import get_transcript
+from .search import TARGETS as SEARCH_TARGETS, SearchResults, search_terms
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from itertools import groupby
+import csv
+import json
+
+import orjson
 
 # # Create your views here.
 
-class SubjectViewSet(viewsets.ModelViewSet):
-    queryset = Subject.objects.all()
+STREAM_CHUNK_SIZE = 2000
+MAX_IMPORT_CHUNK_SIZE = 10000
+CHANGES_PAGE_SIZE = 500
+
+
+def _is_truthy(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def _job_accepted(request, job):
+    data = JobSerializer(job, context={'request': request}).data
+    response = Response(data, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = data['url']
+    return response
+
+
+def _json_dumps(data):
+    # Same encoding options as DRF's JSONRenderer defaults.
+    return json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def _stream_subject_map(subjects, enrollments, serialize_row):
+    """
+    Yield a JSON object shaped like ``{subject.name: [row, ...]}`` while
+    walking ``enrollments`` (ordered by subject) one row at a time.
+    """
+    grouped = groupby(enrollments, key=lambda enrollment: enrollment.subject_id)
+    current = next(grouped, None)
+    yield '{'
+    for index, subject in enumerate(subjects):
+        if index:
+            yield ','
+        yield _json_dumps(subject.name) + ':['
+        while current is not None and current[0] < subject.pk:
+            current = next(grouped, None)
+        if current is not None and current[0] == subject.pk:
+            for row_index, enrollment in enumerate(current[1]):
+                yield (',' if row_index else '') + _json_dumps(serialize_row(enrollment))
+            current = next(grouped, None)
+        yield ']'
+    yield '}'
+
+class SubjectViewSet(ReplicaReadMixin, CachedResponseMixin, FastReadMixin, viewsets.ModelViewSet):
+    queryset = Subject.objects.prefetch_related('prerequisites')
     serializer_class = SubjectSerializer
+    fast_serializer_class = FastSubjectSerializer
+    cache_namespace = 'subject'
+
+    def _graph_and_id(self, pk):
+        graph = get_prerequisite_graph()
+        subject_id = int(pk) if str(pk).isdigit() else None
+        if subject_id not in graph:
+            return graph, None
+        return graph, subject_id
 
-class StudentViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def prerequisite_tree(self, request, pk=None):
+        """
+        Retrieve the full prerequisite chain of a subject in topological order.
+        With ``?student=<id>`` the prerequisites that student has not passed yet
+        are listed under ``missing``.
+        """
+        graph, subject_id = self._graph_and_id(pk)
+        if subject_id is None:
+            return Response({'error': 'Subject not found.'}, status=404)
+
+        tree = graph.tree(subject_id)
+        student_id = request.query_params.get('student')
+        if student_id:
+            if not student_id.isdigit():
+                return Response({'error': 'Invalid student ID.'}, status=400)
+            passed = set(
+                Enrollment.objects.filter(
+                    student_id=student_id, subject_id__in=tree['all_prerequisites'], grade__gte=3.0
+                ).values_list('subject_id', flat=True)
+            )
+            tree['missing'] = [subject for subject in tree['all_prerequisites'] if subject not in passed]
+        return Response(tree)
+
+    @action(detail=True, methods=['get'])
+    def unlocks(self, request, pk=None):
+        """
+        Retrieve every subject that directly or transitively requires this one.
+        """
+        graph, subject_id = self._graph_and_id(pk)
+        if subject_id is None:
+            return Response({'error': 'Subject not found.'}, status=404)
+        return Response(graph.unlocks(subject_id))
+
+class StudentViewSet(ReplicaReadMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = Student.objects.all()
     serializer_class = StudentRegistrationSerializer
+    fast_serializer_class = FastStudentSerializer
+    throttle_scope = None
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            fields = requested_fields(self.request)
+            if fields is None:
+                return Student.objects.with_stats()
+            return Student.objects.with_stats(
+                enrollments=bool(fields & {'approved_subjects', 'failed_subjects', 'enrollments'}),
+                average='average_grade' in fields,
+            )
+        return Student.objects.all()
 
     def get_serializer_class(self):
-        if self.action == 'create' or 'update':
+        if self.action in ('create', 'update', 'partial_update'):
             return StudentRegistrationSerializer
         return StudentSerializer
+
+    def create(self, request, *args, **kwargs):
+        return idempotent_response(request, lambda: super(StudentViewSet, self).create(request, *args, **kwargs))
     
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def bulk_import(self, request):
+        """
+        Import students from a CSV or JSON Lines upload, sent either as a
+        multipart ``file`` or as the raw request body (``text/csv`` or
+        ``application/jsonl``). Columns: first_name, last_name, email,
+        date_of_birth and optionally subject_ids (``;``-separated in CSV).
+        The upload is read row by row and inserted in chunks of
+        ``?chunk_size=`` rows.
+        With ``?async=1`` the upload is stored and imported by a background
+        job; the response is ``202 Accepted`` pointing at ``/jobs/{id}/``.
+        """
+        chunk_size = request.query_params.get('chunk_size')
+        if chunk_size is not None:
+            if not chunk_size.isdigit() or not 0 < int(chunk_size) <= MAX_IMPORT_CHUNK_SIZE:
+                return Response({'error': f'chunk_size must be between 1 and {MAX_IMPORT_CHUNK_SIZE}.'}, status=400)
+            chunk_size = int(chunk_size)
+
+        if request.content_type.startswith('multipart/form-data'):
+            stream = request.FILES.get('file')
+            file_format = 'jsonl' if stream and stream.name.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+        else:
+            stream = request.stream
+            file_format = 'jsonl' if 'json' in request.content_type else 'csv'
+        if stream is None:
+            return Response({'error': 'A CSV or JSONL upload is required.'}, status=400)
+
+        if _is_truthy(request.query_params.get('async')):
+            path = store_upload(stream, file_format)
+            job = enqueue('import_students', {'path': path, 'format': file_format, 'chunk_size': chunk_size}, request.user)
+            return _job_accepted(request, job)
+
+        importer = StudentImporter(chunk_size)
+        try:
+            report = importer.run(iter_upload_rows(stream, file_format))
+        except (csv.Error, UnicodeDecodeError) as exc:
+            report = importer.report()
+            report['error'] = f'Upload parse error - {exc}'
+            return Response(report, status=400)
+        return Response(report, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['get'])
     def enrolled_subjects(self, request, pk=None):
         try:
@@ -36,39 +206,73 @@ class StudentViewSet(viewsets.ModelViewSet):
         except Student.DoesNotExist:
             return Response({'error': 'Student not found.'}, status=404)
         
-        enrollments = Enrollment.objects.filter(student=student)
+        enrollments = (
+            Enrollment.objects.filter(student=student)
+            .select_related('subject')
+            .prefetch_related('subject__prerequisites')
+        )
         subjects = [enrollment.subject for enrollment in enrollments]
         serializer = SubjectSerializer(subjects, many=True)
         return Response({'subjects': serializer.data})
 
     
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], throttle_scope='student_stats')
     def stats(self, request, pk=None):
-        try:
-            student = Student.objects.get(pk=pk)
-        except Student.DoesNotExist:
+        return self._transcript_response(request, pk)
+
+    @action(detail=True, methods=['get'], throttle_scope='student_transcript')
+    def transcript(self, request, pk=None):
+        """
+        The student's full record (enrollments, approved and failed subjects,
+        average) from its stored transcript, with an ETag for conditional
+        requests; see api/transcripts.py.
+        """
+        return self._transcript_response(request, pk)
+
+    def _transcript_response(self, request, pk):
+        transcript = get_transcript(int(pk)) if str(pk).isdigit() else None
+        if transcript is None:
             return Response({'error': 'Student not found.'}, status=404)
 
-        serializer = StudentSerializer(student)
-        return Response(serializer.data)
+        document, version = transcript
+        etag = quote_etag(f'transcript-{pk}-{version}')
+        not_modified = get_conditional_response(request._request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        if request.accepted_renderer.format == 'json':
+            # Already rendered by ORJSONRenderer when it was built.
+            response = HttpResponse(document, content_type='application/json')
+        else:
+            response = Response(orjson.loads(document))
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
     
     @action(detail=True, methods=['get'])
     def failed_subjects(self, request, pk=None):
         try:
-            student = Student.objects.get(pk=pk)
+            student = Student.objects.with_stats().get(pk=pk)
         except Student.DoesNotExist:
             return Response({'error': 'Student not found.'}, status=404)
 
-        serializer = StudentSerializer(student)
-        return Response(serializer.data['failed_subjects'])
+        serializer = SubjectSerializer(student.failed_subjects(), many=True)
+        return Response(serializer.data)
 
 
-class ProfessorViewSet(viewsets.ModelViewSet):
+class ProfessorViewSet(ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Professor.objects.all()
     serializer_class = ProfessorSerializer
-    authentication_classes = [JWTAuthentication]
+    cache_namespace = 'professor'
+    throttle_scope = None
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return Professor.objects.prefetch_related('subjects__prerequisites')
+        return Professor.objects.all()
+
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PUT', 'PATCH']:
             return ProfessorSerializerForWrite
@@ -100,87 +304,196 @@ class ProfessorViewSet(viewsets.ModelViewSet):
         serializer = SubjectSerializer(subjects, many=True)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['get'])
-    def students_per_subject(self, request, pk=None):
+    def _subject_report(self, request, serialize_rows, serialize_row):
         """
-        Retrieve the list of students for each subject assigned to a professor.
+        Build a ``{subject.name: [...]}`` report over the professor's subjects
+        from a single enrollment query, optionally limited with ``?subject=<id>``
+        and streamed with ``?stream=true``. Identical concurrent requests that
+        aren't streamed share one computation (see api/coalesce.py).
         """
+        if _is_truthy(request.query_params.get('stream')):
+            return self._build_subject_report(request, serialize_rows, serialize_row)
+        return coalesced_response(
+            request, self.action, lambda: self._build_subject_report(request, serialize_rows, serialize_row),
+        )
+
+    def _build_subject_report(self, request, serialize_rows, serialize_row):
         professor = self.get_object()
         subjects = professor.subjects.all()
+        subject_id = request.query_params.get('subject')
+        if subject_id:
+            if not subject_id.isdigit():
+                return Response({'error': 'Invalid subject ID.'}, status=400)
+            subjects = subjects.filter(pk=subject_id)
+
+        enrollments = Enrollment.objects.filter(subject__in=subjects).select_related('student')
+
+        if _is_truthy(request.query_params.get('stream')):
+            subjects = list(subjects.order_by('pk'))
+            enrollments = enrollments.order_by('subject_id', 'id').iterator(chunk_size=STREAM_CHUNK_SIZE)
+            return StreamingHttpResponse(
+                _stream_subject_map(subjects, enrollments, serialize_row),
+                content_type='application/json',
+            )
+
+        subjects = list(subjects)
+        enrollments_by_subject = {subject.pk: [] for subject in subjects}
+        for enrollment in enrollments.order_by('id'):
+            enrollments_by_subject[enrollment.subject_id].append(enrollment)
+
         result = {}
         for subject in subjects:
-            enrollments = Enrollment.objects.filter(subject=subject)
-            students = [enrollment.student for enrollment in enrollments]
-            student_serializer = StudenPerProfesorSerializer(students, many=True)
-            result[subject.name] = student_serializer.data
-
+            result[subject.name] = serialize_rows(enrollments_by_subject[subject.pk])
         return Response(result)
+
+    @action(detail=True, methods=['get'], throttle_scope='students_per_subject')
+    def students_per_subject(self, request, pk=None):
+        """
+        Retrieve the list of students for each subject assigned to a professor.
+        """
+        return self._subject_report(
+            request,
+            lambda enrollments: StudenPerProfesorSerializer(
+                [enrollment.student for enrollment in enrollments], many=True
+            ).data,
+            lambda enrollment: StudenPerProfesorSerializer(enrollment.student).data,
+        )
     
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], throttle_scope='student_grades')
     def student_grades(self, request, pk=None):
-        professor = self.get_object()
-        subjects = professor.subjects.all()
-        result = {}
-        for subject in subjects:
-            enrollments = Enrollment.objects.filter(subject=subject)
-            student_grades = [
-                {
-                    'student': enrollment.student,
-                    'grade': enrollment.grade
-                }
-                for enrollment in enrollments
-            ]
-            grade_serializer = StudentGradeSerializer(student_grades, many=True)
-            result[subject.name] = grade_serializer.data
+        def as_grade(enrollment):
+            return {'student': enrollment.student, 'grade': enrollment.grade}
 
-        return Response(result)
+        return self._subject_report(
+            request,
+            lambda enrollments: StudentGradeSerializer(
+                [as_grade(enrollment) for enrollment in enrollments], many=True
+            ).data,
+            lambda enrollment: StudentGradeSerializer(as_grade(enrollment)).data,
+        )
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['get'])
+    def gradebook_export(self, request, pk=None):
+        """
+        Stream every enrollment in the professor's subjects (or just
+        ``?subject=<id>``) as CSV or JSON Lines; see ``export_response``.
+        """
+        professor = self.get_object()
+        enrollments = Enrollment.objects.filter(subject__professors=professor)
+        subject_id = request.query_params.get('subject')
+        if subject_id:
+            if not subject_id.isdigit():
+                return Response({'error': 'Invalid subject ID.'}, status=400)
+            enrollments = enrollments.filter(subject_id=subject_id)
+        return export_response(request, enrollments.order_by('subject_id', 'id'), f'gradebook-{professor.pk}')
+
+    @action(detail=True, methods=['post'], parser_classes=[ORJSONParser, CSVParser, MultiPartParser, FormParser])
     def grade_subject(self, request, pk=None):
-        serializer = GradeSerializer(data=request.data)
+        """
+        Grade a whole subject at once. Accepts JSON ``{"subject_id", "grades"}``
+        or CSV rows with ``student_id,grade`` columns (as the request body or a
+        ``file`` upload) together with ``?subject_id=``.
+        With ``?async=1`` the grades are applied by a background job and the
+        response is ``202 Accepted`` pointing at ``/jobs/{id}/``.
+        """
+        if 'file' in request.FILES:
+            try:
+                grades = list(read_csv_rows(request.FILES['file']))
+            except (csv.Error, UnicodeDecodeError) as exc:
+                return Response({'error': f'CSV parse error - {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+            data = {'subject_id': request.data.get('subject_id') or request.query_params.get('subject_id'), 'grades': grades}
+        elif isinstance(request.data, list):
+            data = {'subject_id': request.query_params.get('subject_id'), 'grades': request.data}
+        else:
+            data = request.data
+
+        serializer = GradeSerializer(data=data)
         if serializer.is_valid():
-            subject_id = serializer.validated_data['subject_id']
-            grades = serializer.validated_data['grades']
-            
-            for grade in grades:
-                student_id = grade['student_id']
-                grade_value = grade['grade']
-                enrollment = Enrollment.objects.get(subject_id=subject_id, student_id=student_id)
-                enrollment.grade = grade_value
-                enrollment.save()
-            
-            return Response({'status': 'Grades updated successfully.'}, status=status.HTTP_200_OK)
+            if _is_truthy(request.query_params.get('async')):
+                # Validated now so errors still come back at once; the job
+                # validates again against the data as it is when it runs.
+                payload = {'subject_id': data.get('subject_id'), 'grades': data.get('grades')}
+                return _job_accepted(request, enqueue('grade_subject', payload, request.user))
+            enrollments = serializer.save()
+            return Response({'status': 'Grades updated successfully.', 'updated': len(enrollments)}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
+class EnrollmentViewSet(ReplicaReadMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = Enrollment.objects.all()
     serializer_class = EnrollmentSerializer
+    fast_serializer_class = FastEnrollmentSerializer
 
     @action(detail=False, methods=['post'])
     def enroll(self, request):
+        """
+        Enroll ``student_id`` in ``subject_ids`` in one transaction. Subjects
+        the student already has are skipped, so repeating a request is
+        harmless; send an ``Idempotency-Key`` header to make retries free.
+        """
+        return idempotent_response(request, lambda: self._enroll(request))
+
+    def _enroll(self, request):
         student_id = request.data.get('student_id')
         subject_ids = request.data.get('subject_ids')
         
         if not student_id or not subject_ids:
             return Response({'error': 'Student ID and Subject IDs are required.'}, status=400)
-        
+        if not isinstance(subject_ids, list):
+            subject_ids = [subject_ids]
+        try:
+            student_id = int(student_id)
+            subject_ids = [int(subject_id) for subject_id in subject_ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'Student ID and Subject IDs must be integers.'}, status=400)
+
         try:
-            student = Student.objects.get(pk=student_id)
+            report = enroll_student(student_id, subject_ids)
         except Student.DoesNotExist:
             return Response({'error': 'Student not found.'}, status=404)
-        
-        subjects = Subject.objects.filter(pk__in=subject_ids)
-        
-        for subject in subjects:
-            prerequisites = subject.prerequisites.all()
-            if prerequisites.exists() and not Enrollment.objects.filter(student=student, subject__in=prerequisites).exists():
-                return Response({'error': f'El estudiante no cumple con los requisitos previos para {subject.name}.'}, status=400)
-            
-            student.subjects.add(subject)
+        if not report.ok:
+            return Response({'error': 'El estudiante no cumple con los requisitos previos.', 'errors': report.errors()}, status=400)
         
         return Response({'status': 'Inscription successful.'}, status=201)
     
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Enrollments created, updated or deleted after ``?since=<token>``
+        (``0`` or nothing for a full sync), oldest first, at most
+        ``?page_size=`` per page. Keep calling with the returned ``next``
+        token while ``has_more`` is true. A 410 means the token is older
+        than the kept deletes and the mirror must resync from 0.
+        Served from the primary, since a read numbers the changes that are
+        still waiting (see api/changes.py).
+        """
+        since = request.query_params.get('since') or '0'
+        page_size = request.query_params.get('page_size') or str(CHANGES_PAGE_SIZE)
+        if not since.isdigit():
+            return Response({'error': 'Invalid since token.'}, status=400)
+        if not page_size.isdigit() or not 0 < int(page_size) <= MAX_CHANGES_PAGE_SIZE:
+            return Response({'error': f'page_size must be between 1 and {MAX_CHANGES_PAGE_SIZE}.'}, status=400)
+
+        try:
+            changes, next_since, has_more = changes_since(int(since), int(page_size))
+        except TokenExpired:
+            return Response({'error': 'The since token has expired; resync from since=0.'}, status=410)
+        return Response({'changes': changes, 'next': str(next_since), 'has_more': has_more})
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream all enrollments, optionally only ``?subject=<id>``, as CSV or
+        JSON Lines; see ``export_response``.
+        """
+        enrollments = Enrollment.objects.all()
+        subject_id = request.query_params.get('subject')
+        if subject_id:
+            if not subject_id.isdigit():
+                return Response({'error': 'Invalid subject ID.'}, status=400)
+            enrollments = enrollments.filter(subject_id=subject_id)
+        return export_response(request, enrollments.order_by('id'), 'enrollments')
+
     @action(detail=True, methods=['put'])
     def update_grade(self, request, pk=None):
         try:
@@ -197,7 +510,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
         except ValueError:
             return Response({'error': 'Invalid grade value.'}, status=400)
         
-        if grade < 0.0 or grade > 5.0:
+        if not 0.0 <= grade <= 5.0:
             return Response({'error': 'Grade must be between 0.0 and 5.0.'}, status=400)
         
         enrollment.grade = grade
@@ -206,7 +519,90 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
         serializer = EnrollmentSerializer(enrollment)
         return Response({'status': 'Grade updated successfully.', 'data': serializer.data}, status=200)
     
+class AnalyticsViewSet(ReplicaReadMixin, CachedResponseMixin, viewsets.ViewSet):
+    """
+    Pass rates, mean, standard deviation, histogram and percentiles of the
+    grades, per subject, professor or department. Each report is one grouped
+    query, cached until the next enrollment or grade write (per subject when
+    ``?subject=<id>`` is given).
+    """
+    cache_namespace = 'analytics'
+
+    @action(detail=False, methods=['get'])
+    def subjects(self, request):
+        subject_id = request.query_params.get('subject')
+        if subject_id is None:
+            return self.cached_response(request, 'subjects', lambda: Response(subject_report()))
+        if not subject_id.isdigit():
+            return Response({'error': 'Invalid subject ID.'}, status=400)
+        return self.cached_response(
+            request, 'subject', lambda: Response(subject_report(int(subject_id))),
+            namespace=f'analytics:subject:{subject_id}',
+        )
+
+    @action(detail=False, methods=['get'])
+    def professors(self, request):
+        return self.cached_response(request, 'professors', lambda: Response(professor_report()))
+
+    @action(detail=False, methods=['get'])
+    def departments(self, request):
+        return self.cached_response(request, 'departments', lambda: Response(department_report()))
+
+
 class UserRegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserRegisterSerializer
-    permission_classes = [permissions.AllowAny]
\ No newline at end of file
+    permission_classes = [permissions.AllowAny]
+
+
+class SearchViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+    ``/search/?q=`` ranks students (first_name, last_name, email) and
+    subjects (name, description) whose words start with every term of ``q``;
+    ``?type=student`` or ``?type=subject`` limits it to one model. Results
+    come in numbered pages; see api/search.py.
+    """
+    pagination_class = SearchPagination
+
+    def list(self, request):
+        terms = search_terms(request.query_params.get('q', ''))
+        if not terms:
+            return Response({'error': 'q is required.'}, status=400)
+        kinds = request.query_params.get('type')
+        if kinds:
+            kinds = [kind.strip() for kind in kinds.split(',')]
+            if not set(kinds) <= set(SEARCH_TARGETS):
+                return Response({'error': f"type must be one of {', '.join(SEARCH_TARGETS)}."}, status=400)
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(SearchResults(terms, kinds), request, view=self)
+        return paginator.get_paginated_response(page)
+
+
+class JobViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Background jobs (see api/jobs.py). Users see the jobs they started;
+    staff see every job.
+    """
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        jobs = Job.objects.all()
+        if not self.request.user.is_staff:
+            jobs = jobs.filter(created_by_id=self.request.user.id)
+        return jobs
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def rebuild_summaries(self, request):
+        """
+        Rebuild every student's grade summary in the background.
+        """
+        return _job_accepted(request, enqueue('rebuild_grade_summaries', {}, request.user))
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def build_transcripts(self, request):
+        """
+        Build every missing or stale student transcript in the background,
+        e.g. ahead of a deadline when many of them will be requested.
+        """
+        return _job_accepted(request, enqueue('build_transcripts', {}, request.user))
@@ -1,6 +1,6 @@
-set -0 errexit
+set -o errexit
 
 pip install -r requirements.txt
 
-python manage.py collecstatic --no-input
-python manage.py migrate
\ No newline at end of file
+python manage.py collectstatic --no-input
+python manage.py migrate
@@ -52,18 +52,75 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.IdCursorPagination',
+    'PAGE_SIZE': 50,
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.UserThrottle',
+        'api.throttling.EndpointThrottle',
+    ),
+    # 'user' applies to every request; the other scopes are per user and
+    # endpoint, for the actions that set throttle_scope.
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.environ.get('API_THROTTLE_USER_RATE', '1200/min'),
+        'students_per_subject': os.environ.get('API_THROTTLE_REPORT_RATE', '60/min'),
+        'student_grades': os.environ.get('API_THROTTLE_REPORT_RATE', '60/min'),
+        'student_stats': os.environ.get('API_THROTTLE_REPORT_RATE', '60/min'),
+        'student_transcript': os.environ.get('API_THROTTLE_REPORT_RATE', '60/min'),
+    },
 }
 
+# Set API_THROTTLING=false to disable the throttles above (see api/throttling.py).
+API_THROTTLING = os.environ.get('API_THROTTLING', 'true').lower() not in ('0', 'false', 'no')
+
+# Background jobs run by manage.py run_worker (see api/jobs.py).
+API_JOBS = {
+    'WORKER_THREADS': int(os.environ.get('JOB_WORKER_THREADS', 4)),
+    'STALE_AFTER': 300,
+    'MAX_ATTEMPTS': 3,
+}
+
+# Seconds a request waits for an identical in-flight report before computing
+# it itself (see api/coalesce.py).
+API_COALESCE_TIMEOUT = 30
+
+# Serve list/retrieve of subjects, students and enrollments (and student
+# stats) from .values() rows via api/fast_serializers.py.
+API_FAST_SERIALIZERS = True
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
     'SLIDING_TOKEN_LIFETIME': timedelta(days=30),
     'SLIDING_TOKEN_REFRESH_LIFETIME_LATE_USER': timedelta(days=1),
     'SLIDING_TOKEN_LIFETIME_LATE_USER': timedelta(days=30),
+    'TOKEN_OBTAIN_SERIALIZER': 'api.serializer.ClaimsTokenObtainPairSerializer',
+}
+
+# Per-process cache of authenticated users (see api/authentication.py).
+JWT_USER_CACHE = {
+    'TIMEOUT': 30,
+    'MAX_SIZE': 10000,
+    'TRUST_TOKEN_CLAIMS': os.environ.get('JWT_TRUST_TOKEN_CLAIMS', '').lower() in ('1', 'true', 'yes'),
 }
 
+# Seconds a process trusts its in-memory prerequisite graph before checking
+# the shared cache for invalidations made by other processes.
+PREREQUISITE_GRAPH_CHECK_INTERVAL = 1.0
+
+# Rows per bulk_create batch in /student/bulk_import/ (override with ?chunk_size=).
+STUDENT_IMPORT_CHUNK_SIZE = 1000
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'api_key': {
@@ -75,6 +132,8 @@ SWAGGER_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    'api.middleware.health_check_middleware',
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -112,8 +171,59 @@ WSGI_APPLICATION = 'drf.wsgi.application'
 DATABASES = {
     'default': dj_database_url.config(
         default='sqlite://db.sqlite3',
-        conn_max_age=600
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+}
+
+# Optional read replica: the reads of safe API requests go there, except
+# for users who wrote in the last STICKY_SECONDS (see api/replicas.py).
+# Tests mirror it to the default test database.
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+        test_options={'MIRROR': 'default'},
     )
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+API_READ_REPLICA = {
+    'ALIAS': 'replica' if DATABASE_REPLICA_URL else None,
+    'STICKY_SECONDS': int(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS', 5)),
+}
+
+
+# Cache
+# Local memory by default (and in tests); set REDIS_URL to share the cache,
+# and therefore response invalidations, between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+
+# Seconds a cached subject/professor response is kept (see api/cache.py).
+API_RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Seconds a response is replayed for retries with the same Idempotency-Key
+# (see api/idempotency.py).
+API_IDEMPOTENCY_TIMEOUT = 24 * 60 * 60
+
+# Per-request metrics (see api/metrics.py), exported on /metrics to scrapers
+# sending METRICS_TOKEN as a bearer token; /metrics is off without it.
+API_METRICS = {
+    'SLOW_REQUEST_MS': int(os.environ.get('API_SLOW_REQUEST_MS', 500)),
+    'SQL_SAMPLE_RATE': float(os.environ.get('API_SQL_SAMPLE_RATE', 0.0)),
+    'N_PLUS_ONE_THRESHOLD': 10,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
 }
 
 
@@ -159,6 +269,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STATIC_URL = 'static/'
 
+# Uploads waiting for a background job (see api/jobs.py) are kept here, so
+# web and worker processes must share it.
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 if not DEBUG:
     STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
\ No newline at end of file
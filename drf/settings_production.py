@@ -0,0 +1,55 @@
+"""
+Production settings for drf project.
+
+Select them with ``DJANGO_SETTINGS_MODULE=drf.settings_production``; the
+dockerfile and docker-compose.yml do. ``SECRET_KEY`` must be set in the
+environment. Everything not overridden here comes from drf/settings.py.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import ALLOWED_HOSTS, BASE_DIR, DATABASES, os
+
+DEBUG = False
+
+# No fallback: the development default is public.
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Set the SECRET_KEY environment variable.')
+
+ALLOWED_HOSTS += [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
+
+# Persistent connections are only safe when each connection stays on one
+# worker thread. Under ASGI every request may run on a different thread, so
+# connections are closed per request there (use a pooler such as PgBouncer).
+if os.environ.get('DJANGO_ASGI'):
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 0
+
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.environ.get('LOG_LEVEL', 'INFO'),
+    },
+}
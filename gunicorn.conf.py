@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration for both entry points:
+
+    gunicorn drf.wsgi:application -c gunicorn.conf.py
+    gunicorn drf.asgi:application -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker
+
+Every value can be overridden with the matching GUNICORN_* environment variable.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Threads let a sync worker overlap requests that wait on the database.
+# The uvicorn worker class ignores ``threads`` and runs an event loop instead.
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then so slow leaks can't grow without bound.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+errorlog = '-'